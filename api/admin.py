@@ -1,4 +1,8 @@
 from django.contrib import admin
+from django.http import FileResponse, Http404
+from django.template.response import TemplateResponse
+from django.urls import path
+from .profiling import list_profiles, profile_path
 from .models import (
   Category, 
   User, 
@@ -80,4 +84,30 @@ class AddRecipeInline(admin.TabularInline):
 class CookbookAdmin(admin.ModelAdmin):
     list_display = ('cb_id', 'cb_title')
     inlines = [AddRecipeInline]
-    
\ No newline at end of file
+
+#---------------Profiles---------------#
+# Request profiles live on disk (api.profiling), so they get admin pages of
+# their own rather than a ModelAdmin
+def profile_list_view(request):
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Request profiles',
+        'profiles': list_profiles(),
+    }
+    return TemplateResponse(request, 'admin/api/profiles.html', context)
+
+def profile_file_view(request, profile_id, extension):
+    path = profile_path(profile_id, f'.{extension}')
+    if path is None:
+        raise Http404('No such profile')
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'{profile_id}.{extension}')
+
+def get_urls(urls=admin.site.get_urls):
+    return [
+        path('profiles/', admin.site.admin_view(profile_list_view), name='profiles'),
+        path('profiles/<str:profile_id>.<str:extension>', admin.site.admin_view(profile_file_view), name='profile_file'),
+        *urls(),
+    ]
+
+admin.site.get_urls = get_urls
+admin.site.index_template = 'admin/api/index.html'
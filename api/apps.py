@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # Keep the search index and other derived data in step with writes
+        from . import signals  # noqa: F401
+        # Time every connection's statements, including those of commands
+        from . import instrumentation, slow_queries  # noqa: F401
+        instrumentation.instrument_open_connections()
+        # Register the replica settings check
+        from . import db_router  # noqa: F401
@@ -1,15 +1,23 @@
 from django.contrib.auth.backends import BaseBackend
-from django.contrib.auth.hashers import check_password
-from .models import User
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import BasePermission
+from . import user_cache
+from .jwt_utils import validate_token
+from .models import Admin, User
+from .passwords import verify_password
+from .revocation import get_deny_list
 
 class EzChefAuthBackend(BaseBackend):
     def authenticate(self, request, username=None, password=None):
         try:
             user = User.objects.get(username=username)
-            # Check if password matches (assuming it's hashed)
-            if check_password(password, user.password):
-                return user
-            elif user.password == password:
+            # Check if password matches, hashed or legacy plaintext
+            matches, replacement = verify_password(password, user.password)
+            if matches:
+                if replacement:
+                    user.password = replacement
+                    user.save(update_fields=['password'])
                 return user
         except User.DoesNotExist:
             return None
@@ -18,4 +26,41 @@ class EzChefAuthBackend(BaseBackend):
         try:
             return User.objects.get(id=user_id)
         except User.DoesNotExist:
-            return None
\ No newline at end of file
+            return None
+
+def bearer_user(request):
+    """
+    The user of the request's bearer access token, or None without one.
+    Raises AuthenticationFailed for a bad, revoked or refresh token.
+    """
+    auth_header = request.META.get('HTTP_AUTHORIZATION', '')
+    if not auth_header.startswith('Bearer '):
+        return None
+    payload = validate_token(auth_header.split(' ')[1])
+    if not payload or payload.get('type') == 'refresh' or get_deny_list().is_revoked(payload):
+        raise AuthenticationFailed('Invalid or expired token')
+    try:
+        return user_cache.get_user(payload['user_id'])
+    except User.DoesNotExist:
+        raise AuthenticationFailed('User not found')
+
+
+class JWTAuthentication(BaseAuthentication):
+    """
+    DRF authentication from a bearer access token. Django's
+    AuthenticationMiddleware replaces the user JWTAuthMiddleware sets, so views
+    that need the token's user list this in authentication_classes.
+    """
+    def authenticate(self, request):
+        user = bearer_user(request)
+        return (user, None) if user is not None else None
+
+    def authenticate_header(self, request):
+        return 'Bearer'
+
+
+class IsPlatformAdmin(BasePermission):
+    """Only users listed in the admin table"""
+    def has_permission(self, request, view):
+        user = request.user
+        return isinstance(user, User) and Admin.objects.filter(admin=user).exists()
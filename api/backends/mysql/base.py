@@ -0,0 +1,14 @@
+"""MySQL backend with pooled connections, see api.db_pool"""
+from django.db.backends.mysql import base
+
+from api.db_pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    def ping_connection(self, connection):
+        # A protocol-level ping, no statement to parse
+        try:
+            connection.ping()
+            return True
+        except base.Database.Error:
+            return False
@@ -0,0 +1,8 @@
+"""SQLite backend with pooled connections, see api.db_pool. Pools of in-memory databases are not supported."""
+from django.db.backends.sqlite3 import base
+
+from api.db_pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    pass
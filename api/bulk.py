@@ -0,0 +1,136 @@
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Max
+
+from .detail_cache import invalidate_recipe_details
+from .ingredient_index import get_ingredient_index
+from .models import Nutrition, Quantity, RecipeIngredients
+from .nutrition import recipes_using_ingredients, schedule_refresh
+from .search import get_search_backend
+
+#---------------LOOKUP RESOLUTION---------------#
+class LookupConflict(Exception):
+    """A concurrent write created the same lookup row first; retry the transaction"""
+
+def lookup_key(value):
+    # MySQL compares names case-insensitively, so match them the same way
+    return value.casefold() if isinstance(value, str) else value
+
+def resolve_lookup(model, field, values):
+    """
+    Map each value of a lookup column (ingredient_name, unit_name, cat_name...)
+    to its row, creating the missing rows with one bulk insert.
+    Costs one query when every value exists and three otherwise. Raises
+    LookupConflict when a concurrent insert of the same row wins.
+    """
+    values = [value for value in values if value not in (None, '')]
+    wanted = {lookup_key(value): value for value in values}
+    if not wanted:
+        return {}
+
+    def fetch(keys):
+        rows = model.objects.filter(**{f'{field}__in': [wanted[key] for key in keys]}).order_by('pk')
+        for row in rows:
+            found.setdefault(lookup_key(getattr(row, field)), row)
+
+    found = {}
+    fetch(wanted)
+    missing = [key for key in wanted if key not in found]
+    if missing:
+        # MySQL does not hand back the new ids from a bulk insert, so read them back
+        try:
+            model.objects.bulk_create([model(**{field: wanted[key]}) for key in missing])
+        except IntegrityError as exc:
+            raise LookupConflict(f'{model.__name__}.{field}') from exc
+        fetch(missing)
+    return {value: found[lookup_key(value)] for value in values}
+
+def resolve_quantities(amounts):
+    """
+    Map each amount to its Quantity row, allocating ids for the missing ones.
+    Raises LookupConflict when a concurrent insert takes one of those ids.
+    """
+    amounts = set(amounts)
+    if not amounts:
+        return {}
+    # Walk down the ids so the lowest id wins when an amount appears twice
+    found = {q.quantity_amount: q for q in Quantity.objects.filter(quantity_amount__in=amounts).order_by('-quantity_id')}
+    missing = sorted(amounts - found.keys())
+    if missing:
+        # quantity_id is not auto-incremented; a concurrent insert makes the transaction retry
+        next_id = (Quantity.objects.aggregate(top=Max('quantity_id'))['top'] or 0) + 1
+        created = [Quantity(quantity_id=next_id + i, quantity_amount=amount) for i, amount in enumerate(missing)]
+        try:
+            Quantity.objects.bulk_create(created)
+        except IntegrityError as exc:
+            raise LookupConflict('Quantity.quantity_id') from exc
+        found.update({q.quantity_amount: q for q in created})
+    return found
+
+#---------------PRIMARY KEYS---------------#
+def bulk_create_with_ids(model, objs, batch_size=None):
+    """
+    bulk_create that leaves the primary keys set, so dependent rows can point
+    at the new objects. MySQL does not return them from a bulk insert, so ids
+    are taken after the current maximum, holding a lock on the top row; an
+    insert from elsewhere that wins the race raises IntegrityError.
+    """
+    if objs and not connection.features.can_return_rows_from_bulk_insert:
+        pk = model._meta.pk
+        top = model.objects.select_for_update().order_by(f'-{pk.attname}').values_list(pk.attname, flat=True).first()
+        for offset, obj in enumerate(objs, start=1):
+            setattr(obj, pk.attname, (top or 0) + offset)
+    return model.objects.bulk_create(objs, batch_size=batch_size)
+
+#---------------RECIPE INGREDIENTS---------------#
+def bulk_create_recipe_ingredients(rows):
+    """
+    Insert RecipeIngredients rows in one statement, dropping duplicates of
+    (recipe, ingredient, quantity), and bring the derived data up to date.
+    """
+    unique = {}
+    for row in rows:
+        unique.setdefault((row.recipe_id, row.ingredient_id, row.quantity_id), row)
+    rows = list(unique.values())
+    RecipeIngredients.objects.bulk_create(rows)
+    after_bulk_write(recipe_ingredients=rows)
+    return rows
+
+def bulk_create_nutrition(rows):
+    """Insert Nutrition rows in one statement and refresh the totals they change"""
+    ingredient_ids = {row.ingredient_id for row in rows}
+    # Totals use an ingredient's first nutrition row, so later rows change nothing
+    covered = set(Nutrition.objects.filter(ingredient_id__in=ingredient_ids).values_list('ingredient_id', flat=True))
+    Nutrition.objects.bulk_create(rows)
+    after_bulk_write(nutrition=[row for row in rows if row.ingredient_id not in covered])
+    return rows
+
+def after_bulk_write(recipes=(), recipe_ingredients=(), ingredients=(), nutrition=()):
+    """
+    bulk_create skips the model signals, so replay what they would have done
+    once the transaction commits.
+    """
+    recipes = list(recipes)
+    pairs = [(row.ingredient_id, row.recipe_id) for row in recipe_ingredients]
+    names = [(ingredient.ingredient_id, ingredient.ingredient_name) for ingredient in ingredients]
+
+    def replay():
+        search = get_search_backend()
+        for recipe in recipes:
+            search.index_recipe(recipe)
+        if recipes:
+            search.publish()
+        index = get_ingredient_index()
+        for ingredient_id, name in names:
+            index.rename(ingredient_id, name)
+        for ingredient_id, recipe_id in pairs:
+            index.add(ingredient_id, recipe_id)
+        if names or pairs:
+            index.publish()
+
+    transaction.on_commit(replay)
+    invalidate_recipe_details([recipe.recipe_id for recipe in recipes], catalog=True)
+    invalidate_recipe_details([recipe_id for ingredient_id, recipe_id in pairs])
+    schedule_refresh({recipe_id for ingredient_id, recipe_id in pairs})
+    # New nutrition rows change the totals of every recipe using the ingredient
+    if nutrition:
+        schedule_refresh(recipes_using_ingredients({row.ingredient_id for row in nutrition}))
@@ -0,0 +1,255 @@
+import datetime
+import itertools
+import random
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from .bulk import bulk_create_with_ids, resolve_quantities
+from .models import AddRecipe, Category, Cookbook, IdentifiedBy, Ingredient, Nutrition, Recipe, RecipeIngredients, Review, SubscribedCookbook, Unit, User
+from .nutrition import refresh_recipe_nutrition
+
+SCALES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+CATEGORIES = [
+    'Dinner', 'Lunch', 'Breakfast', 'Dessert', 'Snack', 'Italian', 'Mexican', 'Chinese', 'Indian', 'Japanese',
+    'Thai', 'French', 'Greek', 'Spanish', 'American', 'Korean', 'Vietnamese', 'Middle Eastern', 'Caribbean', 'Ethiopian',
+    'Vegetarian', 'Vegan', 'Gluten Free', 'Quick', 'Slow Cooker', 'Baking', 'Grilling', 'Soup', 'Salad', 'Pasta',
+    'Seafood', 'Chicken', 'Beef', 'Pork', 'Holiday', 'Kids', 'Drinks', 'Sauces', 'Bread', 'Street Food',
+]
+
+FOODS = [
+    'chicken', 'beef', 'pork', 'salmon', 'shrimp', 'tofu', 'egg', 'rice', 'pasta', 'noodle', 'potato', 'tomato',
+    'onion', 'garlic', 'ginger', 'carrot', 'pepper', 'spinach', 'mushroom', 'lentil', 'chickpea', 'bean', 'corn',
+    'cheese', 'butter', 'cream', 'yogurt', 'lemon', 'lime', 'apple', 'banana', 'berry', 'chocolate', 'honey',
+    'coconut', 'avocado', 'cabbage', 'broccoli', 'zucchini', 'eggplant', 'squash', 'pumpkin', 'almond', 'peanut',
+    'basil', 'cilantro', 'parsley', 'thyme', 'rosemary', 'cumin', 'paprika', 'chili', 'cinnamon', 'vanilla',
+    'flour', 'sugar', 'oat', 'quinoa', 'bacon', 'sausage', 'lamb', 'duck', 'cod', 'tuna', 'crab', 'mango',
+]
+
+STYLES = [
+    'roasted', 'grilled', 'spicy', 'creamy', 'crispy', 'smoked', 'braised', 'baked', 'fried', 'fresh', 'sweet',
+    'tangy', 'stuffed', 'glazed', 'steamed', 'slow', 'quick', 'rustic', 'classic', 'herbed', 'charred', 'sticky',
+]
+
+DISHES = ['soup', 'stew', 'curry', 'salad', 'bowl', 'tacos', 'pie', 'bake', 'stir fry', 'skillet', 'wraps', 'risotto', 'cake', 'bread', 'sandwich', 'casserole']
+
+UNITS = [('gram', 'g'), ('kilogram', 'kg'), ('millilitre', 'ml'), ('litre', 'l'), ('teaspoon', 'tsp'), ('tablespoon', 'tbsp'), ('cup', 'cup'), ('piece', 'pc')]
+
+AMOUNTS = [1, 2, 3, 4, 5, 6, 8, 10, 12, 15, 20, 25, 30, 50, 75, 100, 150, 200, 250, 300, 400, 500, 750, 1000]
+
+DAYS_OF_HISTORY = 5 * 365
+
+#---------------DISTRIBUTIONS---------------#
+class Zipf:
+    """Draws from a population where the item at rank r is picked in proportion to 1 / r**skew"""
+
+    def __init__(self, rng, population, skew=1.0):
+        self.rng = rng
+        self.population = population
+        self.cum_weights = list(itertools.accumulate(1 / rank ** skew for rank in range(1, len(population) + 1)))
+
+    def pick(self, k=1):
+        return self.rng.choices(self.population, cum_weights=self.cum_weights, k=k)
+
+    def distinct(self, k):
+        """k different items, favouring the popular ones"""
+        k = min(k, len(self.population))
+        chosen = dict.fromkeys(self.pick(k))
+        while len(chosen) < k:
+            chosen.update(dict.fromkeys(self.pick(k - len(chosen))))
+        return list(chosen)[:k]
+
+def heavy_tail(rng, alpha, cap):
+    """A count that is usually 0 or 1 but now and then large, as reviews and subscribers are"""
+    return min(cap, int(rng.paretovariate(alpha)) - 1)
+
+def bounded(value, low, high):
+    return max(low, min(high, int(value)))
+
+#---------------GENERATOR---------------#
+class DatasetGenerator:
+    """
+    Fills the catalog tables with a reproducible synthetic dataset.
+
+    Per recipe there are about 7 ingredients and 3 reviews. There is one user
+    per 5 recipes and one cookbook per 4 users. Popularity is Zipf-skewed: a
+    few categories, ingredients, reviewers and cookbook owners account for most
+    rows. Review and subscriber counts are heavy-tailed. Recipe dates lean
+    towards recent ones. Rows are written batch_size recipes at a time, so
+    memory stays flat at any scale. New rows are added after the existing
+    ones.
+    """
+
+    def __init__(self, recipes, seed=0, batch_size=2000, log=None):
+        self.recipes = recipes
+        self.batch_size = batch_size
+        self.rng = random.Random(seed)
+        self.log = log or (lambda message: None)
+        self.counts = dict.fromkeys(
+            ('users', 'categories', 'ingredients', 'nutrition', 'recipes', 'identifiedBy', 'recipeIngredients', 'reviews', 'cookbooks', 'addRecipe', 'subscribedCookbooks'), 0
+        )
+
+    def run(self):
+        users = self.create_users(max(20, self.recipes // 5))
+        categories = self.create_categories()
+        units = self.create_units()
+        ingredients = self.create_ingredients(bounded(self.recipes // 5, 200, 5000), units)
+        quantities = list(resolve_quantities(AMOUNTS).values())
+
+        self.users = Zipf(self.rng, users, skew=0.8)
+        self.categories = Zipf(self.rng, categories, skew=1.0)
+        self.ingredients = Zipf(self.rng, ingredients, skew=1.1)
+        self.units = units
+        self.quantities = quantities
+
+        recipe_ids = []
+        for start in range(0, self.recipes, self.batch_size):
+            recipe_ids += self.create_recipe_batch(min(self.batch_size, self.recipes - start))
+            self.log(f'{len(recipe_ids)}/{self.recipes} recipes')
+
+        # A few recipes turn up in most cookbooks
+        self.recipe_ids = Zipf(self.rng, recipe_ids, skew=0.9)
+        cookbook_count = max(5, len(users) // 4)
+        for start in range(0, cookbook_count, self.batch_size):
+            self.create_cookbook_batch(min(self.batch_size, cookbook_count - start))
+        self.log(f'{cookbook_count} cookbooks')
+        return self.counts
+
+    def create_users(self, count):
+        # One hash for everyone; hashing a million passwords is not the point
+        password = make_password('password')
+        first = (User.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+        users = []
+        for start in range(0, count, self.batch_size):
+            batch = [
+                User(
+                    username=f'user{first + i}',
+                    password=password,
+                    f_name=self.rng.choice(['Ana', 'Ben', 'Chloe', 'Dev', 'Emma', 'Femi', 'Gus', 'Hana', 'Ivan', 'Jo']),
+                    l_name=self.rng.choice(['Smith', 'Garcia', 'Chen', 'Okafor', 'Patel', 'Kim', 'Novak', 'Silva']),
+                    date_of_birth=datetime.date(1950, 1, 1) + datetime.timedelta(days=self.rng.randrange(365 * 55)),
+                    email=f'user{first + i}@example.com',
+                )
+                for i in range(start, min(count, start + self.batch_size))
+            ]
+            with transaction.atomic():
+                users += bulk_create_with_ids(User, batch)
+        self.counts['users'] += len(users)
+        return [user.id for user in users]
+
+    def create_categories(self):
+        existing = dict(Category.objects.filter(cat_name__in=CATEGORIES).values_list('cat_name', 'category_id'))
+        missing = [Category(cat_name=name) for name in CATEGORIES if name not in existing]
+        with transaction.atomic():
+            for category in bulk_create_with_ids(Category, missing):
+                existing[category.cat_name] = category.category_id
+        self.counts['categories'] += len(missing)
+        return [existing[name] for name in CATEGORIES]
+
+    def create_units(self):
+        existing = dict(Unit.objects.filter(unit_name__in=[name for name, symbol in UNITS]).values_list('unit_name', 'unit_id'))
+        missing = [Unit(unit_name=name, symbol=symbol) for name, symbol in UNITS if name not in existing]
+        with transaction.atomic():
+            for unit in bulk_create_with_ids(Unit, missing):
+                existing[unit.unit_name] = unit.unit_id
+        return [existing[name] for name, symbol in UNITS]
+
+    def create_ingredients(self, count, units):
+        names = itertools.chain(FOODS, (f'{style} {food}' for style in STYLES for food in FOODS), (f'{food} {n}' for n in itertools.count(2) for food in FOODS))
+        ingredients = [Ingredient(ingredient_name=name[:30]) for name in itertools.islice(names, count)]
+        with transaction.atomic():
+            ingredients = bulk_create_with_ids(Ingredient, ingredients)
+            # Most ingredients have nutrition facts, some never got any
+            nutrition = [
+                Nutrition(
+                    ingredient_id=ingredient.ingredient_id,
+                    unit_id=self.rng.choice(units),
+                    serving_size=Decimal(self.rng.choice([1, 10, 50, 100])),
+                    calorie_count=Decimal(self.rng.randrange(0, 90000)) / 100,
+                    protein_count=Decimal(self.rng.randrange(0, 5000)) / 100,
+                )
+                for ingredient in ingredients if self.rng.random() < 0.9
+            ]
+            Nutrition.objects.bulk_create(nutrition, batch_size=self.batch_size)
+        self.counts['ingredients'] += len(ingredients)
+        self.counts['nutrition'] += len(nutrition)
+        return [ingredient.ingredient_id for ingredient in ingredients]
+
+    def recipe_date(self):
+        # Newer recipes are more common, as a catalog grows over time
+        days_ago = bounded(self.rng.expovariate(1 / 400), 0, DAYS_OF_HISTORY)
+        return datetime.date(2025, 1, 1) - datetime.timedelta(days=days_ago)
+
+    def create_recipe_batch(self, count):
+        recipes = []
+        for _ in range(count):
+            words = [self.rng.choice(STYLES), self.rng.choice(FOODS), self.rng.choice(DISHES)]
+            description = ' '.join(self.rng.choices(FOODS + STYLES + DISHES, k=self.rng.randint(8, 40)))
+            recipes.append(Recipe(
+                recipe_name=' '.join(words).title()[:50],
+                recipe_description=f'A {words[0]} {words[2]} with {description}.',
+                date_added=self.recipe_date(),
+                recipe_difficulty=self.rng.choices([1, 2, 3, 4, 5], weights=[15, 35, 30, 15, 5])[0],
+            ))
+
+        with transaction.atomic():
+            recipes = bulk_create_with_ids(Recipe, recipes)
+            identified_by, recipe_ingredients, reviews = [], [], []
+            for recipe in recipes:
+                for category_id in self.categories.distinct(self.rng.choices([1, 2, 3], weights=[60, 30, 10])[0]):
+                    identified_by.append(IdentifiedBy(recipe_id=recipe.recipe_id, category_id=category_id))
+                for ingredient_id in self.ingredients.distinct(bounded(self.rng.lognormvariate(2.0, 0.4), 2, 25)):
+                    recipe_ingredients.append(RecipeIngredients(
+                        recipe_id=recipe.recipe_id,
+                        ingredient_id=ingredient_id,
+                        quantity_id=self.rng.choice(self.quantities).quantity_id,
+                        unit_id=self.rng.choice(self.units) if self.rng.random() < 0.8 else None,
+                    ))
+                for user_id in self.users.distinct(heavy_tail(self.rng, 1.3, 500)):
+                    reviews.append(Review(
+                        recipe_id=recipe.recipe_id,
+                        user_id=user_id,
+                        rating=self.rng.choices([1, 2, 3, 4, 5], weights=[5, 7, 15, 33, 40])[0],
+                        comment=self.rng.choice(['Loved it', 'Too salty', 'Would make again', 'Family favourite', None]),
+                        date_created=timezone.make_aware(datetime.datetime.combine(recipe.date_added, datetime.time(12))) + datetime.timedelta(days=self.rng.randrange(365)),
+                    ))
+            IdentifiedBy.objects.bulk_create(identified_by, batch_size=self.batch_size)
+            RecipeIngredients.objects.bulk_create(recipe_ingredients, batch_size=self.batch_size)
+            Review.objects.bulk_create(reviews, batch_size=self.batch_size)
+            refresh_recipe_nutrition([recipe.recipe_id for recipe in recipes])
+
+        self.counts['recipes'] += len(recipes)
+        self.counts['identifiedBy'] += len(identified_by)
+        self.counts['recipeIngredients'] += len(recipe_ingredients)
+        self.counts['reviews'] += len(reviews)
+        return [recipe.recipe_id for recipe in recipes]
+
+    def create_cookbook_batch(self, count):
+        with transaction.atomic():
+            cookbooks = bulk_create_with_ids(Cookbook, [
+                Cookbook(
+                    cb_title=f'{self.rng.choice(STYLES).title()} {self.rng.choice(DISHES)}s'[:30],
+                    cb_description=self.rng.choice(['Weeknight staples', 'For guests', 'Saved for later', None]),
+                    creator_id=creator_id,
+                )
+                for creator_id in self.users.pick(count)
+            ])
+            entries, subscriptions = [], []
+            for cookbook in cookbooks:
+                for recipe_id in self.recipe_ids.distinct(bounded(self.rng.lognormvariate(2.0, 0.8), 1, 200)):
+                    entries.append(AddRecipe(user_id=cookbook.creator_id, cb_id=cookbook.cb_id, recipe_id=recipe_id))
+                for user_id in self.users.distinct(heavy_tail(self.rng, 1.2, 1000)):
+                    subscriptions.append(SubscribedCookbook(user_id=user_id, cookbook_id=cookbook.cb_id))
+            AddRecipe.objects.bulk_create(entries, batch_size=self.batch_size)
+            SubscribedCookbook.objects.bulk_create(subscriptions, batch_size=self.batch_size)
+
+        self.counts['cookbooks'] += len(cookbooks)
+        self.counts['addRecipe'] += len(entries)
+        self.counts['subscribedCookbooks'] += len(subscriptions)
+
+def generate_dataset(recipes, seed=0, batch_size=2000, log=None):
+    """Generate a synthetic dataset of the given number of recipes; returns row counts by table"""
+    return DatasetGenerator(recipes, seed=seed, batch_size=batch_size, log=log).run()
@@ -0,0 +1,230 @@
+import os
+import threading
+import time
+from contextlib import closing
+from functools import partial
+
+from django.db.utils import OperationalError
+
+#---------------POOL---------------#
+class PoolTimeout(OperationalError):
+    """Raised when no pooled connection frees up within the pool timeout"""
+
+class ConnectionPool:
+    """
+    Bounded pool of raw DB-API connections.
+
+    At most max_size connections exist at once; acquire waits up to timeout
+    seconds for one to be released. A connection idle for ping_after seconds
+    is health checked before it is handed out again. Connections idle for
+    max_idle seconds, or older than max_lifetime, are closed instead of reused.
+    """
+
+    def __init__(self, connect, ping, max_size=10, timeout=5.0, ping_after=1.0, max_idle=300.0, max_lifetime=3600.0):
+        self.connect = connect
+        self.ping = ping
+        self.max_size = max_size
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.pid = os.getpid()
+        self.lock = threading.Condition()
+        self.idle = []       # (connection, created, released), most recently released last
+        self.in_use = {}     # id(connection) -> created
+        self.size = 0
+        self.counters = dict.fromkeys(
+            ('acquired', 'created', 'reused', 'waits', 'timeouts', 'healthCheckFailures', 'reaped', 'expired'), 0
+        )
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def acquire(self):
+        """A connection and whether it was reused from the pool"""
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+        while True:
+            with self.lock:
+                stale = self.reap(time.monotonic())
+                while not self.idle and self.size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.counters['timeouts'] += 1
+                        raise PoolTimeout(f'No database connection free after {self.timeout}s ({self.max_size} in use)')
+                    waited = True
+                    self.lock.wait(remaining)
+                entry = self.idle.pop() if self.idle else None
+                if entry is None:
+                    # Reserve the slot before connecting outside the lock
+                    self.size += 1
+            close_all(stale)
+
+            if entry is None:
+                try:
+                    connection = self.connect()
+                except BaseException:
+                    with self.lock:
+                        self.size -= 1
+                        self.lock.notify()
+                    raise
+                created, reused = time.monotonic(), False
+            else:
+                connection, created, released = entry
+                if time.monotonic() - released >= self.ping_after and not self.ping(connection):
+                    self.discard(connection, 'healthCheckFailures')
+                    continue
+                reused = True
+
+            now = time.monotonic()
+            with self.lock:
+                self.in_use[id(connection)] = created
+                self.counters['acquired'] += 1
+                self.counters['reused' if reused else 'created'] += 1
+                if waited:
+                    self.counters['waits'] += 1
+                    self.wait_total += now - start
+                    self.wait_max = max(self.wait_max, now - start)
+            return connection, reused
+
+    def release(self, connection, discard=False):
+        """Give a connection back, or close it when it is broken or too old"""
+        now = time.monotonic()
+        with self.lock:
+            created = self.in_use.pop(id(connection), None)
+            if created is None:
+                # Not ours, e.g. handed out before a fork
+                close_all([connection])
+                return
+            expired = now - created >= self.max_lifetime
+            if not discard and not expired:
+                self.idle.append((connection, created, now))
+                self.lock.notify()
+                return
+            self.size -= 1
+            if expired:
+                self.counters['expired'] += 1
+            self.lock.notify()
+        close_all([connection])
+
+    def discard(self, connection, counter):
+        with self.lock:
+            self.size -= 1
+            self.counters[counter] += 1
+            self.lock.notify()
+        close_all([connection])
+
+    def reap(self, now):
+        """Take idle connections past max_idle or max_lifetime out of the pool; call with the lock held"""
+        keep, stale = [], []
+        for entry in self.idle:
+            connection, created, released = entry
+            if now - released >= self.max_idle:
+                self.counters['reaped'] += 1
+                stale.append(connection)
+            elif now - created >= self.max_lifetime:
+                self.counters['expired'] += 1
+                stale.append(connection)
+            else:
+                keep.append(entry)
+        if stale:
+            self.idle = keep
+            self.size -= len(stale)
+            self.lock.notify(len(stale))
+        return stale
+
+    def close_idle(self):
+        with self.lock:
+            stale = [connection for connection, created, released in self.idle]
+            self.idle = []
+            self.size -= len(stale)
+            self.lock.notify_all()
+        close_all(stale)
+
+    def stats(self):
+        with self.lock:
+            waits = self.counters['waits']
+            return {
+                'maxSize': self.max_size,
+                'size': self.size,
+                'inUse': len(self.in_use),
+                'idle': len(self.idle),
+                'utilisation': len(self.in_use) / self.max_size,
+                **self.counters,
+                'avgWaitMs': self.wait_total / waits * 1000 if waits else 0.0,
+                'maxWaitMs': self.wait_max * 1000,
+            }
+
+def close_all(connections):
+    for connection in connections:
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+#---------------BACKEND MIXIN---------------#
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(wrapper):
+    """The pool of a DatabaseWrapper's alias in this process, created on first use"""
+    pool = _pools.get(wrapper.alias)
+    # A forked worker must not share its parent's sockets
+    if pool is None or pool.pid != os.getpid():
+        with _pools_lock:
+            pool = _pools.get(wrapper.alias)
+            if pool is None or pool.pid != os.getpid():
+                options = wrapper.settings_dict.get('POOL', {})
+                pool = ConnectionPool(
+                    partial(super(PooledDatabaseWrapperMixin, wrapper).get_new_connection, wrapper.get_connection_params()),
+                    wrapper.ping_connection,
+                    max_size=options.get('MAX_SIZE', 10),
+                    timeout=options.get('TIMEOUT', 5.0),
+                    ping_after=options.get('PING_AFTER', 1.0),
+                    max_idle=options.get('MAX_IDLE', 300.0),
+                    max_lifetime=options.get('MAX_LIFETIME', 3600.0),
+                )
+                _pools[wrapper.alias] = pool
+    return pool
+
+def pool_stats():
+    """Stats of every pool in this process, by database alias"""
+    return {alias: pool.stats() for alias, pool in list(_pools.items()) if pool.pid == os.getpid()}
+
+class PooledDatabaseWrapperMixin:
+    """
+    Makes a DatabaseWrapper take its connections from a process-wide pool and
+    give them back on close(), so with CONN_MAX_AGE = 0 a request borrows a
+    connection instead of opening one. Configured by the POOL dict of the
+    DATABASES entry.
+    """
+    pool_reused = False
+
+    def get_new_connection(self, conn_params):
+        connection, self.pool_reused = get_pool(self).acquire()
+        return connection
+
+    def init_connection_state(self):
+        # Session settings survive on a reused connection
+        if not self.pool_reused:
+            super().init_connection_state()
+
+    def _close(self):
+        if self.connection is None:
+            return
+        # A broken connection or an open transaction is not worth handing on
+        discard = self.errors_occurred or self.in_atomic_block
+        if not discard and not self.autocommit:
+            try:
+                self.connection.rollback()
+            except Exception:
+                discard = True
+        get_pool(self).release(self.connection, discard=discard)
+
+    def ping_connection(self, connection):
+        try:
+            with closing(connection.cursor()) as cursor:
+                cursor.execute('SELECT 1')
+            return True
+        except Exception:
+            return False
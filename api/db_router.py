@@ -0,0 +1,237 @@
+import contextvars
+import itertools
+import logging
+import threading
+import time
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.signals import setting_changed
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from django.dispatch import receiver
+from django.utils.deprecation import MiddlewareMixin
+
+from .ratelimit import client_ip, token_user_id
+
+KEY_PREFIX = 'replica-pin'
+
+# Cache backends that keep their entries in the process, where other workers cannot see a pin
+LOCAL_CACHES = (LocMemCache, DummyCache)
+
+logger = logging.getLogger(__name__)
+
+# Routing state of the request being served: {'pinned': bool, 'wrote': bool,
+# 'replica': alias of the last replica read from, or None}.
+# Outside a request (commands, background work) everything uses the primary.
+request_state = contextvars.ContextVar('replica_request_state', default=None)
+
+#---------------REPLICA HEALTH---------------#
+class ReplicaSet:
+    """
+    The replicas in DATABASE_REPLICAS, handed out round-robin. Each one is
+    checked at most every REPLICA_HEALTH_CHECK_INTERVAL seconds by the request
+    that finds its status stale; one that fails the check, or on MySQL lags
+    more than REPLICA_MAX_LAG seconds behind, is skipped until it passes again.
+    """
+
+    def __init__(self, aliases, check_interval, max_lag):
+        self.aliases = list(aliases)
+        self.check_interval = check_interval
+        self.max_lag = max_lag
+        self.healthy = dict.fromkeys(self.aliases, True)
+        self.checked_at = dict.fromkeys(self.aliases, float('-inf'))
+        self.turn = itertools.count()
+        self.lock = threading.Lock()
+
+    def pick(self):
+        """A healthy replica, or None when there is none"""
+        if not self.aliases:
+            return None
+        start = next(self.turn)
+        for offset in range(len(self.aliases)):
+            alias = self.aliases[(start + offset) % len(self.aliases)]
+            if self.is_healthy(alias):
+                return alias
+        return None
+
+    def is_healthy(self, alias):
+        now = time.monotonic()
+        with self.lock:
+            due = now - self.checked_at[alias] >= self.check_interval
+            if due:
+                # Other requests keep the last verdict while this one checks
+                self.checked_at[alias] = now
+        if due:
+            self.healthy[alias] = self.check(alias)
+        return self.healthy[alias]
+
+    def check(self, alias):
+        try:
+            connection = connections[alias]
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                if connection.vendor == 'mysql' and self.max_lag is not None:
+                    cursor.execute('SHOW REPLICA STATUS')
+                    row = cursor.fetchone()
+                    if row is not None:
+                        columns = [column[0] for column in cursor.description]
+                        lag = row[columns.index('Seconds_Behind_Source')]
+                        # No lag figure means replication has stopped
+                        return lag is not None and lag <= self.max_lag
+            return True
+        except Exception:
+            try:
+                connections[alias].close()
+            except Exception:
+                pass
+            return False
+
+    def mark_down(self, alias):
+        """Skip a replica until its next health check, e.g. after a query on it failed"""
+        with self.lock:
+            self.healthy[alias] = False
+            self.checked_at[alias] = time.monotonic()
+
+_replicas = None
+_replicas_lock = threading.Lock()
+
+def get_replicas():
+    """
+    The process-wide replica set built from DATABASE_REPLICAS and the REPLICA_*
+    settings; empty, so every read uses the primary, unless the pin cache is
+    shared between workers.
+    """
+    global _replicas
+    if _replicas is None:
+        with _replicas_lock:
+            if _replicas is None:
+                aliases = getattr(settings, 'DATABASE_REPLICAS', [])
+                if aliases and not pin_cache_is_shared():
+                    logger.warning('Read replicas are off: REPLICA_PIN_CACHE is not shared between workers')
+                    aliases = []
+                _replicas = ReplicaSet(
+                    aliases,
+                    getattr(settings, 'REPLICA_HEALTH_CHECK_INTERVAL', 5),
+                    getattr(settings, 'REPLICA_MAX_LAG', None),
+                )
+    return _replicas
+
+@receiver(setting_changed)
+def reset_replicas(setting, **kwargs):
+    global _replicas
+    if setting in ('DATABASE_REPLICAS', 'CACHES') or setting.startswith('REPLICA_'):
+        _replicas = None
+
+#---------------ROUTER---------------#
+class PrimaryReplicaRouter:
+    """
+    Writes go to the primary. Reads made while serving a request go to a
+    healthy replica, unless the client wrote recently (see ReplicaPinMiddleware),
+    the request has already written, or the primary is inside a transaction.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = request_state.get()
+        if state is None or state['pinned'] or state['wrote']:
+            return DEFAULT_DB_ALIAS
+        # Reads in a transaction must see its writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        alias = get_replicas().pick()
+        if alias is None:
+            return DEFAULT_DB_ALIAS
+        state['replica'] = alias
+        return alias
+
+    def db_for_write(self, model, **hints):
+        state = request_state.get()
+        if state is not None:
+            state['wrote'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+def read_from_primary():
+    """
+    Send the rest of the request's reads to the primary. Call it before
+    reading rows into a cache, which must not keep what a lagging replica
+    returned after the client that wrote them stops being pinned.
+    """
+    state = request_state.get()
+    if state is not None:
+        state['pinned'] = True
+
+#---------------READ-YOUR-WRITES---------------#
+def get_pin_cache():
+    # Must be shared, so a pin set by one worker is seen by the others
+    return caches[getattr(settings, 'REPLICA_PIN_CACHE', 'default')]
+
+def pin_cache_is_shared():
+    return not isinstance(get_pin_cache(), LOCAL_CACHES)
+
+@checks.register(checks.Tags.database, checks.Tags.caches)
+def check_pin_cache(app_configs, **kwargs):
+    if not getattr(settings, 'DATABASE_REPLICAS', []) or pin_cache_is_shared():
+        return []
+    return [checks.Error(
+        'DATABASE_REPLICAS is set but REPLICA_PIN_CACHE is a per-process cache.',
+        hint='Point REPLICA_PIN_CACHE at a cache shared by every worker, such as Redis or Memcached; '
+             'until then reads stay on the primary.',
+        obj='api.db_router',
+        id='api.E001',
+    )]
+
+def pin_keys(request):
+    """The client's pin keys: its token user when it sends one, and its IP"""
+    keys = [f'{KEY_PREFIX}:ip:{client_ip(request)}']
+    user_id = token_user_id(request)
+    if user_id is not None:
+        keys.append(f'{KEY_PREFIX}:user:{user_id}')
+    return keys
+
+class ReplicaPinMiddleware(MiddlewareMixin):
+    """
+    Opens the routing state of each request. A client that wrote keeps reading
+    from the primary for REPLICA_PIN_SECONDS, so it sees its own writes while
+    the replicas catch up; keep that above the replication lag. A read-only
+    request whose view fails on a replica is served again from the primary.
+    """
+
+    def process_request(self, request):
+        if not get_replicas().aliases:
+            request.replica_state = None
+            return None
+        request.replica_keys = pin_keys(request)
+        request.replica_state = {'pinned': bool(get_pin_cache().get_many(request.replica_keys)), 'wrote': False, 'replica': None}
+        request_state.set(request.replica_state)
+        return None
+
+    def process_exception(self, request, exception):
+        state = getattr(request, 'replica_state', None)
+        if state is None or state['replica'] is None or state['wrote'] or not isinstance(exception, OperationalError):
+            return None
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        # The error may have come from the primary too; then the retry fails
+        # the same way and the replica is back after its next health check
+        get_replicas().mark_down(state['replica'])
+        state['pinned'] = True
+        state['replica'] = None
+        match = request.resolver_match
+        view = async_to_sync(match.func) if iscoroutinefunction(match.func) else match.func
+        return view(request, *match.args, **match.kwargs)
+
+    def process_response(self, request, response):
+        state = getattr(request, 'replica_state', None)
+        if state is not None:
+            if state['wrote']:
+                timeout = getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+                get_pin_cache().set_many(dict.fromkeys(request.replica_keys, True), timeout=timeout)
+            request_state.set(None)
+        return response
@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+
+from .versions import bump_recipe_versions
+
+KEY_PREFIX = 'recipe-detail'
+HITS_KEY = f'{KEY_PREFIX}:hits'
+MISSES_KEY = f'{KEY_PREFIX}:misses'
+
+#---------------CACHE ACCESS---------------#
+def get_cache():
+    return caches[getattr(settings, 'RECIPE_DETAIL_CACHE', 'default')]
+
+def detail_key(recipe_id):
+    return f'{KEY_PREFIX}:{recipe_id}'
+
+def count(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        # First hit or miss since the counters were last cleared
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+def get_recipe_detail(recipe_id):
+    """The cached detail payload of a recipe, or None on a miss"""
+    payload = get_cache().get(detail_key(recipe_id))
+    count(MISSES_KEY if payload is None else HITS_KEY)
+    return payload
+
+def set_recipe_detail(recipe_id, payload):
+    timeout = getattr(settings, 'RECIPE_DETAIL_CACHE_TIMEOUT', 300)
+    get_cache().set(detail_key(recipe_id), payload, timeout=timeout)
+
+#---------------INVALIDATION---------------#
+def invalidate_recipe_details(recipe_ids, catalog=False):
+    """
+    Drop the cached payloads of the given recipes and move their versions on.
+    Pass catalog=True when the change also shows up in recipe lists.
+    """
+    recipe_ids = {recipe_id for recipe_id in recipe_ids if recipe_id is not None}
+    if not recipe_ids:
+        return
+    bump_recipe_versions(recipe_ids, catalog)
+    keys = [detail_key(recipe_id) for recipe_id in recipe_ids]
+    get_cache().delete_many(keys)
+    # A read before the commit could cache the old rows again
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: get_cache().delete_many(keys))
+
+#---------------STATS---------------#
+def detail_cache_stats():
+    counters = get_cache().get_many([HITS_KEY, MISSES_KEY])
+    hits = counters.get(HITS_KEY, 0)
+    misses = counters.get(MISSES_KEY, 0)
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hitRate': hits / (hits + misses) if hits + misses else 0.0
+    }
+
+def reset_detail_cache_stats():
+    get_cache().delete_many([HITS_KEY, MISSES_KEY])
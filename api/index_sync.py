@@ -0,0 +1,39 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+KEY_PREFIX = 'index-generation'
+
+#---------------SHARED GENERATIONS---------------#
+def get_cache():
+    # Must be shared, so a change committed by one worker reaches the others
+    return caches[getattr(settings, 'INDEX_GENERATION_CACHE', 'default')]
+
+class IndexGeneration:
+    """
+    Counter in a shared cache that moves on every time a worker commits a change
+    to one of the in-process indexes. A worker whose index was built at another
+    generation has missed a change and rebuilds it.
+    """
+
+    def __init__(self, name):
+        self.key = f'{KEY_PREFIX}:{name}'
+
+    def current(self):
+        cache = get_cache()
+        generation = cache.get(self.key)
+        if generation is None:
+            # Start from the clock, so a generation lost with the cache is not handed out again
+            cache.add(self.key, time.time_ns(), timeout=None)
+            generation = cache.get(self.key)
+        return generation
+
+    def bump(self):
+        """The new generation, or None when the cache had lost the old one"""
+        cache = get_cache()
+        try:
+            return cache.incr(self.key)
+        except ValueError:
+            cache.add(self.key, time.time_ns(), timeout=None)
+            return None
@@ -0,0 +1,244 @@
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+from .db_router import read_from_primary
+from .index_sync import IndexGeneration
+from .models import Ingredient, RecipeIngredients
+
+DEFAULT_MAX_RESULTS = 1000
+
+#---------------BITMAP HELPERS---------------#
+def to_bitmap(recipe_ids):
+    """Pack a set of recipe ids into an int whose bit n is set for recipe n"""
+    if not recipe_ids:
+        return 0
+    bits = bytearray(max(recipe_ids) // 8 + 1)
+    for recipe_id in recipe_ids:
+        bits[recipe_id >> 3] |= 1 << (recipe_id & 7)
+    return int.from_bytes(bits, 'little')
+
+def iter_bits_descending(bitmap):
+    """Recipe ids set in a bitmap, highest (newest) first"""
+    digits = bin(bitmap)
+    top = len(digits) - 1
+    index = digits.find('1', 2)
+    while index != -1:
+        yield top - index
+        index = digits.find('1', index + 1)
+
+#---------------INGREDIENT INDEX---------------#
+class IngredientIndex:
+    """
+    In-memory index of ingredient_id -> recipe_ids for "cook with what I have" queries.
+
+    Rare ingredients keep a plain posting set; once an ingredient is used by a
+    large share of recipes it is promoted to an int bitmap. A query turns every
+    requested ingredient into a bitmap and counts matches per recipe with
+    bit-sliced addition, so the work is a handful of big-int operations rather
+    than one join per ingredient.
+
+    The index is built from RecipeIngredients on the first query and kept up to
+    date by the RecipeIngredients and Ingredient signals. Each worker process
+    holds its own copy and rebuilds it once a shared IndexGeneration shows that
+    another worker has committed a change.
+    """
+    # Promote a posting set to a bitmap once it holds 1/dense_ratio of the id range
+    dense_ratio = 64
+    min_dense_size = 1024
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.generation = IndexGeneration('ingredients')
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.built = False
+            self.seen = None                 # generation the index is current with
+            self.sparse = defaultdict(set)   # ingredient_id -> {recipe_id}
+            self.dense = {}                  # ingredient_id -> bitmap
+            self.duplicates = Counter()      # (ingredient_id, recipe_id) -> extra rows
+            self.max_recipe_id = 0
+            self.names = defaultdict(set)    # lower-case name -> {ingredient_id}
+            self.ingredient_names = {}       # ingredient_id -> lower-case name
+
+    def build(self):
+        with self.lock:
+            if self.built:
+                return
+            # Read before the rows, so a change committed meanwhile triggers another rebuild
+            seen = self.generation.current()
+            read_from_primary()
+            for ingredient_id, name in Ingredient.objects.values_list('ingredient_id', 'ingredient_name').iterator(chunk_size=5000):
+                self.set_name(ingredient_id, name)
+
+            postings = defaultdict(set)
+            rows = RecipeIngredients.objects.values_list('ingredient_id', 'recipe_id').iterator(chunk_size=5000)
+            for ingredient_id, recipe_id in rows:
+                if recipe_id in postings[ingredient_id]:
+                    self.duplicates[(ingredient_id, recipe_id)] += 1
+                postings[ingredient_id].add(recipe_id)
+                self.max_recipe_id = max(self.max_recipe_id, recipe_id)
+
+            for ingredient_id, recipe_ids in postings.items():
+                if self.is_dense(len(recipe_ids)):
+                    self.dense[ingredient_id] = to_bitmap(recipe_ids)
+                else:
+                    self.sparse[ingredient_id] = recipe_ids
+            self.seen = seen
+            self.built = True
+
+    def refresh(self):
+        """Build the index, rebuilding it when another worker has committed a change since"""
+        with self.lock:
+            if self.built and self.generation.current() != self.seen:
+                self.reset()
+            self.build()
+
+    def is_dense(self, size):
+        return size >= max(self.min_dense_size, self.max_recipe_id // self.dense_ratio)
+
+    #---------------UPDATES---------------#
+    def set_name(self, ingredient_id, name):
+        old = self.ingredient_names.pop(ingredient_id, None)
+        if old is not None:
+            self.names[old].discard(ingredient_id)
+        if name:
+            name = name.strip().lower()
+            self.ingredient_names[ingredient_id] = name
+            self.names[name].add(ingredient_id)
+
+    def contains(self, ingredient_id, recipe_id):
+        if ingredient_id in self.dense:
+            return bool(self.dense[ingredient_id] >> recipe_id & 1)
+        return recipe_id in self.sparse.get(ingredient_id, ())
+
+    def add(self, ingredient_id, recipe_id):
+        with self.lock:
+            if not self.built:
+                return
+            if self.contains(ingredient_id, recipe_id):
+                self.duplicates[(ingredient_id, recipe_id)] += 1
+                return
+            self.max_recipe_id = max(self.max_recipe_id, recipe_id)
+            if ingredient_id in self.dense:
+                self.dense[ingredient_id] |= 1 << recipe_id
+                return
+            posting = self.sparse[ingredient_id]
+            posting.add(recipe_id)
+            if self.is_dense(len(posting)):
+                self.dense[ingredient_id] = to_bitmap(self.sparse.pop(ingredient_id))
+
+    def remove(self, ingredient_id, recipe_id):
+        with self.lock:
+            if not self.built:
+                return
+            key = (ingredient_id, recipe_id)
+            if self.duplicates[key]:
+                # Another row still links this recipe to the ingredient
+                self.duplicates[key] -= 1
+                if not self.duplicates[key]:
+                    del self.duplicates[key]
+                return
+            self.duplicates.pop(key, None)
+            if ingredient_id in self.dense:
+                self.dense[ingredient_id] &= ~(1 << recipe_id)
+            elif ingredient_id in self.sparse:
+                self.sparse[ingredient_id].discard(recipe_id)
+
+    def rename(self, ingredient_id, name):
+        with self.lock:
+            if self.built:
+                self.set_name(ingredient_id, name)
+
+    def publish(self):
+        """Tell the other workers about the changes just applied, once they have committed"""
+        with self.lock:
+            generation = self.generation.bump()
+            # Still current unless another worker committed a change this one has not applied
+            if self.built and generation is not None and generation - 1 == self.seen:
+                self.seen = generation
+
+    #---------------QUERIES---------------#
+    def resolve(self, terms):
+        """Turn requested ingredient names or ids into one set of ingredient ids per term"""
+        self.refresh()
+        with self.lock:
+            groups = []
+            for term in terms:
+                term = str(term).strip()
+                if term.isdigit():
+                    groups.append({int(term)})
+                else:
+                    groups.append(set(self.names.get(term.lower(), ())))
+            return groups
+
+    def bitmap(self, ingredient_ids):
+        """Recipes using any of the given ingredients"""
+        bitmap = 0
+        loose = set()
+        for ingredient_id in ingredient_ids:
+            if ingredient_id in self.dense:
+                bitmap |= self.dense[ingredient_id]
+            elif ingredient_id in self.sparse:
+                loose |= self.sparse[ingredient_id]
+        return bitmap | to_bitmap(loose)
+
+    def query(self, groups, min_match=1, limit=DEFAULT_MAX_RESULTS):
+        """
+        Recipes using at least min_match of the requested ingredient groups,
+        as (recipe_id, matched) pairs ordered by matched, then newest first.
+        """
+        self.build()
+        with self.lock:
+            bitmaps = [self.bitmap(group) for group in groups]
+
+        # Bit-sliced counter: bit n of counter[i] is bit i of recipe n's match count
+        counter = []
+        for bitmap in bitmaps:
+            carry = bitmap
+            for i, digit in enumerate(counter):
+                counter[i], carry = digit ^ carry, digit & carry
+                if not carry:
+                    break
+            if carry:
+                counter.append(carry)
+
+        union = 0
+        for bitmap in bitmaps:
+            union |= bitmap
+
+        results = []
+        for matched in range(len(bitmaps), max(min_match, 1) - 1, -1):
+            if matched >> len(counter):
+                continue
+            level = union
+            for i, digit in enumerate(counter):
+                level &= digit if matched >> i & 1 else ~digit
+            for recipe_id in iter_bits_descending(level):
+                results.append((recipe_id, matched))
+                if len(results) >= limit:
+                    return results
+        return results
+
+#---------------INDEX LOOKUP---------------#
+_index = None
+_index_lock = threading.Lock()
+
+def get_ingredient_index():
+    """The process-wide ingredient index"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = IngredientIndex()
+    return _index
+
+def match_recipes(terms, min_match=1, limit=None):
+    """Recipes ranked by how many of the requested ingredients they use"""
+    if limit is None:
+        limit = getattr(settings, 'INGREDIENT_MATCH_MAX_RESULTS', DEFAULT_MAX_RESULTS)
+    index = get_ingredient_index()
+    return index.query(index.resolve(terms), min_match=min_match, limit=limit)
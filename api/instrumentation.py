@@ -0,0 +1,42 @@
+import time
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# Called with (sql, params, many, context, start, end) after every statement,
+# failed ones included; see query_sink
+QUERY_SINKS = []
+
+#---------------SINKS---------------#
+def query_sink(sink):
+    """Register a function to be told about every statement, as a decorator"""
+    if sink not in QUERY_SINKS:
+        QUERY_SINKS.append(sink)
+    return sink
+
+#---------------EXECUTE WRAPPER---------------#
+def instrument_query(execute, sql, params, many, context):
+    """Times each statement once for every sink: request metrics, the slow query log, traces"""
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        end = time.perf_counter()
+        for sink in QUERY_SINKS:
+            sink(sql, params, many, context, start, end)
+
+def install(connection):
+    # Pooled connections fire connection_created on every checkout
+    if instrument_query not in connection.execute_wrappers:
+        # Outermost, since connection.execute_wrapper() pops the last wrapper on exit
+        connection.execute_wrappers.insert(0, instrument_query)
+
+@receiver(connection_created)
+def instrument_new_connection(sender, connection, **kwargs):
+    install(connection)
+
+def instrument_open_connections():
+    # Connections opened before this module was loaded missed the signal
+    for connection in connections.all(initialized_only=True):
+        install(connection)
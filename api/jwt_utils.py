@@ -1,20 +1,39 @@
 from datetime import datetime, timedelta
+import hashlib
+import threading
+import time
+import uuid
 import jwt
 from django.conf import settings
+from .lru import LRUCache
+
+ACCESS_TOKEN_LIFETIME = timedelta(days=1)
+REFRESH_TOKEN_LIFETIME = timedelta(days=7)
 
 def generate_tokens_for_user(user):
-    """Generate JWT tokens for the user"""
-    access_token_expiry = datetime.utcnow() + timedelta(days=1)
-    refresh_token_expiry = datetime.utcnow() + timedelta(days=7)
+    """
+    Generate JWT tokens for the user.
+    Every token carries a unique jti and a sub-second iat, so it can be revoked
+    on its own or with all tokens issued before a logout-everywhere.
+    """
+    issued_at = time.time()
+    access_token_expiry = datetime.utcnow() + ACCESS_TOKEN_LIFETIME
+    refresh_token_expiry = datetime.utcnow() + REFRESH_TOKEN_LIFETIME
     
     access_payload = {
         'user_id': user.id,
         'username': user.username,
+        'type': 'access',
+        'jti': uuid.uuid4().hex,
+        'iat': issued_at,
         'exp': access_token_expiry
     }
     
     refresh_payload = {
         'user_id': user.id,
+        'type': 'refresh',
+        'jti': uuid.uuid4().hex,
+        'iat': issued_at,
         'exp': refresh_token_expiry
     }
     
@@ -26,12 +45,52 @@ def generate_tokens_for_user(user):
         'refresh': refresh_token
     }
 
-def validate_token(token):
-    """Validate JWT token and return payload if valid"""
+def decode_token(token):
+    """Verify a JWT and return its payload, or None when it is invalid or expired"""
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
         return payload
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
-        return None
\ No newline at end of file
+        return None
+
+#---------------VERIFIED TOKEN MEMO---------------#
+_memo = None
+_memo_lock = threading.Lock()
+
+def get_token_memo():
+    """Process-wide LRU of token digest -> verified payload, sized by JWT_MEMO_MAX_SIZE"""
+    global _memo
+    if _memo is None:
+        with _memo_lock:
+            if _memo is None:
+                _memo = LRUCache(getattr(settings, 'JWT_MEMO_MAX_SIZE', 10000), ttl=0)
+    return _memo
+
+def token_digest(token):
+    # Keyed by digest so the memo never holds usable tokens
+    return hashlib.sha256(token.encode()).digest()
+
+def validate_token(token):
+    """
+    Validate JWT token and return payload if valid.
+    Tokens verified before are served from the memo until their exp claim;
+    invalid tokens are never memoized.
+    """
+    memo = get_token_memo()
+    key = token_digest(token)
+    payload = memo.get(key)
+    if payload is None:
+        payload = decode_token(token)
+        if payload is None:
+            return None
+        # Only tokens that expire are memoized, and only until they do
+        remaining = payload.get('exp', 0) - time.time()
+        if remaining > 0:
+            memo.set(key, payload, ttl=remaining)
+    # Callers get their own copy
+    return dict(payload)
+
+def token_memo_stats():
+    return get_token_memo().stats()
@@ -0,0 +1,68 @@
+from collections import defaultdict
+from .models import User, IdentifiedBy
+
+#---------------CREATOR PAYLOAD---------------#
+def creator_payload(creator):
+    """Shape a recipe creator the way the recipe endpoints return it"""
+    if creator is None:
+        return {
+            'userId': None,
+            'username': 'Unknown',
+            'firstName': '',
+            'lastName': ''
+        }
+    return {
+        'userId': creator.id,
+        'username': creator.username,
+        'firstName': creator.f_name,
+        'lastName': creator.l_name
+    }
+
+#---------------BATCHED LOADERS---------------#
+def category_links(recipes):
+    return (IdentifiedBy.objects
+            .filter(recipe_id__in=[recipe.recipe_id for recipe in recipes])
+            .select_related('category')
+            .order_by('id'))
+
+def group_categories(links):
+    categories = defaultdict(list)
+    for link in links:
+        categories[link.recipe_id].append({
+            'categoryId': link.category.category_id,
+            'catname': link.category.cat_name
+        })
+    return categories
+
+def creator_ids(recipes):
+    # Recipes without a creator column fall back to 'Unknown' without a query
+    user_ids = {getattr(recipe, 'user_id', None) for recipe in recipes}
+    user_ids.discard(None)
+    return user_ids
+
+def creator_payloads(recipes, users):
+    return {
+        recipe.recipe_id: creator_payload(users.get(getattr(recipe, 'user_id', None)))
+        for recipe in recipes
+    }
+
+def load_recipe_categories(recipes):
+    """Fetch the categories of a page of recipes in one query, keyed by recipe id"""
+    if not recipes:
+        return defaultdict(list)
+    return group_categories(category_links(recipes))
+
+def load_recipe_creators(recipes):
+    """Fetch the creators of a page of recipes in one query, keyed by recipe id"""
+    user_ids = creator_ids(recipes)
+    return creator_payloads(recipes, User.objects.in_bulk(user_ids) if user_ids else {})
+
+#---------------ASYNC LOADERS---------------#
+async def aload_recipe_categories(recipes):
+    if not recipes:
+        return defaultdict(list)
+    return group_categories([link async for link in category_links(recipes)])
+
+async def aload_recipe_creators(recipes):
+    user_ids = creator_ids(recipes)
+    return creator_payloads(recipes, await User.objects.ain_bulk(user_ids) if user_ids else {})
@@ -0,0 +1,82 @@
+import csv
+import json
+import os
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.passwords import bulk_hashing_executor
+from api.provisioning import provision_users
+
+#---------------READERS---------------#
+def read_jsonl(path):
+    with open(path, encoding='utf-8') as source:
+        for line in source:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+def read_csv(path):
+    """One user per row, with the columns username, email, password and optionally f_name, l_name, date_of_birth"""
+    with open(path, encoding='utf-8', newline='') as source:
+        yield from csv.DictReader(source)
+
+READERS = {
+    'jsonl': read_jsonl,
+    'csv': read_csv,
+}
+
+#---------------COMMAND---------------#
+class Command(BaseCommand):
+    help = (
+        'Register users from a JSONL or CSV file in batches: one uniqueness query, '
+        'pooled password hashing and one bulk insert per batch. Rows that fail '
+        'validation or clash with an existing user are reported and skipped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSONL or CSV file of users')
+        parser.add_argument('--format', choices=sorted(READERS), help='Input format, from the file extension by default')
+        parser.add_argument('--batch-size', type=int, default=500, help='Users per transaction')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Password hashing processes')
+        parser.add_argument('--output', help='JSONL file receiving one result per input row')
+        parser.add_argument('--tokens', action='store_true', help='Include access and refresh tokens in --output')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if fmt not in READERS:
+            raise CommandError(f'Unknown format {fmt!r}, use --format')
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist')
+        if options['tokens'] and not options['output']:
+            raise CommandError('--tokens needs --output')
+
+        batch_size = max(options['batch_size'], 1)
+        rows = READERS[fmt](path)
+        output = open(options['output'], 'w', encoding='utf-8') if options['output'] else None
+        executor = bulk_hashing_executor(options['workers'])
+        created = failed = offset = 0
+        try:
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                for result in provision_users(batch, issue_tokens=options['tokens'], executor=executor):
+                    result['index'] += offset
+                    if result['status'] == 'created':
+                        created += 1
+                    else:
+                        failed += 1
+                        self.stderr.write(f"Row {result['index'] + 1}: {'; '.join(result['errors'])}")
+                    if output:
+                        output.write(json.dumps(result) + '\n')
+                offset += len(batch)
+                self.stdout.write(f'{created} users created')
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            if output:
+                output.close()
+
+        self.stdout.write(self.style.SUCCESS(f'Created {created} users, {failed} rows failed'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.revocation import compact_deny_list
+
+class Command(BaseCommand):
+    help = (
+        'Delete revoked refresh tokens that have expired and logout-everywhere cutoffs '
+        'older than the refresh token lifetime. Running servers also do this when they '
+        'rebuild their deny-list filter; schedule this for quiet deployments.'
+    )
+
+    def handle(self, *args, **options):
+        expired, stale = compact_deny_list()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {expired} expired revoked tokens and {stale} stale cutoffs'))
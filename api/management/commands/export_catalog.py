@@ -0,0 +1,263 @@
+import gzip
+import json
+import multiprocessing
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max, Min
+
+from api.models import IdentifiedBy, Recipe, RecipeIngredients, RecipeNutrition, Review
+from api.nutrition import build_summaries, summary_payload
+
+FORMATS = ('ndjson', 'parquet')
+COMPRESSIONS = ('gzip', 'zstd', 'none')
+
+#---------------RECORD BUILDING---------------#
+def iter_recipe_batches(start, stop, batch_size):
+    """
+    Recipes with start <= recipe_id < stop in keyset-paged batches.
+    mysqlclient buffers a whole result set on the client, so each batch is its
+    own bounded query rather than one long cursor.
+    """
+    last = start - 1
+    while True:
+        batch = list(Recipe.objects
+                     .filter(recipe_id__gt=last, recipe_id__lt=stop)
+                     .order_by('recipe_id')[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last = batch[-1].recipe_id
+
+def build_records(recipes, chunk_size):
+    """Catalog records for a batch of recipes, with a fixed number of queries"""
+    ids = [recipe.recipe_id for recipe in recipes]
+
+    categories = defaultdict(list)
+    links = (IdentifiedBy.objects
+             .filter(recipe_id__in=ids)
+             .order_by('id')
+             .values_list('recipe_id', 'category__cat_name'))
+    for recipe_id, name in links.iterator(chunk_size=chunk_size):
+        categories[recipe_id].append(name)
+
+    ingredients = defaultdict(list)
+    rows = (RecipeIngredients.objects
+            .filter(recipe_id__in=ids)
+            .order_by('id')
+            .values_list('recipe_id', 'ingredient_id', 'ingredient__ingredient_name', 'quantity__quantity_amount', 'unit__unit_name'))
+    for recipe_id, ingredient_id, name, amount, unit in rows.iterator(chunk_size=chunk_size):
+        ingredients[recipe_id].append({
+            'ingredientId': ingredient_id,
+            'name': name,
+            'amount': amount,
+            'unit': unit
+        })
+
+    nutrition = {summary.recipe_id: summary for summary in RecipeNutrition.objects.filter(recipe_id__in=ids)}
+    missing = [recipe_id for recipe_id in ids if recipe_id not in nutrition]
+    if missing:
+        nutrition.update(build_summaries(missing))
+
+    reviews = defaultdict(list)
+    rows = (Review.objects
+            .filter(recipe_id__in=ids)
+            .order_by('review_id')
+            .values_list('recipe_id', 'review_id', 'user_id', 'rating', 'comment', 'date_created'))
+    for recipe_id, review_id, user_id, rating, comment, date_created in rows.iterator(chunk_size=chunk_size):
+        reviews[recipe_id].append({
+            'reviewId': review_id,
+            'userId': user_id,
+            'rating': rating,
+            'comment': comment,
+            'dateCreated': date_created.isoformat() if date_created else None
+        })
+
+    for recipe in recipes:
+        summary = summary_payload(nutrition[recipe.recipe_id])
+        yield {
+            'recipeId': recipe.recipe_id,
+            'name': recipe.recipe_name,
+            'description': recipe.recipe_description,
+            'difficulty': recipe.recipe_difficulty,
+            'dateAdded': recipe.date_added.isoformat(),
+            'categories': categories[recipe.recipe_id],
+            'ingredients': ingredients[recipe.recipe_id],
+            'totalCalories': summary['totalCalories'],
+            'totalProtein': summary['totalProtein'],
+            'reviews': reviews[recipe.recipe_id]
+        }
+
+#---------------SHARD WRITERS---------------#
+def open_text(path, compression):
+    if compression == 'gzip':
+        return gzip.open(path, 'wt', encoding='utf-8')
+    if compression == 'zstd':
+        import zstandard
+        return zstandard.open(path, 'wt', encoding='utf-8')
+    return open(path, 'w', encoding='utf-8')
+
+class NDJSONWriter:
+    def __init__(self, path, compression):
+        self.file = open_text(path, compression)
+
+    def write(self, records):
+        for record in records:
+            self.file.write(json.dumps(record, ensure_ascii=False))
+            self.file.write('\n')
+
+    def close(self):
+        self.file.close()
+
+class ParquetWriter:
+    """One Parquet row group per batch, so a shard is never held in memory"""
+
+    def __init__(self, path, compression):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        ingredient = pa.struct([
+            ('ingredientId', pa.int64()),
+            ('name', pa.string()),
+            ('amount', pa.int64()),
+            ('unit', pa.string()),
+        ])
+        review = pa.struct([
+            ('reviewId', pa.int64()),
+            ('userId', pa.int64()),
+            ('rating', pa.int64()),
+            ('comment', pa.string()),
+            ('dateCreated', pa.string()),
+        ])
+        self.schema = pa.schema([
+            ('recipeId', pa.int64()),
+            ('name', pa.string()),
+            ('description', pa.string()),
+            ('difficulty', pa.int64()),
+            ('dateAdded', pa.string()),
+            ('categories', pa.list_(pa.string())),
+            ('ingredients', pa.list_(ingredient)),
+            ('totalCalories', pa.float64()),
+            ('totalProtein', pa.float64()),
+            ('reviews', pa.list_(review)),
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema, compression=compression)
+
+    def write(self, records):
+        records = list(records)
+        if records:
+            self.writer.write_table(self.pa.Table.from_pylist(records, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+WRITERS = {
+    'ndjson': NDJSONWriter,
+    'parquet': ParquetWriter,
+}
+
+def shard_path(directory, shard, fmt, compression):
+    name = f'catalog-{shard:05d}.{"ndjson" if fmt == "ndjson" else "parquet"}'
+    if fmt == 'ndjson' and compression != 'none':
+        name += '.gz' if compression == 'gzip' else '.zst'
+    return os.path.join(directory, name)
+
+def export_shard(shard, start, stop, options):
+    """Write the recipes in [start, stop) to one shard file and return its manifest entry"""
+    path = shard_path(options['output'], shard, options['format'], options['compression'])
+    # Written under a temporary name so an interrupted export leaves no truncated shard
+    tmp = f'{path}.partial'
+    writer = WRITERS[options['format']](tmp, options['compression'])
+    count = 0
+    try:
+        for recipes in iter_recipe_batches(start, stop, options['batch_size']):
+            writer.write(build_records(recipes, options['batch_size']))
+            count += len(recipes)
+    finally:
+        writer.close()
+    os.replace(tmp, path)
+    return {'shard': shard, 'file': os.path.basename(path), 'firstId': start, 'stopId': stop, 'recipes': count}
+
+def init_worker():
+    # Spawned workers start from a bare interpreter
+    import django
+    django.setup()
+
+def key_ranges(low, high, shards):
+    """Split [low, high] into at most `shards` contiguous id ranges"""
+    size = max((high - low + 1 + shards - 1) // shards, 1)
+    return [(start, min(start + size, high + 1)) for start in range(low, high + 1, size)]
+
+#---------------COMMAND---------------#
+class Command(BaseCommand):
+    help = (
+        'Export the recipe catalog (categories, ingredients, nutrition totals and reviews) '
+        'as sharded, compressed NDJSON or Parquet files, one shard per recipe id range.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Directory the shards and manifest.json are written to')
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument('--compression', choices=COMPRESSIONS, default='gzip')
+        parser.add_argument('--workers', type=int, default=1, help='Parallel worker processes')
+        parser.add_argument('--shards', type=int, help='Number of output files, one per worker by default')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Recipes read and written per batch')
+
+    def handle(self, *args, **options):
+        self.check_dependencies(options)
+        os.makedirs(options['output'], exist_ok=True)
+        options['batch_size'] = max(options['batch_size'], 1)
+        workers = max(options['workers'], 1)
+        shards = max(options['shards'] or workers, 1)
+
+        bounds = Recipe.objects.aggregate(low=Min('recipe_id'), high=Max('recipe_id'))
+        ranges = key_ranges(bounds['low'], bounds['high'], shards) if bounds['low'] is not None else []
+        settings = {key: options[key] for key in ('output', 'format', 'compression', 'batch_size')}
+
+        manifest = []
+        if workers == 1:
+            for shard, (start, stop) in enumerate(ranges):
+                manifest.append(self.report(export_shard(shard, start, stop, settings)))
+        else:
+            # Workers open their own connections
+            connections.close_all()
+            # Spawned, since a forked worker would inherit the parent's Django state and sockets
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=init_worker) as pool:
+                futures = [pool.submit(export_shard, shard, start, stop, settings) for shard, (start, stop) in enumerate(ranges)]
+                for future in as_completed(futures):
+                    manifest.append(self.report(future.result()))
+
+        manifest.sort(key=lambda entry: entry['shard'])
+        with open(os.path.join(options['output'], 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'format': options['format'],
+                'compression': options['compression'],
+                'recipes': sum(entry['recipes'] for entry in manifest),
+                'shards': manifest
+            }, f, indent=2)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported {sum(entry["recipes"] for entry in manifest)} recipes to {len(manifest)} shards'
+        ))
+
+    def check_dependencies(self, options):
+        if options['format'] == 'parquet':
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise CommandError('Parquet output needs pyarrow installed')
+            if options['compression'] == 'none':
+                options['compression'] = None
+        elif options['compression'] == 'zstd':
+            try:
+                import zstandard  # noqa: F401
+            except ImportError:
+                raise CommandError('zstd compression needs the zstandard package installed')
+
+    def report(self, entry):
+        self.stdout.write(f'Shard {entry["shard"]}: {entry["recipes"]} recipes -> {entry["file"]}')
+        return entry
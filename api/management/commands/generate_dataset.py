@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.dataset import SCALES, generate_dataset
+
+#---------------COMMAND---------------#
+class Command(BaseCommand):
+    help = (
+        'Fill the database with a reproducible synthetic catalog: users, categories, '
+        'ingredients and nutrition, recipes with their ingredients and reviews, and '
+        'cookbooks with entries and subscribers, with skewed popularity. Rows are '
+        'added after whatever is already there.'
+    )
+
+    def add_arguments(self, parser):
+        size = parser.add_mutually_exclusive_group(required=True)
+        size.add_argument('--scale', choices=sorted(SCALES), help='Number of recipes: 10k, 100k or 1m')
+        size.add_argument('--recipes', type=int, help='Number of recipes')
+        parser.add_argument('--seed', type=int, default=0, help='The same seed on an empty database gives the same rows')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Recipes per transaction')
+
+    def handle(self, *args, **options):
+        recipes = SCALES[options['scale']] if options['scale'] else options['recipes']
+        if recipes < 1:
+            raise CommandError('--recipes must be at least 1')
+
+        counts = generate_dataset(recipes, seed=options['seed'], batch_size=max(options['batch_size'], 1), log=self.stdout.write)
+        for table, count in counts.items():
+            self.stdout.write(f'{table}: {count}')
@@ -0,0 +1,345 @@
+import csv
+import json
+import math
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connections, transaction
+from django.utils import timezone
+
+from api.bulk import (
+    LookupConflict,
+    after_bulk_write,
+    bulk_create_nutrition,
+    bulk_create_recipe_ingredients,
+    bulk_create_with_ids,
+    resolve_lookup,
+    resolve_quantities,
+)
+from api.models import Category, IdentifiedBy, Ingredient, Nutrition, Recipe, RecipeIngredients, Unit
+
+# Attempts per chunk when a concurrent writer takes the same new ids or names
+MAX_ATTEMPTS = 3
+
+#---------------READERS---------------#
+# Readers yield raw records and parsers turn one into a dict, so a record that
+# does not parse is skipped like any other invalid one
+def read_jsonl(path):
+    with open(path, encoding='utf-8') as source:
+        for line in source:
+            line = line.strip()
+            if line:
+                yield line
+
+def parse_jsonl(line):
+    return json.loads(line)
+
+def read_csv(path):
+    with open(path, encoding='utf-8', newline='') as source:
+        yield from csv.DictReader(source)
+
+def parse_csv(row):
+    """
+    One recipe per row. `categories` is a ';' separated list and
+    `ingredients` a JSON array of ingredient objects.
+    """
+    row['categories'] = [c.strip() for c in (row.get('categories') or '').split(';') if c.strip()]
+    row['ingredients'] = json.loads(row.get('ingredients') or '[]')
+    return row
+
+READERS = {
+    'jsonl': (read_jsonl, parse_jsonl),
+    'csv': (read_csv, parse_csv),
+}
+
+#---------------VALIDATION---------------#
+# Column sizes of the recipe, category, ingredient and unit tables
+MAX_RECIPE_NAME = 50
+MAX_DESCRIPTION = 65535
+MAX_CATEGORY_NAME = 50
+MAX_INGREDIENT_NAME = 30
+MAX_UNIT_NAME = 50
+# DECIMAL(10, 2) columns of the nutrition table
+MAX_NUMBER = 10 ** 8
+
+def text(value, field, max_length, required=False):
+    if value is None:
+        value = ''
+    if not isinstance(value, str):
+        raise ValueError(f'{field} must be a string')
+    value = value.strip()
+    if required and not value:
+        raise ValueError(f'{field} is required')
+    if len(value) > max_length:
+        raise ValueError(f'{field} is longer than {max_length} characters')
+    return value
+
+def number(value, field):
+    """A finite, non-negative amount; missing means 0"""
+    if value is None or value == '':
+        return 0
+    if isinstance(value, bool):
+        raise ValueError(f'{field} must be a number')
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{field} must be a number')
+    if not math.isfinite(value) or not 0 <= value < MAX_NUMBER:
+        raise ValueError(f'{field} must be between 0 and {MAX_NUMBER}')
+    return value
+
+def normalize(record):
+    """Validate an input record into the shape import_chunk expects"""
+    if not isinstance(record, dict):
+        raise ValueError('record must be an object')
+    name = text(record.get('name'), 'name', MAX_RECIPE_NAME, required=True)
+    description = text(record.get('description'), 'description', MAX_DESCRIPTION, required=True)
+
+    difficulty = int(record.get('difficulty') or 1)
+    if not 1 <= difficulty <= 5:
+        raise ValueError('difficulty must be between 1 and 5')
+
+    date_added = text(record.get('date_added'), 'date_added', 32)
+    date_added = date.fromisoformat(date_added[:10]) if date_added else timezone.localdate()
+
+    categories = record.get('categories') or []
+    if not isinstance(categories, list):
+        raise ValueError('categories must be a list')
+    categories = [text(c, 'category', MAX_CATEGORY_NAME) for c in categories]
+
+    ingredients = []
+    items = record.get('ingredients') or []
+    if not isinstance(items, list):
+        raise ValueError('ingredients must be a list')
+    for ing in items:
+        if not isinstance(ing, dict):
+            raise ValueError('each ingredient must be an object')
+        if not ing.get('name'):
+            continue
+        ingredient = {
+            'name': text(ing['name'], 'ingredient name', MAX_INGREDIENT_NAME, required=True),
+            'amount': number(ing.get('amount'), 'amount'),
+            'unit': text(ing.get('unit'), 'unit', MAX_UNIT_NAME) or None,
+            'calories': number(ing.get('calories'), 'calories'),
+            'protein': number(ing.get('protein'), 'protein'),
+        }
+        if (ingredient['calories'] or ingredient['protein']) and not ingredient['unit']:
+            raise ValueError(f"nutrition for {ingredient['name']} needs a unit")
+        ingredients.append(ingredient)
+
+    return {
+        'name': name,
+        'description': description,
+        'difficulty': difficulty,
+        'date_added': date_added,
+        'categories': [c for c in categories if c],
+        'ingredients': ingredients,
+    }
+
+#---------------CHUNK IMPORT---------------#
+def write_chunk(records):
+    """Write one chunk of normalized records with a fixed number of bulk statements"""
+    recipes = [
+        Recipe(
+            recipe_name=r['name'],
+            recipe_description=r['description'],
+            recipe_difficulty=r['difficulty'],
+            date_added=r['date_added'],
+        )
+        for r in records
+    ]
+    bulk_create_with_ids(Recipe, recipes)
+
+    ingredient_rows = [ing for r in records for ing in r['ingredients']]
+    categories = resolve_lookup(Category, 'cat_name', [c for r in records for c in r['categories']])
+    ingredients = resolve_lookup(Ingredient, 'ingredient_name', [ing['name'] for ing in ingredient_rows])
+    units = resolve_lookup(Unit, 'unit_name', [ing['unit'] for ing in ingredient_rows])
+    quantities = resolve_quantities([round(ing['amount']) for ing in ingredient_rows])
+
+    links = {}
+    for recipe, r in zip(recipes, records):
+        for name in r['categories']:
+            category = categories[name]
+            links[(recipe.recipe_id, category.category_id)] = IdentifiedBy(recipe=recipe, category=category)
+    IdentifiedBy.objects.bulk_create(links.values())
+
+    bulk_create_recipe_ingredients([
+        RecipeIngredients(
+            recipe=recipe,
+            ingredient=ingredients[ing['name']],
+            quantity=quantities[round(ing['amount'])],
+            unit=units.get(ing['unit']),
+        )
+        for recipe, r in zip(recipes, records)
+        for ing in r['ingredients']
+    ])
+
+    bulk_create_nutrition([
+        Nutrition(
+            ingredient=ingredients[ing['name']],
+            calorie_count=ing['calories'],
+            protein_count=ing['protein'],
+            unit=units[ing['unit']],
+            serving_size=ing['amount'],
+        )
+        for ing in ingredient_rows
+        if ing['calories'] or ing['protein']
+    ])
+    after_bulk_write(recipes=recipes, ingredients=ingredients.values())
+
+def import_chunk(index, records):
+    """Import a chunk in its own transaction, retrying on id or name races"""
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                write_chunk(records)
+            return index, len(records)
+        except (IntegrityError, LookupConflict):
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
+
+def init_worker():
+    # Spawned workers start from a bare interpreter
+    import django
+    django.setup()
+
+#---------------CHECKPOINTS---------------#
+class Checkpoint:
+    """
+    Progress of an import, saved after every committed chunk.
+    `done` is the number of leading chunks all committed; `ahead` lists chunks
+    past it that parallel workers have already committed.
+    """
+
+    def __init__(self, path, source, batch_size):
+        self.path = path
+        self.source = os.path.abspath(source)
+        self.batch_size = batch_size
+        self.done = 0
+        self.ahead = set()
+        self.imported = 0
+        if path and os.path.exists(path):
+            self.load()
+
+    def load(self):
+        with open(self.path, encoding='utf-8') as f:
+            state = json.load(f)
+        if state['source'] != self.source or state['batch_size'] != self.batch_size:
+            raise CommandError('Checkpoint was written for another source or batch size')
+        self.done = state['done']
+        self.ahead = set(state['ahead'])
+        self.imported = state['imported']
+
+    def save(self):
+        if not self.path:
+            return
+        state = {
+            'source': self.source,
+            'batch_size': self.batch_size,
+            'done': self.done,
+            'ahead': sorted(self.ahead),
+            'imported': self.imported,
+        }
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp, self.path)
+
+    def is_done(self, index):
+        return index < self.done or index in self.ahead
+
+    def complete(self, index, count):
+        self.ahead.add(index)
+        self.imported += count
+        while self.done in self.ahead:
+            self.ahead.remove(self.done)
+            self.done += 1
+        self.save()
+
+#---------------COMMAND---------------#
+class Command(BaseCommand):
+    help = (
+        'Stream recipes from a JSONL or CSV file into the database in chunked bulk inserts. '
+        'Re-running with the same --checkpoint resumes after the last committed chunk. '
+        'Running servers pick the new recipes up in their in-process search and '
+        'ingredient indexes after a restart.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSONL or CSV file to import')
+        parser.add_argument('--format', choices=sorted(READERS), help='Input format, from the file extension by default')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Recipes per transaction')
+        parser.add_argument('--workers', type=int, default=1, help='Parallel worker processes')
+        parser.add_argument('--checkpoint', help='Progress file used to resume an interrupted import')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if fmt not in READERS:
+            raise CommandError(f'Unknown format {fmt!r}, use --format')
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist')
+
+        batch_size = max(options['batch_size'], 1)
+        workers = max(options['workers'], 1)
+        checkpoint = Checkpoint(options['checkpoint'], path, batch_size)
+        self.skipped = 0
+
+        read, parse = READERS[fmt]
+        chunks = self.chunks(read(path), parse, batch_size, checkpoint)
+        if workers == 1:
+            for index, records in chunks:
+                checkpoint.complete(*import_chunk(index, records))
+                self.report(checkpoint)
+        else:
+            self.run_parallel(chunks, workers, checkpoint)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {checkpoint.imported} recipes, skipped {self.skipped} invalid records'
+        ))
+
+    def chunks(self, records, parse, batch_size, checkpoint):
+        """Normalized chunks not yet committed, read lazily so memory stays flat"""
+        index = 0
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                return
+            if not checkpoint.is_done(index):
+                normalized = []
+                for position, record in enumerate(batch, start=index * batch_size + 1):
+                    try:
+                        normalized.append(normalize(parse(record)))
+                    except (ValueError, TypeError, KeyError) as e:
+                        self.skipped += 1
+                        self.stderr.write(f'Skipping record {position}: {e}')
+                yield index, normalized
+            index += 1
+
+    def run_parallel(self, chunks, workers, checkpoint):
+        # Workers open their own connections
+        connections.close_all()
+        in_flight = set()
+        # Spawned, since a forked worker would inherit the parent's Django state and sockets
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=init_worker) as pool:
+            for index, records in chunks:
+                in_flight.add(pool.submit(import_chunk, index, records))
+                # Keep a bounded number of chunks in memory
+                if len(in_flight) >= workers * 2:
+                    in_flight = self.collect(wait(in_flight, return_when=FIRST_COMPLETED), checkpoint)
+            while in_flight:
+                in_flight = self.collect(wait(in_flight, return_when=FIRST_COMPLETED), checkpoint)
+
+    def collect(self, waited, checkpoint):
+        finished, pending = waited
+        for future in finished:
+            checkpoint.complete(*future.result())
+        self.report(checkpoint)
+        return pending
+
+    def report(self, checkpoint):
+        self.stdout.write(f'{checkpoint.imported} recipes imported')
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.profiling import profile_token
+
+class Command(BaseCommand):
+    help = (
+        'Print a signed X-Profile header value. A request to an api/ route that '
+        'carries it is profiled, and the profile is listed in the admin under '
+        'Request profiles. The value is good for one request within '
+        'PROFILE_TOKEN_MAX_AGE seconds.'
+    )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'X-Profile: {profile_token()}')
+        self.stderr.write(f"Valid for {getattr(settings, 'PROFILE_TOKEN_MAX_AGE', 600)} seconds")
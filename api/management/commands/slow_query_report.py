@@ -0,0 +1,44 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.slow_queries import read_entries, summarize
+
+class Command(BaseCommand):
+    help = (
+        'Summarize the slow query log, with its rotated files, by query fingerprint: '
+        'how often each ran, its total, average and worst time, the views and code '
+        'lines that ran it, and its latest EXPLAIN plan. Worst total time first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', help='Log file, SLOW_QUERY_LOG by default')
+        parser.add_argument('--top', type=int, default=10, help='Fingerprints to show')
+        parser.add_argument('--json', action='store_true', help='Print the summary as JSON')
+
+    def handle(self, *args, **options):
+        path = options['log'] or getattr(settings, 'SLOW_QUERY_LOG', None)
+        if not path:
+            raise CommandError('Pass --log or set SLOW_QUERY_LOG')
+
+        rows = summarize(read_entries(path, getattr(settings, 'SLOW_QUERY_LOG_BACKUPS', 5)))[:options['top']]
+        if options['json']:
+            self.stdout.write(json.dumps(rows, indent=2, default=str))
+            return
+        if not rows:
+            self.stdout.write(f'No slow queries in {path}')
+            return
+
+        for rank, row in enumerate(rows, 1):
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{rank}. {row['fingerprint']}  total {row['totalMs']:.1f} ms  "
+                f"count {row['count']}  avg {row['avgMs']:.1f} ms  max {row['maxMs']:.1f} ms"
+            ))
+            self.stdout.write(f"   {row['sql']}")
+            for view, count in row['views']:
+                self.stdout.write(f'   view  {view} ({count})')
+            for frame, count in row['frames']:
+                self.stdout.write(f'   frame {frame} ({count})')
+            if row['explain'] is not None:
+                self.stdout.write(f"   plan  {json.dumps(row['explain'], default=str)}")
@@ -0,0 +1,297 @@
+import atexit
+import bisect
+import contextvars
+import glob
+import hmac
+import ipaddress
+import json
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+from django.urls import Resolver404, resolve
+from django.utils.deprecation import MiddlewareMixin
+
+from .instrumentation import query_sink
+
+PREFIX = 'ezchef'
+
+# name -> (help, bucket upper bounds); every one is labelled by route and method
+HISTOGRAMS = {
+    'http_request_duration_seconds': (
+        'Time from the first middleware to the response, by URL name',
+        (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+    ),
+    'http_response_size_bytes': (
+        'Response body size, by URL name',
+        (100, 1000, 10000, 100000, 1000000, 10000000),
+    ),
+    'db_queries_per_request': (
+        'SQL queries run while serving one request, by URL name',
+        (0, 1, 2, 3, 5, 10, 20, 50, 100),
+    ),
+}
+
+COUNTERS = {
+    'http_responses_total': 'Responses sent, by URL name and status code',
+    'db_query_seconds_total': 'Time spent in SQL queries, by URL name',
+    'serializer_seconds_total': 'Time spent turning objects into response data in serializers, by URL name',
+}
+
+# The request being served, if any, so queries and serializers can add to it
+current_request = contextvars.ContextVar('request_metrics', default=None)
+
+class RequestMetrics:
+    __slots__ = ('start', 'queries', 'query_seconds', 'serializer_seconds', 'serializing')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.serializing = False
+
+#---------------REGISTRY---------------#
+class Registry:
+    """
+    The metrics of this process: counters and cumulative histograms keyed by
+    (name, labels). With METRICS_DIR set, flush() writes them to a file of
+    their own there every METRICS_FLUSH_INTERVAL seconds, and collect() adds up
+    the files of every worker that has written one.
+    """
+
+    def __init__(self, directory=None, flush_interval=1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.pid = os.getpid()
+        # pid alone could be reused by a later worker and overwrite its totals
+        self.path = os.path.join(directory, f'{self.pid}-{uuid.uuid4().hex[:8]}.json') if directory else None
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}    # key -> [bucket counts..., sum, count]
+        self.flushed_at = time.monotonic()
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        bounds = HISTOGRAMS[name][1]
+        key = (name, labels)
+        with self.lock:
+            series = self.histograms.get(key)
+            if series is None:
+                series = self.histograms[key] = [0] * (len(bounds) + 2)
+            index = bisect.bisect_left(bounds, value)
+            if index < len(bounds):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), list(series)] for (name, labels), series in self.histograms.items()],
+            }
+
+    def maybe_flush(self):
+        if self.path is not None and time.monotonic() - self.flushed_at >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self.path is None:
+            return
+        self.flushed_at = time.monotonic()
+        temp = f'{self.path}.tmp'
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temp, 'w') as handle:
+                json.dump(self.snapshot(), handle)
+            # Readers never see a half-written file
+            os.replace(temp, self.path)
+        except OSError:
+            pass
+
+    def collect(self):
+        """The metrics of every worker sharing METRICS_DIR, or of this process alone"""
+        if self.path is None:
+            return [self.snapshot()]
+        self.flush()
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            try:
+                with open(path) as handle:
+                    snapshots.append(json.load(handle))
+            except (OSError, ValueError):
+                # Removed or replaced while we read it
+                continue
+        return snapshots
+
+def merge(snapshots):
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, series in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            total = histograms.get(key)
+            histograms[key] = series if total is None else [a + b for a, b in zip(total, series)]
+    return counters, histograms
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def format_labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in pairs) + '}'
+
+def render(snapshots):
+    """Prometheus text exposition format (version 0.0.4) of the merged snapshots"""
+    counters, histograms = merge(snapshots)
+    lines = []
+    for name, (help_text, bounds) in HISTOGRAMS.items():
+        lines += [f'# HELP {PREFIX}_{name} {help_text}', f'# TYPE {PREFIX}_{name} histogram']
+        for (series_name, labels), series in sorted(histograms.items()):
+            if series_name != name:
+                continue
+            cumulative = 0
+            for bound, count in zip((*bounds, '+Inf'), (*series[:len(bounds)], None)):
+                # The +Inf bucket counts every observation
+                cumulative = series[-1] if count is None else cumulative + count
+                lines.append(f'{PREFIX}_{name}_bucket{format_labels(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{PREFIX}_{name}_sum{format_labels(labels)} {series[-2]}')
+            lines.append(f'{PREFIX}_{name}_count{format_labels(labels)} {series[-1]}')
+    for name, help_text in COUNTERS.items():
+        lines += [f'# HELP {PREFIX}_{name} {help_text}', f'# TYPE {PREFIX}_{name} counter']
+        for (series_name, labels), value in sorted(counters.items()):
+            if series_name == name:
+                lines.append(f'{PREFIX}_{name}{format_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_registry():
+    """This process's registry, configured by METRICS_DIR and METRICS_FLUSH_INTERVAL"""
+    global _registry
+    registry = _registry
+    # A forked worker starts counting, and writing its file, afresh
+    if registry is None or registry.pid != os.getpid():
+        with _registry_lock:
+            if _registry is None or _registry.pid != os.getpid():
+                _registry = Registry(
+                    getattr(settings, 'METRICS_DIR', None),
+                    getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0),
+                )
+                atexit.register(_registry.flush)
+            registry = _registry
+    return registry
+
+@receiver(setting_changed)
+def reset_registry(setting, **kwargs):
+    global _registry
+    if setting.startswith('METRICS_'):
+        _registry = None
+
+#---------------INSTRUMENTATION---------------#
+@query_sink
+def count_query(sql, params, many, context, start, end):
+    record = current_request.get()
+    if record is not None:
+        record.queries += 1
+        record.query_seconds += end - start
+
+class SerializerTimingMixin:
+    """
+    Adds the time a serializer spends in to_representation to the current
+    request's metrics. Nested serializers and list items run inside their
+    parent's timing, so each object is counted once.
+    """
+
+    def to_representation(self, instance):
+        record = current_request.get()
+        if record is None or record.serializing:
+            return super().to_representation(instance)
+        record.serializing = True
+        start = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            record.serializer_seconds += time.perf_counter() - start
+            record.serializing = False
+
+def route_name(request):
+    """The URL name a request resolved to, never the raw path, so labels stay few"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        # Answered by a middleware before URL resolution, e.g. a 429
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return '<unmatched>'
+    return match.view_name or match.route
+
+class MetricsMiddleware(MiddlewareMixin):
+    """
+    Records latency, SQL queries and their time, serializer time and response
+    size of every request under its URL name. Keep it first in MIDDLEWARE so
+    the latency covers the other middleware and their early responses.
+    """
+
+    def process_request(self, request):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            return None
+        request.metrics = RequestMetrics()
+        current_request.set(request.metrics)
+        return None
+
+    def process_response(self, request, response):
+        record = getattr(request, 'metrics', None)
+        if record is None:
+            return response
+        current_request.set(None)
+        elapsed = time.perf_counter() - record.start
+        labels = (('route', route_name(request)), ('method', request.method))
+        registry = get_registry()
+        registry.observe('http_request_duration_seconds', labels, elapsed)
+        registry.observe('db_queries_per_request', labels, record.queries)
+        if not response.streaming:
+            registry.observe('http_response_size_bytes', labels, len(response.content))
+        registry.inc('http_responses_total', (*labels, ('status', response.status_code)))
+        if record.queries:
+            registry.inc('db_query_seconds_total', labels, record.query_seconds)
+        if record.serializer_seconds:
+            registry.inc('serializer_seconds_total', labels, record.serializer_seconds)
+        registry.maybe_flush()
+        return response
+
+#---------------EXPOSITION---------------#
+def scrape_allowed(request):
+    """
+    Whether the request comes straight from an address in METRICS_ALLOWED_IPS
+    or carries METRICS_TOKEN as a bearer token. The peer address is used, not
+    a forwarded one, so a proxy in front only passes scrapes with the token.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token and hmac.compare_digest(request.META.get('HTTP_AUTHORIZATION', '').encode(), f'Bearer {token}'.encode()):
+        return True
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network, strict=False) for network in getattr(settings, 'METRICS_ALLOWED_IPS', ()))
+
+def metrics_view(request):
+    if not scrape_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render(get_registry().collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -2,11 +2,13 @@ from django.utils.deprecation import MiddlewareMixin
 from django.http import JsonResponse
 from .jwt_utils import validate_token
 from .models import User
+from .revocation import get_deny_list
+from .user_cache import get_user
 
 class JWTAuthMiddleware(MiddlewareMixin):
     def process_request(self, request):
-        # Exclude authentication for certain paths
-        if request.path.startswith('/api/auth/'):
+        # Exclude authentication for certain paths; the metrics scraper sends its own token
+        if request.path.startswith('/api/auth/') or request.path == '/metrics':
             return None
         
         auth_header = request.META.get('HTTP_AUTHORIZATION', '')
@@ -15,10 +17,13 @@ class JWTAuthMiddleware(MiddlewareMixin):
         
         token = auth_header.split(' ')[1]
         payload = validate_token(token)
+        # Refresh tokens are only good for auth/refresh/; logged-out sessions are gone
+        if payload and (payload.get('type') == 'refresh' or get_deny_list().is_revoked(payload)):
+            payload = None
         
         if payload:
             try:
-                user = User.objects.get(id=payload['user_id'])
+                user = get_user(payload['user_id'])
                 request.user = user
             except User.DoesNotExist:
                 return JsonResponse({'error': 'User not found'}, status=401)
@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-18 11:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_subscribedcookbook_admin_admin'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeNutrition',
+            fields=[
+                ('recipe', models.OneToOneField(db_column='recipe_id', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='nutrition_summary', serialize=False, to='api.recipe')),
+                ('total_calories', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_protein', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('breakdown', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'recipe_nutrition',
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2 on 2026-10-18 11:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_recipenutrition'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevokedToken',
+            fields=[
+                ('jti', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('revoked_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'db_table': 'revoked_token',
+            },
+        ),
+        migrations.CreateModel(
+            name='TokenCutoff',
+            fields=[
+                ('user', models.OneToOneField(db_column='user_id', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='token_cutoff', serialize=False, to='api.user')),
+                ('revoked_before', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+            options={
+                'db_table': 'token_cutoff',
+            },
+        ),
+    ]
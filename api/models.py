@@ -189,3 +189,35 @@ class Review(models.Model):
         managed=False
         db_table = 'review'
         unique_together = (('user', 'recipe'),) # removed user, cookbook tuple
+
+#---------------RECIPE_NUTRITION TABLE---------------#
+class RecipeNutrition(models.Model):
+    # Materialized nutrition totals of a recipe, maintained by api.nutrition
+    recipe = models.OneToOneField('Recipe', db_column='recipe_id', on_delete=models.CASCADE, primary_key=True, related_name='nutrition_summary')
+    total_calories = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_protein = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    breakdown = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'recipe_nutrition'
+
+#---------------REVOKED_TOKEN TABLE---------------#
+class RevokedToken(models.Model):
+    # Refresh tokens revoked before they expire, see api.revocation
+    jti = models.CharField(max_length=32, primary_key=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        db_table = 'revoked_token'
+
+#---------------TOKEN_CUTOFF TABLE---------------#
+class TokenCutoff(models.Model):
+    # Every token issued to the user before revoked_before is revoked (logout everywhere)
+    user = models.OneToOneField('User', db_column='user_id', on_delete=models.CASCADE, primary_key=True, related_name='token_cutoff')
+    revoked_before = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        db_table = 'token_cutoff'
@@ -0,0 +1,105 @@
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.db import connections, router, transaction
+from django.db.models import Min
+
+from .detail_cache import invalidate_recipe_details
+from .models import Nutrition, Recipe, RecipeIngredients, RecipeNutrition
+
+REFRESH_BATCH_SIZE = 500
+
+#---------------SUMMARY BUILDING---------------#
+def save_summaries(summaries):
+    """Insert or overwrite the summaries in one statement"""
+    features = connections[router.db_for_write(RecipeNutrition)].features
+    RecipeNutrition.objects.bulk_create(
+        summaries,
+        update_conflicts=True,
+        # MySQL's ON DUPLICATE KEY UPDATE takes no conflict target, and Django refuses one there
+        unique_fields=['recipe'] if features.supports_update_conflicts_with_target else None,
+        update_fields=['total_calories', 'total_protein', 'breakdown', 'updated_at'],
+    )
+
+def build_summaries(recipe_ids):
+    """Compute nutrition summaries for many recipes in a fixed number of queries"""
+    summaries = {
+        recipe_id: RecipeNutrition(recipe_id=recipe_id, total_calories=Decimal(0), total_protein=Decimal(0), breakdown=[])
+        for recipe_id in recipe_ids
+    }
+    rows = (RecipeIngredients.objects
+            .filter(recipe_id__in=summaries)
+            .select_related('ingredient')
+            .order_by('id'))
+    rows = list(rows)
+
+    # First nutrition row per ingredient, as the detail view has always shown it
+    ingredient_ids = {row.ingredient_id for row in rows}
+    first_ids = (Nutrition.objects
+                 .filter(ingredient_id__in=ingredient_ids)
+                 .values('ingredient_id')
+                 .annotate(first=Min('nutrition_id'))
+                 .values('first'))
+    nutrition = {nutr.ingredient_id: nutr for nutr in Nutrition.objects.filter(nutrition_id__in=first_ids)}
+
+    for row in rows:
+        summary = summaries[row.recipe_id]
+        nutr = nutrition.get(row.ingredient_id)
+        calories = (nutr.calorie_count or Decimal(0)) if nutr else Decimal(0)
+        protein = (nutr.protein_count or Decimal(0)) if nutr else Decimal(0)
+        summary.total_calories += calories
+        summary.total_protein += protein
+        summary.breakdown.append({
+            'ingredientId': row.ingredient_id,
+            'ingredientName': row.ingredient.ingredient_name,
+            'nutritionId': nutr.nutrition_id if nutr else None,
+            'calorieCount': float(calories),
+            'proteinCount': float(protein)
+        })
+    return summaries
+
+def refresh_recipe_nutrition(recipe_ids):
+    """Recompute and store the summaries of the given recipes"""
+    recipe_ids = list(set(recipe_ids))
+    for start in range(0, len(recipe_ids), REFRESH_BATCH_SIZE):
+        batch = recipe_ids[start:start + REFRESH_BATCH_SIZE]
+        # Recipes deleted in the meantime have lost their summary with them
+        existing = Recipe.objects.filter(recipe_id__in=batch).values_list('recipe_id', flat=True)
+        summaries = build_summaries(list(existing))
+        save_summaries(summaries.values())
+        invalidate_recipe_details(summaries)
+
+def schedule_refresh(recipe_ids):
+    """Refresh once the current transaction commits, so a half-written recipe is never summarized"""
+    recipe_ids = [recipe_id for recipe_id in recipe_ids if recipe_id is not None]
+    if recipe_ids:
+        transaction.on_commit(lambda: refresh_recipe_nutrition(recipe_ids))
+
+def recipes_using_ingredients(ingredient_ids):
+    ingredient_ids = [ingredient_id for ingredient_id in ingredient_ids if ingredient_id is not None]
+    if not ingredient_ids:
+        return []
+    return RecipeIngredients.objects.filter(ingredient_id__in=ingredient_ids).values_list('recipe_id', flat=True).distinct()
+
+#---------------SUMMARY LOOKUP---------------#
+def summary_payload(summary):
+    return {
+        'totalCalories': float(summary.total_calories),
+        'totalProtein': float(summary.total_protein),
+        'ingredients': summary.breakdown
+    }
+
+def get_recipe_nutrition(recipe_id):
+    """The stored summary of a recipe, computed and stored on first use"""
+    summary = RecipeNutrition.objects.filter(recipe_id=recipe_id).first()
+    if summary is None:
+        summary = build_summaries([recipe_id])[recipe_id]
+        save_summaries([summary])
+    return summary
+
+async def aget_recipe_nutrition(recipe_id):
+    """get_recipe_nutrition for async views; only a missing summary leaves the event loop"""
+    summary = await RecipeNutrition.objects.filter(recipe_id=recipe_id).afirst()
+    if summary is None:
+        summary = await sync_to_async(get_recipe_nutrition)(recipe_id)
+    return summary
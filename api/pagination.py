@@ -0,0 +1,194 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+def query_params(request):
+    # DRF requests and the plain Django requests of async views
+    return getattr(request, 'query_params', request.GET)
+
+#---------------KEYSET PAGINATION---------------#
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over the queryset ordering plus the primary key.
+
+    The cursor is an opaque token holding the sort key of the last row served,
+    and the next page is fetched with a WHERE on that key instead of an OFFSET,
+    so page N costs the same as page 1. No COUNT(*) is ever issued.
+
+    Pagination only kicks in when the client sends `cursor` or `page_size`,
+    so existing clients keep receiving the plain list.
+    """
+    page_size = api_settings.PAGE_SIZE or 20
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request)
+        if queryset is None:
+            return None
+        return self.finish_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset for async views, fetching the page with the async ORM"""
+        queryset = self.page_queryset(queryset, request)
+        if queryset is None:
+            return None
+        return self.finish_page([obj async for obj in queryset])
+
+    def page_queryset(self, queryset, request):
+        """The unevaluated queryset of the requested page, or None when not paginating"""
+        params = query_params(request)
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+
+        self.request = request
+        self.model = queryset.model
+        self.ordering = self.get_ordering(queryset)
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.after(position))
+
+        # Fetch one extra row to know whether there is a next page
+        return queryset[:self.page_size + 1]
+
+    def finish_page(self, page):
+        self.has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+        self.next_position = self.position(page[-1]) if self.has_next else None
+        return page
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'results': data
+        }
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_ordering(self, queryset):
+        """Use the queryset ordering, always ending on the primary key as a tie-breaker"""
+        ordering = list(queryset.query.order_by or self.model._meta.ordering)
+        pk_name = self.model._meta.pk.name
+        if not any(field.lstrip('-') in ('pk', pk_name) for field in ordering):
+            descending = bool(ordering) and ordering[-1].startswith('-')
+            ordering.append(f'-{pk_name}' if descending else pk_name)
+        return ordering
+
+    def get_page_size(self, request):
+        try:
+            size = int(query_params(request)[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def position(self, obj):
+        """The sort key of a row, in ordering order"""
+        return [getattr(obj, field.lstrip('-')) for field in self.ordering]
+
+    def after(self, position):
+        """Filter for rows strictly after the given sort key"""
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def encode_cursor(self, position):
+        values = [self.to_json(value) for value in position]
+        return urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = query_params(request).get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            if len(values) != len(self.ordering):
+                raise ValueError
+            return [
+                self.get_field(field).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_field(self, field):
+        name = field.lstrip('-')
+        if name == 'pk':
+            return self.model._meta.pk
+        return self.model._meta.get_field(name)
+
+    @staticmethod
+    def to_json(value):
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        if isinstance(value, (int, float, str)) or value is None:
+            return value
+        return str(value)
+
+#---------------RANKED PAGINATION---------------#
+class RankedPagination(KeysetPagination):
+    """
+    Cursor pagination over an already ranked list, such as search results.
+    The cursor holds the rank reached; the list itself is capped by the caller.
+    """
+
+    def paginate_queryset(self, ranked, request, view=None):
+        params = query_params(request)
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        start = self.decode_cursor(request) or 0
+        page = ranked[start:start + self.page_size]
+        end = start + len(page)
+        self.next_position = end if end < len(ranked) else None
+        return page
+
+    def encode_cursor(self, position):
+        return super().encode_cursor([position])
+
+    def decode_cursor(self, request):
+        encoded = query_params(request).get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            start = int(json.loads(urlsafe_b64decode(encoded.encode('ascii')))[0])
+            if start < 0:
+                raise ValueError
+            return start
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
@@ -0,0 +1,131 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, check_password, identify_hasher, make_password
+from django.utils.crypto import constant_time_compare
+
+#---------------HASHER---------------#
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 with its cost taken from PASSWORD_HASH_ITERATIONS. It keeps the
+    pbkdf2_sha256 algorithm name, so existing hashes still verify and are
+    rehashed at the new cost on their next successful login.
+    """
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_HASH_ITERATIONS', PBKDF2PasswordHasher.iterations)
+
+#---------------VERIFICATION---------------#
+def verify_password(password, encoded):
+    """
+    Check a password against the stored value.
+    Returns (matches, replacement), where replacement is a new hash to store when
+    the stored value is a legacy plaintext password or uses outdated hasher settings.
+    """
+    if not encoded or password is None:
+        return False, None
+    try:
+        identify_hasher(encoded)
+    except ValueError:
+        # Accounts created before passwords were hashed store them as typed
+        if constant_time_compare(password, encoded):
+            return True, make_password(password)
+        return False, None
+
+    replacement = []
+    matches = check_password(password, encoded, setter=lambda raw: replacement.append(make_password(raw)))
+    return matches, replacement[0] if replacement else None
+
+#---------------HASHING POOL---------------#
+class HashingBusy(Exception):
+    """Raised when the hashing pool already holds as many jobs as it may queue"""
+
+def init_worker():
+    # Spawned workers start from a bare interpreter
+    import django
+    django.setup()
+
+class HashingPool:
+    """
+    Bounded executor for password hashing. At most workers jobs run at once and
+    queue_limit more may wait; past that, submit raises HashingBusy instead of
+    letting a login burst pile up.
+    """
+
+    def __init__(self, workers, queue_limit, kind='thread'):
+        if kind == 'process':
+            # Spawned, not forked: forking copies the lock state of the server's other threads
+            self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=init_worker)
+        else:
+            # hashlib releases the GIL while hashing, so threads run in parallel
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hashing')
+        self.slots = threading.BoundedSemaphore(workers + queue_limit)
+
+    def submit(self, fn, *args):
+        if not self.slots.acquire(blocking=False):
+            raise HashingBusy()
+        try:
+            future = self.executor.submit(fn, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda done: self.slots.release())
+        return future
+
+    async def run(self, fn, *args):
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_hashing_pool():
+    """The process-wide hashing pool, sized by the PASSWORD_HASHING_* settings"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = HashingPool(
+                    getattr(settings, 'PASSWORD_HASHING_WORKERS', 4),
+                    getattr(settings, 'PASSWORD_HASHING_QUEUE_LIMIT', 64),
+                    getattr(settings, 'PASSWORD_HASHING_EXECUTOR', 'thread'),
+                )
+    return _pool
+
+async def amake_password(password):
+    return await get_hashing_pool().run(make_password, password)
+
+async def averify_password(password, encoded):
+    return await get_hashing_pool().run(verify_password, password, encoded)
+
+#---------------BULK HASHING---------------#
+def bulk_hashing_executor(workers):
+    """
+    Process pool for hash_passwords, or None to hash inline when workers <= 1.
+    Workers are spawned rather than forked, so it is safe to start one from a
+    threaded server.
+    """
+    if workers <= 1:
+        return None
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=init_worker)
+
+_bulk_executor = None
+_bulk_executor_lock = threading.Lock()
+
+def get_bulk_hashing_executor():
+    """The process-wide pool for bulk registration, sized by BULK_HASHING_WORKERS"""
+    global _bulk_executor
+    if _bulk_executor is None:
+        with _bulk_executor_lock:
+            if _bulk_executor is None:
+                _bulk_executor = bulk_hashing_executor(getattr(settings, 'BULK_HASHING_WORKERS', 2)) or False
+    return _bulk_executor or None
+
+def hash_passwords(passwords, executor=None):
+    """make_password for many passwords, spread over the executor's workers when given"""
+    if executor is None:
+        return [make_password(password) for password in passwords]
+    return list(executor.map(make_password, passwords, chunksize=8))
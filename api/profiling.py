@@ -0,0 +1,239 @@
+import cProfile
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework.exceptions import AuthenticationFailed
+
+from .auth import bearer_user
+from .metrics import route_name
+from .models import Admin
+
+SALT = 'api.profiling'
+KEY_PREFIX = 'profile-token'
+HEADER = 'HTTP_X_PROFILE'
+QUERY_FLAG = 'profile'
+
+# Profile ids as written by save_profile, so a name from a URL cannot leave PROFILE_DIR
+PROFILE_ID = re.compile(r'^\d{8}T\d{12}-[\w.-]+-[0-9a-f]{8}$')
+EXTENSIONS = ('.prof', '.folded', '.json')
+
+# Innermost frames of threads that are waiting, not working
+IDLE = {
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('selectors.py', 'select'),
+    ('queue.py', 'get'),
+    ('thread.py', '_worker'),
+}
+
+#---------------TRIGGERS---------------#
+def profile_token():
+    """A value for the X-Profile header, good for PROFILE_TOKEN_MAX_AGE seconds"""
+    return signing.TimestampSigner(salt=SALT).sign(uuid.uuid4().hex)
+
+def valid_token(token):
+    """Whether token is a fresh X-Profile value that has not been used; checking it uses it up"""
+    max_age = getattr(settings, 'PROFILE_TOKEN_MAX_AGE', 600)
+    try:
+        nonce = signing.TimestampSigner(salt=SALT).unsign(token, max_age=max_age)
+    except signing.BadSignature:
+        return False
+    # Remembered for as long as the token would be good, so a replayed one is turned down
+    return caches[getattr(settings, 'PROFILE_TOKEN_CACHE', 'default')].add(f'{KEY_PREFIX}:{nonce}', True, timeout=max_age)
+
+def requested(request):
+    """
+    'header' or 'admin' when the request asked to be profiled with a signed
+    X-Profile header or, from a platform admin, with ?profile=1; None
+    otherwise. Unflagged requests cost two dictionary lookups.
+    """
+    header = request.META.get(HEADER)
+    flag = request.GET.get(QUERY_FLAG) == '1'
+    if header is None and not flag:
+        return None
+    if not getattr(settings, 'PROFILING_ENABLED', True) or not request.path.startswith('/api/'):
+        return None
+    if header is not None and valid_token(header):
+        return 'header'
+    if flag:
+        try:
+            user = bearer_user(request)
+        except AuthenticationFailed:
+            return None
+        if user is not None and Admin.objects.filter(admin=user).exists():
+            return 'admin'
+    return None
+
+#---------------PROFILER---------------#
+def frame_label(code):
+    filename = code.co_filename
+    if filename.startswith(str(settings.BASE_DIR)):
+        filename = os.path.relpath(filename, settings.BASE_DIR)
+    else:
+        filename = os.path.basename(filename)
+    # ';' separates frames in the collapsed stack format
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'.replace(';', ',')
+
+class RequestProfiler:
+    """
+    cProfile on the thread serving the request, for pstats, and a sampler
+    that takes the stacks of every busy thread each interval seconds, for
+    flame graphs. The sampler also sees the threads async views hand their
+    ORM calls to, which cProfile on Python 3.11 cannot follow, and any other
+    request served at the same time.
+    """
+
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.profile = cProfile.Profile()
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.sampler = threading.Thread(target=self.sample, name='request-profiler', daemon=True)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.sampler.start()
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profile.disable()
+        self.elapsed = time.perf_counter() - self.start
+        self.stopped.set()
+        self.sampler.join()
+        return False
+
+    def sample(self):
+        own = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own or (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame.f_code))
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        """Brendan Gregg's collapsed stack format, for flamegraph.pl, speedscope or inferno"""
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+#---------------STORAGE---------------#
+def profile_dir():
+    return str(getattr(settings, 'PROFILE_DIR', os.path.join(settings.BASE_DIR, 'logs', 'profiles')))
+
+def save_profile(profiler, request, response, trigger):
+    """Write the .prof, .folded and .json files of a profile and prune the directory; the profile id"""
+    directory = profile_dir()
+    route = re.sub(r'[^\w.-]', '_', route_name(request))
+    # Sorts oldest first, for pruning
+    profile_id = f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}-{route}-{uuid.uuid4().hex[:8]}"
+    base = os.path.join(directory, profile_id)
+    os.makedirs(directory, exist_ok=True)
+    profiler.profile.dump_stats(f'{base}.prof')
+    with open(f'{base}.folded', 'w') as handle:
+        handle.write(profiler.collapsed())
+    with open(f'{base}.json', 'w') as handle:
+        json.dump({
+            'id': profile_id,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'method': request.method,
+            'path': request.path,
+            'route': route_name(request),
+            'status': response.status_code,
+            'ms': round(profiler.elapsed * 1000, 3),
+            'samples': sum(profiler.stacks.values()),
+            'trigger': trigger,
+        }, handle)
+    prune(directory, getattr(settings, 'PROFILE_MAX_COUNT', 50), getattr(settings, 'PROFILE_MAX_BYTES', 200 * 1024 * 1024))
+    return profile_id
+
+def prune(directory, max_count, max_bytes):
+    """Delete the oldest profiles until at most max_count of them take at most max_bytes"""
+    sizes = {}
+    for name in os.listdir(directory):
+        profile_id, extension = os.path.splitext(name)
+        if extension in EXTENSIONS and PROFILE_ID.match(profile_id):
+            try:
+                sizes[profile_id] = sizes.get(profile_id, 0) + os.path.getsize(os.path.join(directory, name))
+            except FileNotFoundError:
+                continue
+    total = sum(sizes.values())
+    ids = sorted(sizes)
+    while ids and (len(ids) > max_count or total > max_bytes):
+        profile_id = ids.pop(0)
+        total -= sizes[profile_id]
+        for extension in EXTENSIONS:
+            try:
+                os.remove(os.path.join(directory, profile_id + extension))
+            except FileNotFoundError:
+                continue
+
+def list_profiles():
+    """The metadata of the stored profiles, newest first"""
+    directory = profile_dir()
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for name in sorted(names, reverse=True):
+        if not name.endswith('.json') or not PROFILE_ID.match(name[:-5]):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as handle:
+                profiles.append(json.load(handle))
+        except (OSError, ValueError):
+            # Pruned or still being written
+            continue
+    return profiles
+
+def profile_path(profile_id, extension):
+    """Path of a stored profile file, or None for anything else"""
+    if not PROFILE_ID.match(profile_id) or extension not in EXTENSIONS:
+        return None
+    path = os.path.join(profile_dir(), profile_id + extension)
+    return path if os.path.exists(path) else None
+
+#---------------MIDDLEWARE---------------#
+class ProfilingMiddleware(MiddlewareMixin):
+    """
+    Profiles requests to api/ routes that carry a signed X-Profile header
+    (see the profile_token command) or, from a platform admin, ?profile=1.
+    Their profiles are stored under PROFILE_DIR, named in the X-Profile-Id
+    response header, and listed in the admin under Profiles.
+    """
+
+    # Wraps the rest of the stack, which process_request and process_response cannot
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        trigger = requested(request)
+        if trigger is None:
+            return self.get_response(request)
+        with RequestProfiler(getattr(settings, 'PROFILE_SAMPLE_INTERVAL', 0.001)) as profiler:
+            response = self.get_response(request)
+        response['X-Profile-Id'] = save_profile(profiler, request, response, trigger)
+        return response
+
+    async def __acall__(self, request):
+        trigger = await sync_to_async(requested)(request) if HEADER in request.META or QUERY_FLAG in request.GET else None
+        if trigger is None:
+            return await self.get_response(request)
+        with RequestProfiler(getattr(settings, 'PROFILE_SAMPLE_INTERVAL', 0.001)) as profiler:
+            response = await self.get_response(request)
+        response['X-Profile-Id'] = await sync_to_async(save_profile)(profiler, request, response, trigger)
+        return response
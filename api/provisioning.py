@@ -0,0 +1,116 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils.dateparse import parse_date
+
+from .bulk import bulk_create_with_ids, lookup_key
+from .jwt_utils import generate_tokens_for_user
+from .models import User
+from .passwords import hash_passwords
+
+# Attempts per batch when a concurrent registration takes a username or email
+MAX_ATTEMPTS = 3
+
+REQUIRED_FIELDS = ('username', 'email', 'password')
+# Hashes are stored, so the password column length does not limit the input
+MAX_LENGTHS = {field.name: field.max_length for field in User._meta.fields if field.max_length and field.name != 'password'}
+
+#---------------VALIDATION---------------#
+def validate_row(row):
+    """Field errors of one requested user"""
+    if not isinstance(row, dict):
+        return ['Each user must be an object']
+    errors = [f'{field} is required' for field in REQUIRED_FIELDS if not row.get(field)]
+    for field in ('username', 'email', 'password', 'f_name', 'l_name'):
+        value = row.get(field)
+        if value is None or value == '':
+            continue
+        if not isinstance(value, str):
+            errors.append(f'{field} must be a string')
+        elif field in MAX_LENGTHS and len(value) > MAX_LENGTHS[field]:
+            errors.append(f'{field} must be at most {MAX_LENGTHS[field]} characters')
+    date_of_birth = row.get('date_of_birth')
+    if date_of_birth:
+        try:
+            valid = isinstance(date_of_birth, str) and parse_date(date_of_birth) is not None
+        except ValueError:
+            valid = False
+        if not valid:
+            errors.append('date_of_birth must be a YYYY-MM-DD date')
+    return errors
+
+def find_conflicts(rows):
+    """Usernames and emails of the rows that are already taken, in one query"""
+    usernames = {row['username'] for row in rows}
+    emails = {row['email'] for row in rows}
+    taken = User.objects.filter(Q(username__in=usernames) | Q(email__in=emails)).values_list('username', 'email')
+    taken_usernames, taken_emails = set(), set()
+    for username, email in taken:
+        taken_usernames.add(lookup_key(username))
+        taken_emails.add(lookup_key(email))
+    return taken_usernames, taken_emails
+
+#---------------PROVISIONING---------------#
+def provision_users(rows, issue_tokens=False, executor=None):
+    """
+    Register a batch of users with one uniqueness query, pooled password hashing
+    and one insert. Returns one result per input row, in order:
+    {'index', 'username', 'status': 'created' | 'error', 'id' | 'errors'},
+    plus 'token' and 'refresh' for created users when issue_tokens is set.
+    """
+    results = [{'index': index, 'username': row.get('username') if isinstance(row, dict) else None} for index, row in enumerate(rows)]
+    pending = []
+    seen_usernames, seen_emails = set(), set()
+    for result, row in zip(results, rows):
+        errors = validate_row(row)
+        if not errors:
+            username, email = lookup_key(row['username']), lookup_key(row['email'])
+            if username in seen_usernames:
+                errors.append('username is repeated in this batch')
+            if email in seen_emails:
+                errors.append('email is repeated in this batch')
+            seen_usernames.add(username)
+            seen_emails.add(email)
+        if errors:
+            result.update(status='error', errors=errors)
+        else:
+            pending.append((result, row))
+
+    # Hash once up front; a retry only re-checks uniqueness
+    hashes = hash_passwords([row['password'] for result, row in pending], executor)
+    pending = [(result, row, hashed) for (result, row), hashed in zip(pending, hashes)]
+
+    for attempt in range(MAX_ATTEMPTS):
+        taken_usernames, taken_emails = find_conflicts([row for result, row, hashed in pending]) if pending else (set(), set())
+        insert = []
+        for result, row, hashed in pending:
+            errors = []
+            if lookup_key(row['username']) in taken_usernames:
+                errors.append('Username is already taken')
+            if lookup_key(row['email']) in taken_emails:
+                errors.append('Email is already registered')
+            if errors:
+                result.update(status='error', errors=errors)
+            else:
+                insert.append((result, User(
+                    username=row['username'],
+                    email=row['email'],
+                    password=hashed,
+                    f_name=row.get('f_name') or '',
+                    l_name=row.get('l_name') or '',
+                    date_of_birth=row.get('date_of_birth') or None,
+                )))
+        try:
+            with transaction.atomic():
+                bulk_create_with_ids(User, [user for result, user in insert])
+            break
+        except IntegrityError:
+            # Someone registered one of the names since the check
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
+
+    for result, user in insert:
+        result.update(status='created', id=user.id)
+        if issue_tokens:
+            tokens = generate_tokens_for_user(user)
+            result.update(token=tokens['access'], refresh=tokens['refresh'])
+    return results
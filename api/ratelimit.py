@@ -0,0 +1,227 @@
+import math
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import JsonResponse
+from django.urls import Resolver404, resolve
+from django.utils.deprecation import MiddlewareMixin
+
+from .jwt_utils import validate_token
+
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+#---------------RULES---------------#
+class Rule:
+    """
+    One limit from a RATE_LIMITS policy, either a token bucket
+    ({'key': 'ip', 'rate': '10/min', 'burst': 5}) or a sliding window
+    ({'key': 'user', 'limit': 100, 'window': 3600}). 'methods' restricts it to
+    some HTTP methods. A 'user' rule falls back to the client IP for anonymous
+    requests.
+    """
+
+    def __init__(self, name, index, key='ip', rate=None, burst=None, limit=None, window=None, methods=None):
+        if key not in ('ip', 'user'):
+            raise ValueError(f'Unknown rate limit key {key!r}')
+        self.id = f'{name}:{index}'
+        self.key = key
+        self.methods = {method.upper() for method in methods} if methods else None
+        if rate is not None:
+            count, period = parse_rate(rate)
+            self.algorithm = 'bucket'
+            # One token comes back every interval seconds, up to burst tokens
+            self.interval = period / count
+            self.burst = burst or count
+        elif limit is not None and window is not None:
+            self.algorithm = 'window'
+            self.limit = limit
+            self.window = window
+        else:
+            raise ValueError(f'Rate limit {self.id} needs rate or limit and window')
+
+    def applies_to(self, method):
+        return self.methods is None or method in self.methods
+
+def parse_rate(rate):
+    """'10/min' -> (10, 60)"""
+    match = re.fullmatch(r'\s*(\d+)\s*/\s*(\d*)\s*([a-z]+)\s*', rate.lower())
+    if not match or match.group(3) not in PERIODS:
+        raise ValueError(f'Invalid rate {rate!r}')
+    return int(match.group(1)), int(match.group(2) or 1) * PERIODS[match.group(3)]
+
+#---------------BACKENDS---------------#
+class LocalBackend:
+    """
+    Per-process state. Every key holds one immutable value that is replaced
+    with a single dict assignment, so no lock is taken on the request path; two
+    threads racing on a key can at worst let one extra request through.
+    """
+    sweep_every = 1000
+
+    def __init__(self, max_keys):
+        self.max_keys = max_keys
+        self.state = {}
+        self.ops = 0
+        self.sweep_lock = threading.Lock()
+
+    def bucket(self, rule, key, now):
+        # GCRA: the bucket is the theoretical arrival time of the next request
+        tat = max(self.state.get(key, now), now) + rule.interval
+        wait = tat - now - rule.interval * rule.burst
+        if wait > 0:
+            return wait
+        self.store(key, tat, now)
+        return None
+
+    def window(self, rule, key, now):
+        # Sliding window estimated from the current and previous fixed windows
+        index, elapsed = divmod(now, rule.window)
+        current_index, current, previous, _ = self.state.get(key, (index, 0, 0, 0))
+        if current_index != index:
+            previous = current if current_index == index - 1 else 0
+            current = 0
+        estimate = previous * (1 - elapsed / rule.window) + current
+        if estimate + 1 > rule.limit:
+            return rule.window - elapsed
+        # Counts stop mattering once the next window has passed too
+        self.store(key, (index, current + 1, previous, (index + 2) * rule.window), now)
+        return None
+
+    def store(self, key, value, now):
+        self.state[key] = value
+        self.ops += 1
+        if self.ops % self.sweep_every == 0 and len(self.state) > self.max_keys:
+            self.sweep(now)
+
+    def sweep(self, now):
+        """Forget keys whose bucket has refilled or whose windows have passed"""
+        if not self.sweep_lock.acquire(blocking=False):
+            return
+        try:
+            for key, value in list(self.state.items()):
+                # A bucket's arrival time doubles as its expiry
+                expires = value if isinstance(value, float) else value[3]
+                if expires < now:
+                    self.state.pop(key, None)
+        finally:
+            self.sweep_lock.release()
+
+class CacheBackend:
+    """
+    State in a shared Django cache, so every process sees the same counts.
+    Windows count with atomic incr; buckets read and write their arrival time,
+    which can let a few extra requests through under contention.
+    """
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def bucket(self, rule, key, now):
+        tat = max(self.cache.get(key, now), now) + rule.interval
+        wait = tat - now - rule.interval * rule.burst
+        if wait > 0:
+            return wait
+        self.cache.set(key, tat, timeout=math.ceil(tat - now) + 1)
+        return None
+
+    def window(self, rule, key, now):
+        index, elapsed = divmod(now, rule.window)
+        current_key, previous_key = f'{key}:{int(index)}', f'{key}:{int(index) - 1}'
+        counts = self.cache.get_many([current_key, previous_key])
+        estimate = counts.get(previous_key, 0) * (1 - elapsed / rule.window) + counts.get(current_key, 0)
+        if estimate + 1 > rule.limit:
+            return rule.window - elapsed
+        if not self.cache.add(current_key, 1, timeout=rule.window * 2):
+            self.cache.incr(current_key)
+        return None
+
+#---------------LIMITER---------------#
+class RateLimiter:
+    def __init__(self, policies, backend):
+        self.backend = backend
+        self.policies = {
+            name: [Rule(name, index, **rule) for index, rule in enumerate(rules)]
+            for name, rules in policies.items()
+        }
+
+    def check(self, route, method, ip, user_id):
+        """Seconds to wait before retrying, or None when the request may go ahead"""
+        now = time.time()
+        for rule in self.policies.get(route, ()):
+            if not rule.applies_to(method):
+                continue
+            client = f'user:{user_id}' if rule.key == 'user' and user_id is not None else f'ip:{ip}'
+            key = f'ratelimit:{rule.id}:{client}'
+            if rule.algorithm == 'bucket':
+                wait = self.backend.bucket(rule, key, now)
+            else:
+                wait = self.backend.window(rule, key, now)
+            if wait is not None:
+                return wait
+        return None
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+def get_rate_limiter():
+    """The process-wide limiter built from RATE_LIMITS and RATE_LIMIT_CACHE"""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                alias = getattr(settings, 'RATE_LIMIT_CACHE', None)
+                backend = CacheBackend(alias) if alias else LocalBackend(getattr(settings, 'RATE_LIMIT_MAX_KEYS', 100000))
+                _limiter = RateLimiter(getattr(settings, 'RATE_LIMITS', {}), backend)
+    return _limiter
+
+@receiver(setting_changed)
+def reset_rate_limiter(setting, **kwargs):
+    global _limiter
+    if setting.startswith('RATE_LIMIT'):
+        _limiter = None
+
+#---------------CLIENT IDENTITY---------------#
+def client_ip(request):
+    # Behind a proxy, point RATE_LIMIT_IP_HEADER at the header it sets (e.g. HTTP_X_REAL_IP)
+    value = request.META.get(getattr(settings, 'RATE_LIMIT_IP_HEADER', 'REMOTE_ADDR'), '')
+    return value.split(',')[0].strip() or request.META.get('REMOTE_ADDR', '')
+
+def token_user_id(request):
+    """The user id of a valid bearer token, read from the token alone"""
+    auth_header = request.META.get('HTTP_AUTHORIZATION', '')
+    if not auth_header.startswith('Bearer '):
+        return None
+    payload = validate_token(auth_header.split(' ')[1])
+    return payload.get('user_id') if payload else None
+
+#---------------MIDDLEWARE---------------#
+class RateLimitMiddleware(MiddlewareMixin):
+    """
+    Applies the RATE_LIMITS policy of the matched URL name. It sits ahead of
+    everything that touches the database, so a rejected request costs no query
+    and no password hash; only the metrics, profiling, slow query and tracing
+    middleware come first, so that 429s are still counted and traced.
+    """
+
+    def process_request(self, request):
+        if not getattr(settings, 'RATE_LIMIT_ENABLED', True):
+            return None
+        limiter = get_rate_limiter()
+        try:
+            route = resolve(request.path_info).url_name
+        except Resolver404:
+            return None
+        if route not in limiter.policies:
+            return None
+        
+        wait = limiter.check(route, request.method, client_ip(request), token_user_id(request))
+        if wait is None:
+            return None
+        response = JsonResponse({'message': 'Too many requests, please retry later'}, status=429)
+        response['Retry-After'] = str(max(math.ceil(wait), 1))
+        return response
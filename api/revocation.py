@@ -0,0 +1,188 @@
+import datetime
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .jwt_utils import REFRESH_TOKEN_LIFETIME
+from .models import RevokedToken, TokenCutoff
+
+# Rows committed this long before the last sync are fetched again, so a slow
+# transaction that commits after the sync is not missed
+SYNC_OVERLAP = datetime.timedelta(seconds=60)
+
+#---------------BLOOM FILTER---------------#
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings. Membership tests never give false
+    negatives; false positives happen at about error_rate once `capacity`
+    keys have been added.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = max(capacity, 1)
+        self.size = max(int(-self.capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(round(self.size / self.capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, key):
+        # Double hashing: the k positions are h1 + i * h2
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] >> (position & 7) & 1 for position in self.positions(key))
+
+#---------------DENY LIST---------------#
+class DenyList:
+    """
+    Revoked refresh tokens (by jti) and logout-everywhere cutoffs (by user).
+
+    RevokedToken and TokenCutoff rows are the source of truth. Each process
+    keeps a Bloom filter of the revoked jtis and a dict of the cutoffs, so a
+    check is a few hash lookups. Only a Bloom hit has to be confirmed with a
+    query. New rows from other processes are picked up every sync_interval
+    seconds. Every rebuild_interval seconds expired rows are deleted and the
+    filter is rebuilt from what is left.
+    """
+
+    def __init__(self, capacity, error_rate, sync_interval, rebuild_interval):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self.lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.bloom = None        # built on first use
+            self.cutoffs = {}        # user_id -> revoked_before timestamp
+            self.watermark = None    # revoked_at / updated_at of the last sync
+            self.synced_at = 0.0
+            self.built_at = 0.0
+            self.confirmations = 0
+
+    def rebuild(self):
+        with self.lock:
+            compact_deny_list()
+            now = timezone.now()
+            rows = RevokedToken.objects.filter(expires_at__gt=now).values_list('jti', flat=True)
+            # Leave room to grow until the next rebuild
+            bloom = BloomFilter(max(self.capacity, rows.count() * 2), self.error_rate)
+            for jti in rows.iterator(chunk_size=10000):
+                bloom.add(jti)
+            self.bloom = bloom
+            self.cutoffs = {
+                user_id: revoked_before.timestamp()
+                for user_id, revoked_before in TokenCutoff.objects.values_list('user_id', 'revoked_before').iterator(chunk_size=10000)
+            }
+            self.watermark = now
+            self.synced_at = self.built_at = time.monotonic()
+
+    def sync(self):
+        """Bring the filter up to date when it is older than sync_interval"""
+        now = time.monotonic()
+        if self.bloom is not None and now - self.synced_at < self.sync_interval:
+            return
+        with self.lock:
+            if self.bloom is None or now - self.built_at >= self.rebuild_interval or self.bloom.count >= self.bloom.capacity:
+                self.rebuild()
+                return
+            if now - self.synced_at < self.sync_interval:
+                return
+            since = self.watermark - SYNC_OVERLAP
+            self.watermark = timezone.now()
+            for jti in RevokedToken.objects.filter(revoked_at__gte=since).values_list('jti', flat=True):
+                self.bloom.add(jti)
+            for user_id, revoked_before in TokenCutoff.objects.filter(updated_at__gte=since).values_list('user_id', 'revoked_before'):
+                self.cutoffs[user_id] = revoked_before.timestamp()
+            self.synced_at = now
+
+    def revoked_by(self, payload):
+        """
+        Why a verified token payload is revoked: 'cutoff' after a logout
+        everywhere, 'token' when its own jti was revoked, or None.
+        """
+        self.sync()
+        cutoff = self.cutoffs.get(payload.get('user_id'))
+        if cutoff is not None and payload.get('iat', 0) < cutoff:
+            return 'cutoff'
+        jti = payload.get('jti')
+        if jti is None or jti not in self.bloom:
+            return None
+        # Possibly a false positive
+        self.confirmations += 1
+        return 'token' if RevokedToken.objects.filter(jti=jti).exists() else None
+
+    def is_revoked(self, payload):
+        return self.revoked_by(payload) is not None
+
+    def revoke(self, payload):
+        """
+        Revoke one refresh token. Returns False when it had already been revoked,
+        which the database decides even when another process revoked it.
+        """
+        expires_at = datetime.datetime.fromtimestamp(payload['exp'], tz=datetime.timezone.utc)
+        try:
+            with transaction.atomic():
+                RevokedToken.objects.create(jti=payload['jti'], expires_at=expires_at)
+        except IntegrityError:
+            return False
+        self.sync()
+        with self.lock:
+            self.bloom.add(payload['jti'])
+        return True
+
+    def revoke_all(self, user_id):
+        """Logout everywhere: revoke every token issued to the user until now"""
+        revoked_before = timezone.now()
+        TokenCutoff.objects.update_or_create(user_id=user_id, defaults={'revoked_before': revoked_before})
+        self.sync()
+        with self.lock:
+            self.cutoffs[user_id] = revoked_before.timestamp()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'revokedTokens': self.bloom.count if self.bloom else 0,
+                'capacity': self.bloom.capacity if self.bloom else self.capacity,
+                'cutoffs': len(self.cutoffs),
+                'confirmations': self.confirmations
+            }
+
+def compact_deny_list():
+    """Delete rows that can no longer match an unexpired token"""
+    now = timezone.now()
+    expired = RevokedToken.objects.filter(expires_at__lte=now).delete()[0]
+    stale = TokenCutoff.objects.filter(revoked_before__lte=now - REFRESH_TOKEN_LIFETIME).delete()[0]
+    return expired, stale
+
+_deny_list = None
+_deny_list_lock = threading.Lock()
+
+def get_deny_list():
+    """The process-wide deny-list, configured by the TOKEN_DENY_LIST_* settings"""
+    global _deny_list
+    if _deny_list is None:
+        with _deny_list_lock:
+            if _deny_list is None:
+                _deny_list = DenyList(
+                    getattr(settings, 'TOKEN_DENY_LIST_CAPACITY', 1000000),
+                    getattr(settings, 'TOKEN_DENY_LIST_ERROR_RATE', 0.001),
+                    getattr(settings, 'TOKEN_DENY_LIST_SYNC_INTERVAL', 5),
+                    getattr(settings, 'TOKEN_DENY_LIST_REBUILD_INTERVAL', 3600),
+                )
+    return _deny_list
@@ -0,0 +1,362 @@
+import heapq
+import math
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .db_router import read_from_primary
+from .index_sync import IndexGeneration
+from .models import Recipe
+
+DEFAULT_SEARCH_BACKEND = 'api.search.InMemorySearchBackend'
+DEFAULT_MAX_RESULTS = 1000
+
+#---------------TEXT ANALYSIS---------------#
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+STOP_WORDS = frozenset((
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in',
+    'into', 'is', 'it', 'of', 'on', 'or', 'the', 'to', 'with',
+))
+
+# Porter's stemmer (M.F. Porter, "An algorithm for suffix stripping", 1980), so
+# that plurals and verb forms of a word share its stem: cake/cakes,
+# bake/baked/baking, cookie/cookies. Each step's rules go longest suffix
+# first, and only the first matching suffix is tried.
+STEP_2 = (
+    ('ational', 'ate'), ('tional', 'tion'), ('enci', 'ence'), ('anci', 'ance'),
+    ('izer', 'ize'), ('bli', 'ble'), ('alli', 'al'), ('entli', 'ent'), ('eli', 'e'),
+    ('ousli', 'ous'), ('ization', 'ize'), ('ation', 'ate'), ('ator', 'ate'),
+    ('alism', 'al'), ('iveness', 'ive'), ('fulness', 'ful'), ('ousness', 'ous'),
+    ('aliti', 'al'), ('iviti', 'ive'), ('biliti', 'ble'), ('logi', 'log'),
+)
+STEP_3 = (
+    ('icate', 'ic'), ('ative', ''), ('alize', 'al'), ('iciti', 'ic'),
+    ('ical', 'ic'), ('ful', ''), ('ness', ''),
+)
+STEP_4 = (
+    'al', 'ance', 'ence', 'er', 'ic', 'able', 'ible', 'ant', 'ement', 'ment',
+    'ent', 'ion', 'ou', 'ism', 'ate', 'iti', 'ous', 'ive', 'ize',
+)
+STEP_2 = sorted(STEP_2, key=lambda rule: -len(rule[0]))
+STEP_3 = sorted(STEP_3, key=lambda rule: -len(rule[0]))
+STEP_4 = sorted(STEP_4, key=len, reverse=True)
+
+def is_consonant(word, i):
+    if word[i] in 'aeiou':
+        return False
+    if word[i] == 'y':
+        return i == 0 or not is_consonant(word, i - 1)
+    return True
+
+def measure(word):
+    """m in Porter's [C](VC){m}[V]: the number of vowel-consonant runs"""
+    runs = 0
+    previous_vowel = False
+    for i in range(len(word)):
+        consonant = is_consonant(word, i)
+        if consonant and previous_vowel:
+            runs += 1
+        previous_vowel = not consonant
+    return runs
+
+def has_vowel(word):
+    return any(not is_consonant(word, i) for i in range(len(word)))
+
+def ends_double_consonant(word):
+    return len(word) >= 2 and word[-1] == word[-2] and is_consonant(word, len(word) - 1)
+
+def ends_cvc(word):
+    """Consonant, vowel, consonant other than w, x or y, as in hop or bak"""
+    return (len(word) >= 3 and is_consonant(word, len(word) - 3) and not is_consonant(word, len(word) - 2)
+            and is_consonant(word, len(word) - 1) and word[-1] not in 'wxy')
+
+def replace_suffix(word, rules, min_measure):
+    for suffix, replacement in rules:
+        if word.endswith(suffix):
+            stem = word[:-len(suffix)]
+            return stem + replacement if measure(stem) > min_measure else word
+    return word
+
+@lru_cache(maxsize=65536)
+def stem(token):
+    """The Porter stem of a lower-case word"""
+    word = token
+    if len(word) <= 2:
+        return word
+
+    # Step 1a: plurals
+    if word.endswith('sses') or word.endswith('ies'):
+        word = word[:-2]
+    elif word.endswith('s') and not word.endswith('ss'):
+        word = word[:-1]
+
+    # Step 1b: -ed and -ing, restoring an e or undoubling where the stem needs it
+    if word.endswith('eed'):
+        if measure(word[:-3]) > 0:
+            word = word[:-1]
+    else:
+        for suffix in ('ed', 'ing'):
+            if word.endswith(suffix) and has_vowel(word[:-len(suffix)]):
+                word = word[:-len(suffix)]
+                if word.endswith(('at', 'bl', 'iz')):
+                    word += 'e'
+                elif ends_double_consonant(word) and word[-1] not in 'lsz':
+                    word = word[:-1]
+                elif measure(word) == 1 and ends_cvc(word):
+                    word += 'e'
+                break
+
+    # Step 1c
+    if word.endswith('y') and has_vowel(word[:-1]):
+        word = word[:-1] + 'i'
+
+    word = replace_suffix(word, STEP_2, 0)
+    word = replace_suffix(word, STEP_3, 0)
+
+    # Step 4
+    for suffix in STEP_4:
+        if word.endswith(suffix):
+            base = word[:-len(suffix)]
+            if measure(base) > 1 and (suffix != 'ion' or base.endswith(('s', 't'))):
+                word = base
+            break
+
+    # Step 5
+    if word.endswith('e'):
+        m = measure(word[:-1])
+        if m > 1 or (m == 1 and not ends_cvc(word[:-1])):
+            word = word[:-1]
+    if measure(word) > 1 and ends_double_consonant(word) and word.endswith('l'):
+        word = word[:-1]
+    return word
+
+def tokenize(text):
+    """Lower-case word tokens of a piece of text, without stop words"""
+    return [token for token in TOKEN_RE.findall((text or '').lower()) if token not in STOP_WORDS]
+
+def analyze(text):
+    """Stemmed terms of a piece of text"""
+    return [stem(token) for token in tokenize(text)]
+
+#---------------SEARCH BACKENDS---------------#
+class SearchBackend:
+    """
+    Interface for recipe search backends.
+
+    search() returns up to `limit` (recipe_id, score) pairs, best match first.
+    The index_recipe/remove_recipe hooks are called from the Recipe signals,
+    and publish() once the changes of a commit have been applied.
+    """
+
+    def search(self, query, limit=DEFAULT_MAX_RESULTS):
+        raise NotImplementedError
+
+    def index_recipe(self, recipe):
+        pass
+
+    def remove_recipe(self, recipe_id):
+        pass
+
+    def publish(self):
+        pass
+
+    def reset(self):
+        pass
+
+
+class InMemorySearchBackend(SearchBackend):
+    """
+    In-process inverted index over recipe names and descriptions, ranked with BM25.
+
+    The index is built from the Recipe table on the first search and then kept
+    up to date by the Recipe save/delete signals. Each worker process holds its
+    own copy; a shared IndexGeneration tells it when another worker has
+    committed a change, and the next search rebuilds it.
+    """
+    k1 = 1.2
+    b = 0.75
+    # Name terms count more than description terms
+    name_weight = 3
+    max_prefix_terms = 50
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.generation = IndexGeneration('search')
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.built = False
+            self.seen = None                    # generation the index is current with
+            self.postings = defaultdict(dict)   # term -> {recipe_id: weighted tf}
+            self.doc_terms = {}                 # recipe_id -> {term: weighted tf}
+            self.doc_length = {}                # recipe_id -> weighted term count
+            self.total_length = 0
+            self.doc_words = {}                 # recipe_id -> unstemmed words
+            self.word_docs = Counter()          # unstemmed word -> recipes using it
+            self.vocabulary = []                # sorted unstemmed words, for prefix lookups
+
+    def build(self):
+        with self.lock:
+            if self.built:
+                return
+            # Read before the rows, so a change committed meanwhile triggers another rebuild
+            seen = self.generation.current()
+            read_from_primary()
+            recipes = (Recipe.objects
+                       .values_list('recipe_id', 'recipe_name', 'recipe_description')
+                       .iterator(chunk_size=2000))
+            for recipe_id, name, description in recipes:
+                self.add(recipe_id, name, description)
+            self.seen = seen
+            self.built = True
+
+    def refresh(self):
+        """Build the index, rebuilding it when another worker has committed a change since"""
+        with self.lock:
+            if self.built and self.generation.current() != self.seen:
+                self.reset()
+            self.build()
+
+    def add(self, recipe_id, name, description):
+        name_words, description_words = tokenize(name), tokenize(description)
+        terms = Counter()
+        for word in name_words:
+            terms[stem(word)] += self.name_weight
+        for word in description_words:
+            terms[stem(word)] += 1
+
+        self.discard(recipe_id)
+        self.doc_terms[recipe_id] = terms
+        self.doc_length[recipe_id] = sum(terms.values())
+        self.total_length += self.doc_length[recipe_id]
+        for term, tf in terms.items():
+            self.postings[term][recipe_id] = tf
+        words = self.doc_words[recipe_id] = frozenset(name_words + description_words)
+        for word in words:
+            if not self.word_docs[word]:
+                insort(self.vocabulary, word)
+            self.word_docs[word] += 1
+
+    def discard(self, recipe_id):
+        terms = self.doc_terms.pop(recipe_id, None)
+        if not terms:
+            return
+        self.total_length -= self.doc_length.pop(recipe_id)
+        for term in terms:
+            posting = self.postings[term]
+            posting.pop(recipe_id, None)
+            if not posting:
+                del self.postings[term]
+        for word in self.doc_words.pop(recipe_id):
+            self.word_docs[word] -= 1
+            if not self.word_docs[word]:
+                del self.word_docs[word]
+                self.vocabulary.pop(bisect_left(self.vocabulary, word))
+
+    def index_recipe(self, recipe):
+        with self.lock:
+            # An unbuilt index will pick the row up when it is built
+            if self.built:
+                self.add(recipe.recipe_id, recipe.recipe_name, recipe.recipe_description)
+
+    def remove_recipe(self, recipe_id):
+        with self.lock:
+            if self.built:
+                self.discard(recipe_id)
+
+    def publish(self):
+        with self.lock:
+            generation = self.generation.bump()
+            # Still current unless another worker committed a change this one has not applied
+            if self.built and generation is not None and generation - 1 == self.seen:
+                self.seen = generation
+
+    def expand_prefix(self, prefix):
+        """
+        Stems of the indexed words starting with prefix, so partially typed
+        words still match. Words are matched as written, since a stem need
+        not start with what was typed (bakin is a prefix of baking, not bake).
+        """
+        start = bisect_left(self.vocabulary, prefix)
+        terms = set()
+        for word in self.vocabulary[start:start + self.max_prefix_terms]:
+            if not word.startswith(prefix):
+                break
+            terms.add(stem(word))
+        return terms
+
+    def query_terms(self, query):
+        tokens = tokenize(query)
+        terms = {stem(token) for token in tokens}
+        # The last word may still be being typed
+        if tokens and not query[-1:].isspace():
+            terms.update(self.expand_prefix(tokens[-1]))
+        return terms
+
+    def search(self, query, limit=DEFAULT_MAX_RESULTS):
+        self.refresh()
+        with self.lock:
+            doc_count = len(self.doc_terms)
+            if not doc_count:
+                return []
+            avg_length = self.total_length / doc_count
+
+            scores = defaultdict(float)
+            for term in self.query_terms(query):
+                posting = self.postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (doc_count - len(posting) + 0.5) / (len(posting) + 0.5))
+                for recipe_id, tf in posting.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_length[recipe_id] / avg_length)
+                    scores[recipe_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        # Ties go to the newest recipe
+        return heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], item[0]))
+
+
+class MySQLFullTextSearchBackend(SearchBackend):
+    """
+    Ranks recipes with MySQL's own FULLTEXT index, which MySQL keeps current.
+    Needs the index on the (unmanaged) recipe table:
+
+        ALTER TABLE recipe ADD FULLTEXT INDEX recipe_fulltext (recipe_name, recipe_description);
+    """
+    match_sql = 'MATCH (recipe_name, recipe_description) AGAINST (%s IN NATURAL LANGUAGE MODE)'
+
+    def search(self, query, limit=DEFAULT_MAX_RESULTS):
+        score = RawSQL(self.match_sql, (query,))
+        ranked = (Recipe.objects
+                  .annotate(score=score)
+                  .filter(score__gt=0)
+                  .order_by('-score', '-recipe_id')
+                  .values_list('recipe_id', 'score')[:limit])
+        return [(recipe_id, float(value)) for recipe_id, value in ranked]
+
+#---------------BACKEND LOOKUP---------------#
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_search_backend():
+    """The configured search backend, created once per process"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                path = getattr(settings, 'RECIPE_SEARCH_BACKEND', DEFAULT_SEARCH_BACKEND)
+                _backend = import_string(path)()
+    return _backend
+
+def search_recipe_ids(query, limit=None):
+    """Recipe ids matching the query, best match first"""
+    if limit is None:
+        limit = getattr(settings, 'RECIPE_SEARCH_MAX_RESULTS', DEFAULT_MAX_RESULTS)
+    return [recipe_id for recipe_id, score in get_search_backend().search(query, limit=limit)]
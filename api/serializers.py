@@ -2,11 +2,17 @@ from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.auth.hashers import make_password
+from .metrics import SerializerTimingMixin
 from .models import User, Recipe, Review, Category, RecipeIngredients, Ingredient, Unit, Quantity, Nutrition, Cookbook, AddRecipe, SubscribedCookbook
+from .nutrition import get_recipe_nutrition
+from .tracing import SerializerTracingMixin
 
 
+class ModelSerializer(SerializerTracingMixin, SerializerTimingMixin, serializers.ModelSerializer):
+    """ModelSerializer that reports its time to the request metrics and trace"""
+
 #---------------USER SERIALIZER---------------#
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(ModelSerializer):
     # Password should be write-only
     password = serializers.CharField(write_only=True)
 
@@ -29,7 +35,7 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 #---------------CATEGORY SERIALIZER---------------#
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(ModelSerializer):
     categoryId = serializers.IntegerField(source='category_id')
     catname = serializers.CharField(source='cat_name')
     class Meta:
@@ -37,7 +43,7 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ('categoryId', 'catname')
 
 #---------------RECIPE SERIALIZER---------------#
-class RecipeListSerializer(serializers.ModelSerializer):
+class RecipeListSerializer(ModelSerializer):
     recipeId = serializers.IntegerField(source='recipe_id')
     name = serializers.CharField(source='recipe_name')
     description = serializers.CharField(source='recipe_description')
@@ -62,7 +68,7 @@ class RecipeListSerializer(serializers.ModelSerializer):
     #         recipe.category.set(cat)
     #     return recipe
 
-class RecipeDetailSerializer(serializers.ModelSerializer):
+class RecipeDetailSerializer(ModelSerializer):
     # reuse the list fields
     recipeId    = serializers.IntegerField(source="recipe_id")
     name        = serializers.CharField(source="recipe_name")
@@ -86,17 +92,22 @@ class RecipeDetailSerializer(serializers.ModelSerializer):
         )
 
     def get_recipeIngredients(self, obj):
+        # nutrition comes from the materialized per-recipe summary
+        nutrition = {
+            item["ingredientId"]: item
+            for item in get_recipe_nutrition(obj.recipe_id).breakdown
+            if item["nutritionId"] is not None
+        }
         out = []
-        for ri in obj.recipeingredients_set.all():
-            # fetch nutrition if any
-            nutr = Nutrition.objects.filter(ingredient=ri.ingredient).first()
+        for ri in obj.recipeingredients_set.select_related("ingredient", "quantity", "unit"):
+            nutr = nutrition.get(ri.ingredient_id)
             out.append({
               "ingredient":      ri.ingredient.ingredient_name,
               "amount":          ri.quantity.quantity_amount,
               "unit":            ri.unit.unit_name if ri.unit else "",
               "nutrition":       {
-                 "calorieCount": float(nutr.calorie_count or 0),
-                 "proteinCount": float(nutr.protein_count or 0)
+                 "calorieCount": nutr["calorieCount"],
+                 "proteinCount": nutr["proteinCount"]
               } if nutr else None
             })
         return out
@@ -131,40 +142,40 @@ class RecipeDetailSerializer(serializers.ModelSerializer):
         }
 
 #---------------RECIPE_INGREDIENTS SERIALIZER---------------#
-class RecipeIngredientsSerializer(serializers.ModelSerializer):
+class RecipeIngredientsSerializer(ModelSerializer):
     class Meta:
         model = RecipeIngredients
         fields = ('recipe_id', 'ingredient_id', 'quantity_id', 'unit_id')
 
 #---------------INGREDIENT SERIALIZER---------------#
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(ModelSerializer):
     class Meta:
         model = Ingredient
         fields = ['ingredient_id', 'ingredient_name']
 
 #---------------UNIT SERIALIZER---------------#
-class UnitSerializer(serializers.ModelSerializer):
+class UnitSerializer(ModelSerializer):
     class Meta:
         model = Unit
         fields = ['unit_id', 'unit_name', 'symbol']
 
-class NutritionSerializer(serializers.ModelSerializer):
+class NutritionSerializer(ModelSerializer):
     class Meta:
         model = Nutrition
         fields = ['nutrition_id', 'protein_count', 'calorie_count', 'serving_size']
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(ModelSerializer):
     class Meta:
         model = Recipe
         fields = ['recipe_id', 'recipe_name', 'recipe_description', 'date_added', 'recipe_difficulty']
 
-class RecipeDetailSerializer(serializers.ModelSerializer):
+class RecipeDetailSerializer(ModelSerializer):
     # Add related data for detailed view
     class Meta:
         model = Recipe
         fields = ['recipe_id', 'recipe_name', 'recipe_description', 'date_added', 'recipe_difficulty']
 
-class RecipeIngredientsSerializer(serializers.ModelSerializer):
+class RecipeIngredientsSerializer(ModelSerializer):
     ingredient_name = serializers.ReadOnlyField(source='ingredient.ingredient_name')
     quantity_amount = serializers.ReadOnlyField(source='quantity.quantity_amount')
     unit_name = serializers.ReadOnlyField(source='unit.unit_name', default='')
@@ -173,7 +184,7 @@ class RecipeIngredientsSerializer(serializers.ModelSerializer):
         model = RecipeIngredients
         fields = ['recipe', 'ingredient', 'ingredient_name', 'quantity', 'quantity_amount', 'unit', 'unit_name']
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(ModelSerializer):
     username = serializers.ReadOnlyField(source='user.username')
     recipe_name = serializers.ReadOnlyField(source='recipe.recipe_name')
     
@@ -182,19 +193,19 @@ class ReviewSerializer(serializers.ModelSerializer):
         fields = ['review_id', 'user', 'username', 'recipe', 'recipe_name', 'rating', 'comment', 'date_created']
 
 #---------------QUANTITY SERIALIZER---------------#
-class QuantitySerializer(serializers.ModelSerializer):
+class QuantitySerializer(ModelSerializer):
     class Meta:
         model = Quantity
         fields = ['quantity_id', 'quantity_amount']
 
 #---------------NUTRITION SERIALIZER---------------#
-class NutritionSerializer(serializers.ModelSerializer):
+class NutritionSerializer(ModelSerializer):
     class Meta:
         model = Nutrition
         fields = ('nutrition_id', 'protein_count', 'calorie_count', 'ingredient', 'unit', 'serving_size')
 
 #---------------COOKBOOK SERIALIZER---------------#
-class CookbookSerializer(serializers.ModelSerializer):
+class CookbookSerializer(ModelSerializer):
     creator = UserSerializer(read_only=True)
     subscribers = UserSerializer(many=True, read_only=True)
 
@@ -203,13 +214,13 @@ class CookbookSerializer(serializers.ModelSerializer):
         fields = ('cb_id', 'cb_title', 'cb_description', 'creator', 'subscribers')
 
 #---------------SUBSCRIBED COOKBOOK SERIALIZER---------------#
-class SubscribedCookbookSerializer(serializers.ModelSerializer):
+class SubscribedCookbookSerializer(ModelSerializer):
     class Meta:
         model = SubscribedCookbook
         fields = '__all__'
 
 #---------------ADD_RECIPE SERIALIZER---------------#    
-class AddRecipeSerializer(serializers.ModelSerializer):
+class AddRecipeSerializer(ModelSerializer):
     recipe = serializers.PrimaryKeyRelatedField(
         queryset = Recipe.objects.all()
     )
@@ -220,7 +231,7 @@ class AddRecipeSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 #---------------REVIEW SERIALIZER---------------#
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(ModelSerializer):
     class Meta:
         model = Review
         fields = ('user', 'recipe', 'cookbook', 'rating', 'comment', 'date_created')
@@ -0,0 +1,152 @@
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .detail_cache import invalidate_recipe_details
+from .ingredient_index import get_ingredient_index
+from .nutrition import recipes_using_ingredients, schedule_refresh
+from .models import Category, Cookbook, IdentifiedBy, Ingredient, Nutrition, Quantity, Recipe, RecipeIngredients, Review, SubscribedCookbook, Unit, User
+from .search import get_search_backend
+from .user_cache import invalidate_user
+from .versions import bump_category_versions, bump_cookbook_versions
+
+# The indexes are shared by every request in the process, so they only take
+# a change once it commits; a rolled back write never shows up in them.
+# Publishing it then tells the other workers their copies are stale.
+
+#---------------SEARCH INDEX---------------#
+def update_search_index(method, *args):
+    backend = get_search_backend()
+    getattr(backend, method)(*args)
+    backend.publish()
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(sender, instance, **kwargs):
+    transaction.on_commit(lambda: update_search_index('index_recipe', instance))
+
+@receiver(post_delete, sender=Recipe)
+def unindex_recipe(sender, instance, **kwargs):
+    recipe_id = instance.recipe_id
+    transaction.on_commit(lambda: update_search_index('remove_recipe', recipe_id))
+
+#---------------INGREDIENT INDEX---------------#
+def update_ingredient_index(method, *args):
+    index = get_ingredient_index()
+    getattr(index, method)(*args)
+    index.publish()
+
+@receiver(pre_save, sender=RecipeIngredients)
+def unindex_edited_recipe_ingredient(sender, instance, **kwargs):
+    # An edited row may now point at another ingredient or recipe
+    index = get_ingredient_index()
+    if instance.pk is None or not index.built:
+        return
+    old = RecipeIngredients.objects.filter(pk=instance.pk).values_list('ingredient_id', 'recipe_id').first()
+    if old:
+        transaction.on_commit(lambda: update_ingredient_index('remove', *old))
+
+@receiver(post_save, sender=RecipeIngredients)
+def index_recipe_ingredient(sender, instance, **kwargs):
+    pair = (instance.ingredient_id, instance.recipe_id)
+    transaction.on_commit(lambda: update_ingredient_index('add', *pair))
+
+@receiver(post_delete, sender=RecipeIngredients)
+def unindex_recipe_ingredient(sender, instance, **kwargs):
+    pair = (instance.ingredient_id, instance.recipe_id)
+    transaction.on_commit(lambda: update_ingredient_index('remove', *pair))
+
+@receiver(post_save, sender=Ingredient)
+def index_ingredient_name(sender, instance, **kwargs):
+    ingredient_id, name = instance.ingredient_id, instance.ingredient_name
+    transaction.on_commit(lambda: update_ingredient_index('rename', ingredient_id, name))
+
+
+#---------------RECIPE DETAIL CACHE---------------#
+# Recipe lists show recipes with their categories, so only those move the catalog
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=IdentifiedBy)
+@receiver(post_delete, sender=IdentifiedBy)
+def invalidate_listed_recipe(sender, instance, **kwargs):
+    invalidate_recipe_details([instance.recipe_id], catalog=True)
+
+@receiver(post_save, sender=RecipeIngredients)
+@receiver(post_delete, sender=RecipeIngredients)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_recipe_detail(sender, instance, **kwargs):
+    invalidate_recipe_details([instance.recipe_id])
+
+# Shared rows show up in the payload of every recipe that uses them
+AFFECTED_RECIPES = {
+    Ingredient: lambda row: RecipeIngredients.objects.filter(ingredient_id=row.ingredient_id),
+    Nutrition: lambda row: RecipeIngredients.objects.filter(ingredient_id=row.ingredient_id),
+    Quantity: lambda row: RecipeIngredients.objects.filter(quantity_id=row.quantity_id),
+    Unit: lambda row: RecipeIngredients.objects.filter(unit_id=row.unit_id),
+    Category: lambda row: IdentifiedBy.objects.filter(category_id=row.category_id),
+    User: lambda row: Review.objects.filter(user_id=row.id),
+}
+
+def invalidate_shared_row(sender, instance, created=False, **kwargs):
+    # A brand new row is not in any payload yet, except nutrition for an existing ingredient
+    if created and sender is not Nutrition:
+        return
+    recipe_ids = AFFECTED_RECIPES[sender](instance).values_list('recipe_id', flat=True)
+    invalidate_recipe_details(recipe_ids, catalog=sender is Category)
+
+for model in AFFECTED_RECIPES:
+    post_save.connect(invalidate_shared_row, sender=model, dispatch_uid=f'invalidate_shared_{model.__name__}')
+    post_delete.connect(invalidate_shared_row, sender=model, dispatch_uid=f'invalidate_shared_delete_{model.__name__}')
+
+
+#---------------RECIPE NUTRITION---------------#
+@receiver(post_save, sender=RecipeIngredients)
+@receiver(post_delete, sender=RecipeIngredients)
+def refresh_recipe_nutrition(sender, instance, **kwargs):
+    schedule_refresh([instance.recipe_id])
+
+@receiver(post_save, sender=Nutrition)
+@receiver(post_delete, sender=Nutrition)
+def refresh_nutrition_of_ingredient(sender, instance, **kwargs):
+    schedule_refresh(recipes_using_ingredients([instance.ingredient_id]))
+
+@receiver(post_save, sender=Ingredient)
+def refresh_nutrition_of_renamed_ingredient(sender, instance, created, **kwargs):
+    if not created:
+        schedule_refresh(recipes_using_ingredients([instance.ingredient_id]))
+
+
+#---------------RESPONSE VERSIONS---------------#
+# Recipe versions move with the detail cache above; these cover the other conditional reads
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_category_version(sender, instance, **kwargs):
+    bump_category_versions([instance.category_id])
+
+@receiver(post_save, sender=Cookbook)
+@receiver(post_delete, sender=Cookbook)
+def bump_cookbook_version(sender, instance, **kwargs):
+    bump_cookbook_versions([instance.cb_id])
+
+@receiver(post_save, sender=SubscribedCookbook)
+@receiver(post_delete, sender=SubscribedCookbook)
+def bump_subscribed_cookbook_version(sender, instance, **kwargs):
+    bump_cookbook_versions([instance.cookbook_id])
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def bump_cookbooks_of_user(sender, instance, created=False, **kwargs):
+    # Cookbooks show their creator and subscribers
+    if created:
+        return
+    cookbooks = Cookbook.objects.filter(Q(creator_id=instance.id) | Q(subscribers=instance.id)).values_list('cb_id', flat=True)
+    bump_cookbook_versions(cookbooks)
+
+
+#---------------AUTHENTICATED USER CACHE---------------#
+# Covers UserSerializer.update, the admin and any other save or delete
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_user(instance.id)
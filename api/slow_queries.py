@@ -0,0 +1,242 @@
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+from collections import Counter
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections, connections
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.deprecation import MiddlewareMixin
+
+from .instrumentation import query_sink
+from .metrics import route_name
+
+# The view serving the current request, for attributing its slow queries
+current_view = contextvars.ContextVar('slow_query_view', default=None)
+
+# Set in the EXPLAIN worker so its own statements are never logged
+explaining = contextvars.ContextVar('slow_query_explaining', default=False)
+
+#---------------FINGERPRINTS---------------#
+STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+VALUE_LIST = re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)')
+WHITESPACE = re.compile(r'\s+')
+
+def fingerprint(sql):
+    """The statement with literals and the length of IN lists taken out, so repeats of one query group together"""
+    sql = STRING.sub('?', sql)
+    sql = NUMBER.sub('?', sql)
+    sql = VALUE_LIST.sub('(...)', sql)
+    return WHITESPACE.sub(' ', sql).strip()
+
+def fingerprint_id(normalized):
+    return hashlib.md5(normalized.encode()).hexdigest()[:12]
+
+#---------------CALL SITE---------------#
+PROJECT_DIR = str(settings.BASE_DIR) + os.sep
+LIBRARY_DIRS = tuple({os.path.dirname(os.__file__) + os.sep, *(path + os.sep for path in sys.path if 'site-packages' in path)})
+# Execute wrappers such as api.instrumentation.instrument_query sit between the code and the query
+WRAPPER_ARGS = ('execute', 'sql', 'params', 'many', 'context')
+
+def call_site():
+    """The innermost project frame that led to the query, as 'api/views.py:123 in get'"""
+    # Past SlowQueryLog.record and log_slow_query
+    frame = sys._getframe(3)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(PROJECT_DIR) and not filename.startswith(LIBRARY_DIRS)
+                and frame.f_code.co_varnames[:5] != WRAPPER_ARGS):
+            return f'{os.path.relpath(filename, PROJECT_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+#---------------LOG---------------#
+class SlowQueryLog:
+    """
+    Writes statements slower than threshold seconds to a size-rotated JSON
+    lines file. For a sample of the SELECTs, a background thread runs EXPLAIN
+    on its own connection and logs the plan with the query. When the worker
+    falls queue_size queries behind, queries are logged without a plan.
+    """
+
+    def __init__(self, path, threshold, sample_rate=0.1, max_bytes=10 * 1024 * 1024, backups=5, queue_size=100):
+        self.path = str(path)
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.worker = None
+        self.lock = threading.Lock()
+        self.logger = None
+
+    def get_logger(self):
+        if self.logger is None:
+            with self.lock:
+                if self.logger is None:
+                    os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                    handler = RotatingFileHandler(self.path, maxBytes=self.max_bytes, backupCount=self.backups, encoding='utf-8')
+                    handler.setFormatter(logging.Formatter('%(message)s'))
+                    logger = logging.getLogger(f'api.slow_queries.{id(self)}')
+                    logger.setLevel(logging.INFO)
+                    logger.propagate = False
+                    logger.addHandler(handler)
+                    self.logger = logger
+        return self.logger
+
+    def record(self, sql, params, many, elapsed, alias):
+        normalized = fingerprint(sql)
+        entry = {
+            'time': timezone.now().isoformat(),
+            'ms': round(elapsed * 1000, 3),
+            'alias': alias,
+            'fingerprint': fingerprint_id(normalized),
+            'sql': normalized,
+            'view': current_view.get(),
+            'frame': call_site(),
+            'explain': None,
+        }
+        # Parameters stay in memory for EXPLAIN and are never written out
+        if not many and sql.lstrip()[:6].upper() == 'SELECT' and random.random() < self.sample_rate:
+            try:
+                self.queue.put_nowait((entry, sql, params, alias))
+                self.start_worker()
+                return
+            except queue.Full:
+                pass
+        self.write(entry)
+
+    def write(self, entry):
+        self.get_logger().info(json.dumps(entry, default=str))
+
+    def explain(self, entry, sql, params, alias):
+        """Log the entry with the plan of its statement"""
+        connection = connections[alias]
+        token = explaining.set(True)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+                columns = [column[0] for column in cursor.description]
+                entry['explain'] = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        except Exception as exc:
+            entry['explain'] = {'error': str(exc)}
+        finally:
+            explaining.reset(token)
+        self.write(entry)
+
+    def start_worker(self):
+        if self.worker is None or not self.worker.is_alive():
+            with self.lock:
+                if self.worker is None or not self.worker.is_alive():
+                    self.worker = threading.Thread(target=self.run, name='slow-query-explain', daemon=True)
+                    self.worker.start()
+
+    def run(self):
+        while True:
+            entry, sql, params, alias = self.queue.get()
+            try:
+                self.explain(entry, sql, params, alias)
+            finally:
+                # Let an idle worker's connection go like a finished request's
+                close_old_connections()
+                self.queue.task_done()
+
+_log = None
+_log_lock = threading.Lock()
+
+def get_slow_query_log():
+    """The process-wide slow query log, configured by the SLOW_QUERY_* settings; None when off"""
+    global _log
+    if _log is None:
+        with _log_lock:
+            if _log is None:
+                threshold = getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', None)
+                path = getattr(settings, 'SLOW_QUERY_LOG', None)
+                _log = SlowQueryLog(
+                    path,
+                    threshold / 1000,
+                    sample_rate=getattr(settings, 'SLOW_QUERY_EXPLAIN_SAMPLE_RATE', 0.1),
+                    max_bytes=getattr(settings, 'SLOW_QUERY_LOG_MAX_BYTES', 10 * 1024 * 1024),
+                    backups=getattr(settings, 'SLOW_QUERY_LOG_BACKUPS', 5),
+                ) if threshold is not None and path else False
+    return _log or None
+
+@receiver(setting_changed)
+def reset_slow_query_log(setting, **kwargs):
+    global _log
+    if setting.startswith('SLOW_QUERY_'):
+        _log = None
+
+#---------------REPORT---------------#
+def read_entries(path, backups):
+    """Entries of the log and its rotated files, oldest first, skipping lines cut off mid-write"""
+    for name in [f'{path}.{n}' for n in range(backups, 0, -1)] + [str(path)]:
+        try:
+            with open(name, encoding='utf-8') as handle:
+                for line in handle:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            continue
+
+def summarize(entries):
+    """One row per fingerprint, the most total time first"""
+    groups = {}
+    for entry in entries:
+        group = groups.get(entry['fingerprint'])
+        if group is None:
+            group = groups[entry['fingerprint']] = {
+                'fingerprint': entry['fingerprint'],
+                'sql': entry['sql'],
+                'count': 0,
+                'totalMs': 0.0,
+                'maxMs': 0.0,
+                'views': Counter(),
+                'frames': Counter(),
+                'explain': None,
+            }
+        group['count'] += 1
+        group['totalMs'] += entry['ms']
+        group['maxMs'] = max(group['maxMs'], entry['ms'])
+        group['views'][entry.get('view')] += 1
+        group['frames'][entry.get('frame')] += 1
+        if entry.get('explain') is not None:
+            group['explain'] = entry['explain']
+    rows = sorted(groups.values(), key=lambda group: group['totalMs'], reverse=True)
+    for row in rows:
+        row['totalMs'] = round(row['totalMs'], 3)
+        row['avgMs'] = round(row['totalMs'] / row['count'], 3)
+        row['views'] = [[view, count] for view, count in row['views'].most_common(3)]
+        row['frames'] = [[frame, count] for frame, count in row['frames'].most_common(3)]
+    return rows
+
+#---------------INSTRUMENTATION---------------#
+@query_sink
+def log_slow_query(sql, params, many, context, start, end):
+    log = get_slow_query_log()
+    if log is not None and end - start >= log.threshold and not explaining.get():
+        log.record(sql, params, many, end - start, context['connection'].alias)
+
+class SlowQueryMiddleware(MiddlewareMixin):
+    """Names the view behind each request's slow queries, by URL name as in the metrics"""
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        current_view.set(route_name(request))
+        return None
+
+    def process_response(self, request, response):
+        current_view.set(None)
+        return response
@@ -0,0 +1,20 @@
+from django.apps import apps
+from django.test.runner import DiscoverRunner
+
+
+class UnmanagedModelTestRunner(DiscoverRunner):
+    """Test runner that creates tables for the unmanaged ezChef models"""
+
+    def setup_test_environment(self, *args, **kwargs):
+        self.unmanaged_models = [
+            model for model in apps.get_app_config('api').get_models()
+            if not model._meta.managed
+        ]
+        for model in self.unmanaged_models:
+            model._meta.managed = True
+        super().setup_test_environment(*args, **kwargs)
+
+    def teardown_test_environment(self, *args, **kwargs):
+        super().teardown_test_environment(*args, **kwargs)
+        for model in self.unmanaged_models:
+            model._meta.managed = False
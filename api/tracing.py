@@ -0,0 +1,189 @@
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework import renderers
+
+from .instrumentation import query_sink
+from .metrics import route_name
+
+# Phases reported in Server-Timing, in order
+PHASES = ('db', 'serialize', 'render')
+
+# The trace of the request being served, if it is traced at all
+current_trace = contextvars.ContextVar('request_trace', default=None)
+
+# Shared by every span outside a traced request, so they cost a lookup and no allocation
+NO_SPAN = nullcontext()
+
+#---------------TRACE---------------#
+class Trace:
+    """
+    The phase totals of one request, for its Server-Timing header, and when
+    sampled its spans as Chrome trace events (chrome://tracing, Perfetto).
+    Spans nested in a span of the same phase, such as a serializer inside a
+    serializer, count once towards the totals; SQL run by a serializer, for a
+    related field say, counts towards both db and serialize.
+    """
+    __slots__ = ('start', 'sampled', 'totals', 'counts', 'open', 'events', 'lock')
+
+    def __init__(self, sampled):
+        self.start = time.perf_counter()
+        self.sampled = sampled
+        self.totals = dict.fromkeys(PHASES, 0.0)
+        self.counts = dict.fromkeys(PHASES, 0)
+        self.open = dict.fromkeys(PHASES, 0)
+        self.events = [] if sampled else None
+        # Async views run their queries on other threads
+        self.lock = threading.Lock()
+
+    def span(self, name, phase, args=None):
+        return Span(self, name, phase, args)
+
+    def add(self, name, phase, start, end, args):
+        """A finished span, counted towards the totals unless one of its phase is still open"""
+        with self.lock:
+            if not self.open[phase]:
+                self.totals[phase] += end - start
+                self.counts[phase] += 1
+            if self.sampled:
+                self.events.append({
+                    'name': name,
+                    'cat': phase,
+                    'ph': 'X',
+                    'ts': round((start - self.start) * 1e6, 1),
+                    'dur': round((end - start) * 1e6, 1),
+                    'pid': os.getpid(),
+                    'tid': threading.get_ident(),
+                    'args': args or {},
+                })
+
+    def server_timing(self, elapsed):
+        metrics = [f'{phase};desc="{self.counts[phase]}";dur={self.totals[phase] * 1000:.3f}' for phase in PHASES if self.counts[phase]]
+        metrics.append(f'total;dur={elapsed * 1000:.3f}')
+        return ', '.join(metrics)
+
+class Span:
+    __slots__ = ('trace', 'name', 'phase', 'args', 'began')
+
+    def __init__(self, trace, name, phase, args):
+        self.trace = trace
+        self.name = name
+        self.phase = phase
+        self.args = args
+
+    def __enter__(self):
+        with self.trace.lock:
+            self.trace.open[self.phase] += 1
+        self.began = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = time.perf_counter()
+        with self.trace.lock:
+            self.trace.open[self.phase] -= 1
+        self.trace.add(self.name, self.phase, self.began, end, self.args)
+        return False
+
+def span(name, phase, args=None):
+    """A span of the current request's trace, or nothing outside a traced request"""
+    trace = current_trace.get()
+    if trace is None:
+        return NO_SPAN
+    return trace.span(name, phase, args)
+
+#---------------TRACE FILES---------------#
+def write_trace(trace, request, response, elapsed):
+    """Write a sampled trace to TRACE_DIR, keeping the newest TRACE_MAX_FILES"""
+    directory = getattr(settings, 'TRACE_DIR', None)
+    if not directory:
+        return None
+    route = route_name(request)
+    events = [{
+        'name': f'{request.method} {route}',
+        'cat': 'request',
+        'ph': 'X',
+        'ts': 0,
+        'dur': round(elapsed * 1e6, 1),
+        'pid': os.getpid(),
+        'tid': threading.get_ident(),
+        'args': {'path': request.path, 'status': response.status_code},
+    }, *trace.events]
+    name = f"{time.strftime('%Y%m%dT%H%M%S')}-{route.replace(':', '.').replace('/', '_')}-{uuid.uuid4().hex[:8]}.json"
+    path = os.path.join(directory, name)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as handle:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, handle)
+        prune(directory, getattr(settings, 'TRACE_MAX_FILES', 1000))
+    except OSError:
+        return None
+    return path
+
+def prune(directory, keep):
+    names = sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+    for name in names[:max(len(names) - keep, 0)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            continue
+
+#---------------INSTRUMENTATION---------------#
+@query_sink
+def trace_query(sql, params, many, context, start, end):
+    trace = current_trace.get()
+    if trace is not None:
+        # The statement without its parameters, as in the slow query log
+        trace.add('sql', 'db', start, end, {'sql': sql, 'alias': context['connection'].alias} if trace.sampled else None)
+
+class SerializerTracingMixin:
+    """Traces to_representation as a span named after the serializer"""
+
+    def to_representation(self, instance):
+        trace = current_trace.get()
+        if trace is None:
+            return super().to_representation(instance)
+        with trace.span(type(self).__name__, 'serialize'):
+            return super().to_representation(instance)
+
+class JSONRenderer(renderers.JSONRenderer):
+    """DRF's JSON renderer, traced as the render phase"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with span('json', 'render'):
+            return super().render(data, accepted_media_type, renderer_context)
+
+class TracingMiddleware(MiddlewareMixin):
+    """
+    Adds a Server-Timing header with the time spent in SQL, serializers and
+    rendering when TRACE_SERVER_TIMING is on, and writes a TRACE_SAMPLE_RATE
+    share of requests to TRACE_DIR as Chrome trace files. With both off,
+    requests are not traced at all.
+    """
+
+    def process_request(self, request):
+        sampled = random.random() < getattr(settings, 'TRACE_SAMPLE_RATE', 0.0)
+        if not sampled and not getattr(settings, 'TRACE_SERVER_TIMING', False):
+            return None
+        request.trace = Trace(sampled)
+        current_trace.set(request.trace)
+        return None
+
+    def process_response(self, request, response):
+        trace = getattr(request, 'trace', None)
+        if trace is None:
+            return response
+        current_trace.set(None)
+        elapsed = time.perf_counter() - trace.start
+        if getattr(settings, 'TRACE_SERVER_TIMING', False):
+            response['Server-Timing'] = trace.server_timing(elapsed)
+        if trace.sampled:
+            write_trace(trace, request, response, elapsed)
+        return response
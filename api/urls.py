@@ -6,13 +6,19 @@ urlpatterns = [
     path('auth/register/', views.RegisterView.as_view(), name='register'),
     path('auth/login/', views.LoginView.as_view(), name='login'),
     path('auth/refresh/', views.RefreshTokenView.as_view(), name='token_refresh'),
+    path('auth/logout/', views.LogoutView.as_view(), name='logout'),
+    path('users/bulk/', views.BulkRegisterView.as_view(), name='bulk_register'),
+    path('auth/cache-stats/', views.AuthCacheStatsView.as_view(), name='auth_cache_stats'),
+    path('db/pool-stats/', views.DatabasePoolStatsView.as_view(), name='db_pool_stats'),
     path('user/profile/', views.UserProfileView.as_view(), name='user_profile'),
     
     # Recipe endpoints
     path('recipes/', views.RecipeListView.as_view(), name='recipe_list'),
-    path('recipes/<int:recipe_id>/', views.RecipeDetailView.as_view(), name='recipe_detail'),
+    path('recipes/<int:recipe_id>/', views.recipe_detail, name='recipe_detail'),
     path('recipes/search/', views.SearchRecipesView.as_view(), name='search_recipes'),
+    path('recipes/by-ingredients/', views.RecipesByIngredientsView.as_view(), name='recipes_by_ingredients'),
     path('recipes/create/', views.CreateRecipeView.as_view(), name='create_recipe'),
+    path('recipes/cache-stats/', views.RecipeDetailCacheStatsView.as_view(), name='recipe_cache_stats'),
     
     # Category endpoints
     path('categories/', views.CategoryView.as_view(), name='category_list'),
@@ -0,0 +1,70 @@
+import copy
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+
+from .db_router import read_from_primary
+from .lru import LRUCache
+from .models import User
+
+KEY_PREFIX = 'auth-user'
+
+#---------------LOCAL TIER---------------#
+_local = None
+_local_lock = threading.Lock()
+
+def get_local_cache():
+    """The process-wide user cache, sized from USER_CACHE_MAX_SIZE / USER_CACHE_TTL"""
+    global _local
+    if _local is None:
+        with _local_lock:
+            if _local is None:
+                _local = LRUCache(
+                    getattr(settings, 'USER_CACHE_MAX_SIZE', 10000),
+                    getattr(settings, 'USER_CACHE_TTL', 60),
+                )
+    return _local
+
+#---------------SHARED TIER---------------#
+def get_shared_cache():
+    # Optional; set USER_CACHE_SHARED to a cache alias (memcached, redis...) to use it
+    alias = getattr(settings, 'USER_CACHE_SHARED', None)
+    return caches[alias] if alias else None
+
+def user_key(user_id):
+    return f'{KEY_PREFIX}:{user_id}'
+
+#---------------LOOKUP---------------#
+def get_user(user_id):
+    """
+    The User with this id, from the local tier, then the shared tier, then the
+    database. Raises User.DoesNotExist like User.objects.get. Each caller gets
+    its own copy, so a request changing its user never touches the cached one.
+    """
+    local = get_local_cache()
+    user = local.get(user_id)
+    if user is None:
+        shared = get_shared_cache()
+        user = shared.get(user_key(user_id)) if shared is not None else None
+        if user is None:
+            read_from_primary()
+            user = User.objects.get(id=user_id)
+            if shared is not None:
+                shared.set(user_key(user_id), user, timeout=local.ttl)
+        local.set(user_id, user)
+    return copy.copy(user)
+
+def invalidate_user(user_id):
+    """Drop a user from both tiers"""
+    def drop():
+        get_local_cache().delete(user_id)
+        shared = get_shared_cache()
+        if shared is not None:
+            shared.delete(user_key(user_id))
+
+    drop()
+    # A read before the commit could cache the old row again
+    if connection.in_atomic_block:
+        transaction.on_commit(drop)
@@ -0,0 +1,136 @@
+import hashlib
+import time
+import uuid
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+KEY_PREFIX = 'version'
+# Anything that can show up in a recipe list: recipes, their categories...
+CATALOG = 'catalog'
+
+#---------------VERSION MARKERS---------------#
+def get_cache():
+    # Versions live next to the cached payloads they describe
+    return caches[getattr(settings, 'RECIPE_DETAIL_CACHE', 'default')]
+
+def version_timeout():
+    """
+    Markers expire with the payloads they describe. With a per-process cache
+    another worker never sees a bump, so this bounds how long it can answer
+    304 to a validator that has moved on.
+    """
+    return getattr(settings, 'RECIPE_DETAIL_CACHE_TIMEOUT', 300)
+
+def version_key(scope):
+    return f'{KEY_PREFIX}:{scope}'
+
+def recipe_scope(recipe_id):
+    return f'recipe:{recipe_id}'
+
+def category_scope(category_id):
+    return f'category:{category_id}'
+
+def cookbook_scope(cb_id):
+    return f'cookbook:{cb_id}'
+
+def new_version(previous=None):
+    # Last-Modified has one second resolution, so never reuse the previous second
+    modified = int(time.time())
+    if previous:
+        modified = max(modified, previous['modified'] + 1)
+    return {'tag': uuid.uuid4().hex, 'modified': modified}
+
+def get_versions(scopes):
+    """Current version of each scope, starting a new one for scopes the cache has lost"""
+    cache = get_cache()
+    keys = {scope: version_key(scope) for scope in scopes}
+    found = cache.get_many(keys.values())
+    versions = {}
+    for scope, key in keys.items():
+        version = found.get(key)
+        if version is None:
+            cache.add(key, new_version(), timeout=version_timeout())
+            version = cache.get(key)
+        versions[scope] = version
+    return versions
+
+def bump_versions(scopes):
+    """Give each scope a new version, so validators handed out before no longer match"""
+    scopes = set(scopes)
+    if not scopes:
+        return
+
+    def bump():
+        cache = get_cache()
+        keys = [version_key(scope) for scope in scopes]
+        previous = cache.get_many(keys)
+        cache.set_many({key: new_version(previous.get(key)) for key in keys}, timeout=version_timeout())
+
+    bump()
+    # A read before the commit could hand out the new version with the old rows
+    if connection.in_atomic_block:
+        transaction.on_commit(bump)
+
+def bump_recipe_versions(recipe_ids, catalog=False):
+    """New versions for the recipes, and for the catalog when the change shows up in recipe lists"""
+    scopes = [recipe_scope(recipe_id) for recipe_id in recipe_ids if recipe_id is not None]
+    if scopes:
+        bump_versions(scopes + [CATALOG] if catalog else scopes)
+
+def bump_category_versions(category_ids):
+    bump_versions([category_scope(category_id) for category_id in category_ids if category_id is not None])
+
+def bump_cookbook_versions(cb_ids):
+    bump_versions([cookbook_scope(cb_id) for cb_id in cb_ids if cb_id is not None])
+
+#---------------CONDITIONAL RESPONSES---------------#
+def validators(scopes):
+    """ETag and Last-Modified timestamp of a response built from the given scopes"""
+    versions = get_versions(scopes)
+    tags = [versions[scope]['tag'] for scope in scopes]
+    tag = tags[0] if len(tags) == 1 else hashlib.md5(':'.join(tags).encode()).hexdigest()
+    return quote_etag(tag), max(versions[scope]['modified'] for scope in scopes)
+
+def conditional(get_scopes):
+    """
+    View method decorator answering If-None-Match / If-Modified-Since with a 304
+    before the view runs. get_scopes(request, *args, **kwargs) names the version
+    scopes the response is built from. Works on sync and async view methods.
+    """
+    def finish(response, etag, last_modified):
+        if response.status_code not in (200, 304):
+            return response
+        response.headers.setdefault('ETag', etag)
+        response.headers.setdefault('Last-Modified', http_date(last_modified))
+        # Browsers must revalidate rather than guess a freshness lifetime
+        patch_cache_control(response, no_cache=True)
+        return response
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(self, request, *args, **kwargs):
+                etag, last_modified = await sync_to_async(validators)(get_scopes(request, *args, **kwargs))
+                response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+                if response is None:
+                    response = await view(self, request, *args, **kwargs)
+                return finish(response, etag, last_modified)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(self, request, *args, **kwargs):
+            # Read the versions first, so the payload is never older than its ETag
+            etag, last_modified = validators(get_scopes(request, *args, **kwargs))
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(self, request, *args, **kwargs)
+            return finish(response, etag, last_modified)
+        return wrapper
+    return decorator
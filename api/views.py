@@ -1,31 +1,97 @@
-from django.shortcuts import render, get_object_or_404
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.shortcuts import render, aget_object_or_404
+from django.db import IntegrityError, transaction
+from django.http import Http404, JsonResponse
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework import generics, status, permissions
+from rest_framework.exceptions import APIException, AuthenticationFailed, NotFound
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from django.contrib.auth.hashers import make_password, check_password
 from .serializers import CategorySerializer, IngredientSerializer, NutritionSerializer, QuantitySerializer, RecipeIngredientsSerializer, UnitSerializer, UserSerializer, RecipeListSerializer, RecipeDetailSerializer, ReviewSerializer, CookbookSerializer, AddRecipeSerializer
 from .models import User, Recipe, Review, Category, RecipeIngredients, Ingredient, Unit, Quantity, Nutrition, Cookbook, IdentifiedBy
+from .bulk import LookupConflict, after_bulk_write, bulk_create_nutrition, bulk_create_recipe_ingredients, resolve_lookup, resolve_quantities
+from .loaders import aload_recipe_categories, aload_recipe_creators
+from .pagination import KeysetPagination, RankedPagination
+from .search import search_recipe_ids
+from .ingredient_index import match_recipes
+from .db_pool import pool_stats
+from .db_router import read_from_primary
+from .detail_cache import detail_cache_stats, get_recipe_detail, set_recipe_detail
+from .nutrition import aget_recipe_nutrition, summary_payload
+from .jwt_utils import generate_tokens_for_user, token_memo_stats, validate_token
+from .auth import IsPlatformAdmin, JWTAuthentication, bearer_user
+from .passwords import HashingBusy, amake_password, averify_password, get_bulk_hashing_executor
+from .provisioning import provision_users
+from .revocation import get_deny_list
+from .tracing import span
+from .user_cache import get_local_cache, get_user
+from .versions import CATALOG, category_scope, conditional, cookbook_scope, recipe_scope
 
 #--------------AUTHENTICATION VIEWS---------------#
-class RegisterView(APIView):
-    def post(self, request):
-        username = request.data.get('username')
-        email = request.data.get('email')
-        password = request.data.get('password')
-        f_name = request.data.get('f_name', '')
-        l_name = request.data.get('l_name', '')
+# Login and register are async so password hashing runs in the hashing pool
+# (api.passwords) instead of blocking a worker; serve them through asgi.py.
+def request_data(request):
+    """The JSON or form body of a plain Django request, or None when it is malformed"""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+    return request.POST
+
+def hashing_busy_response():
+    response = JsonResponse({'message': 'Too many sign-ins in progress, please retry shortly'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    response['Retry-After'] = '1'
+    return response
+
+def auth_payload(message, user, tokens):
+    return {
+        'message': message,
+        'token': tokens['access'],
+        'refresh': tokens['refresh'],
+        'user': {
+            'id': user.id,
+            'username': user.username,
+            'email': user.email,
+            'f_name': user.f_name,
+            'l_name': user.l_name
+        }
+    }
+
+@method_decorator(csrf_exempt, name='dispatch')
+class RegisterView(View):
+    async def post(self, request):
+        data = request_data(request)
+        if data is None:
+            return JsonResponse({'message': 'Malformed request body'}, status=status.HTTP_400_BAD_REQUEST)
+        username = data.get('username')
+        email = data.get('email')
+        password = data.get('password')
+        f_name = data.get('f_name', '')
+        l_name = data.get('l_name', '')
         
         if not username or not email or not password:
-            return Response({'message': 'Please provide all required fields'}, status=status.HTTP_400_BAD_REQUEST)
+            return JsonResponse({'message': 'Please provide all required fields'}, status=status.HTTP_400_BAD_REQUEST)
         
-        if User.objects.filter(username=username).exists():
-            return Response({'message': 'Username is already taken'}, status=status.HTTP_400_BAD_REQUEST)
+        if await User.objects.filter(username=username).aexists():
+            return JsonResponse({'message': 'Username is already taken'}, status=status.HTTP_400_BAD_REQUEST)
         
-        if User.objects.filter(email=email).exists():
-            return Response({'message': 'Email is already registered'}, status=status.HTTP_400_BAD_REQUEST)
+        if await User.objects.filter(email=email).aexists():
+            return JsonResponse({'message': 'Email is already registered'}, status=status.HTTP_400_BAD_REQUEST)
         
         # Create user with hashed password
-        hashed_password = make_password(password)
+        try:
+            hashed_password = await amake_password(password)
+        except HashingBusy:
+            return hashing_busy_response()
         user = User(
             username=username,
             email=email,
@@ -33,82 +99,76 @@ class RegisterView(APIView):
             f_name=f_name,
             l_name=l_name
         )
-        user.save()
+        await user.asave()
         
         # Generate JWT tokens
-        from .jwt_utils import generate_tokens_for_user
         tokens = generate_tokens_for_user(user)
         
-        return Response({
-            'message': 'User registered successfully',
-            'token': tokens['access'],
-            'refresh': tokens['refresh'],
-            'user': {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'f_name': user.f_name,
-                'l_name': user.l_name
-            }
-        }, status=status.HTTP_201_CREATED)
+        return JsonResponse(auth_payload('User registered successfully', user, tokens), status=status.HTTP_201_CREATED)
 
 
-class LoginView(APIView):
-    def post(self, request):
-        username = request.data.get('username')
-        password = request.data.get('password')
+@method_decorator(csrf_exempt, name='dispatch')
+class LoginView(View):
+    async def post(self, request):
+        data = request_data(request)
+        if data is None:
+            return JsonResponse({'message': 'Malformed request body'}, status=status.HTTP_400_BAD_REQUEST)
+        username = data.get('username')
+        password = data.get('password')
         
         if not username or not password:
-            return Response({'message': 'Please provide both username and password'}, status=status.HTTP_400_BAD_REQUEST)
+            return JsonResponse({'message': 'Please provide both username and password'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        user = await User.objects.filter(username=username).afirst()
+        if user is None:
+            return JsonResponse({'message': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
         
+        # Check if password matches, hashed or legacy plaintext
         try:
-            user = User.objects.get(username=username)
-        except User.DoesNotExist:
-            return Response({'message': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
-        
-        # Check if password matches
-        if check_password(password, user.password):
-            # Password is hashed and matches
-            pass
-        elif user.password == password:
-            pass
-        else:
-            return Response({'message': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
+            matches, replacement = await averify_password(password, user.password)
+        except HashingBusy:
+            return hashing_busy_response()
+        if not matches:
+            return JsonResponse({'message': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
+        
+        # Plaintext or outdated hashes are replaced on the first successful login
+        if replacement:
+            user.password = replacement
+            await user.asave(update_fields=['password'])
         
         # Generate JWT tokens
-        from .jwt_utils import generate_tokens_for_user
         tokens = generate_tokens_for_user(user)
         
-        return Response({
-            'message': 'Login successful',
-            'token': tokens['access'],
-            'refresh': tokens['refresh'],
-            'user': {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'f_name': user.f_name,
-                'l_name': user.l_name
-            }
-        }, status=status.HTTP_200_OK)
+        return JsonResponse(auth_payload('Login successful', user, tokens), status=status.HTTP_200_OK)
 
 
 class RefreshTokenView(APIView):
     def post(self, request):
+        """Exchange a refresh token for new tokens; each refresh token works once"""
         refresh_token = request.data.get('refresh')
         
         if not refresh_token:
             return Response({'message': 'Refresh token is required'}, status=status.HTTP_400_BAD_REQUEST)
         
-        from .jwt_utils import validate_token, generate_tokens_for_user
-        
         # Validate refresh token
         payload = validate_token(refresh_token)
-        if not payload:
+        if not payload or payload.get('type') != 'refresh' or 'jti' not in payload:
+            return Response({'message': 'Invalid or expired refresh token'}, status=status.HTTP_401_UNAUTHORIZED)
+        
+        # Rotate: the old token is revoked before new ones are issued
+        deny_list = get_deny_list()
+        reason = deny_list.revoked_by(payload)
+        if reason is None and not deny_list.revoke(payload):
+            # Another process rotated it first
+            reason = 'token'
+        if reason == 'token':
+            # Replayed after rotation, so it may have been stolen; end every session
+            deny_list.revoke_all(payload['user_id'])
+        if reason is not None:
             return Response({'message': 'Invalid or expired refresh token'}, status=status.HTTP_401_UNAUTHORIZED)
         
         try:
-            user = User.objects.get(id=payload['user_id'])
+            user = get_user(payload['user_id'])
         except User.DoesNotExist:
             return Response({'message': 'User not found'}, status=status.HTTP_401_UNAUTHORIZED)
         
@@ -116,19 +176,67 @@ class RefreshTokenView(APIView):
         tokens = generate_tokens_for_user(user)
         
         return Response({
-            'access': tokens['access']
+            'access': tokens['access'],
+            'refresh': tokens['refresh']
         }, status=status.HTTP_200_OK)
 
 
-class UserProfileView(APIView):
-    def get(self, request):
-        # This assumes authentication middleware has already set request.user
-        user = request.user
+class LogoutView(APIView):
+    def post(self, request):
+        """Revoke a refresh token, or with `everywhere` every token of its user"""
+        payload = validate_token(request.data.get('refresh') or '')
+        if not payload or payload.get('type') != 'refresh' or 'jti' not in payload:
+            return Response({'message': 'Invalid or expired refresh token'}, status=status.HTTP_401_UNAUTHORIZED)
         
-        if not user:
-            return Response({'message': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
+        deny_list = get_deny_list()
+        if deny_list.is_revoked(payload):
+            return Response({'message': 'Invalid or expired refresh token'}, status=status.HTTP_401_UNAUTHORIZED)
         
+        if request.data.get('everywhere'):
+            deny_list.revoke_all(payload['user_id'])
+        else:
+            deny_list.revoke(payload)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class BulkRegisterView(APIView):
+    """
+    Admin-only bulk registration: {"users": [...], "tokens": false}. Each user
+    has the RegisterView fields plus an optional date_of_birth. Returns one
+    result per user, in order; a rejected row does not stop the others.
+    """
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsPlatformAdmin]
+
+    def post(self, request):
+        users = request.data.get('users')
+        if not isinstance(users, list) or not users:
+            return Response({'message': 'users must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+        max_users = getattr(settings, 'BULK_REGISTER_MAX_USERS', 200)
+        if len(users) > max_users:
+            return Response({'message': f'At most {max_users} users per request'}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = provision_users(users, issue_tokens=bool(request.data.get('tokens')), executor=get_bulk_hashing_executor())
+        created = sum(result['status'] == 'created' for result in results)
         return Response({
+            'created': created,
+            'failed': len(results) - created,
+            'results': results
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST)
+
+
+class UserProfileView(View):
+    async def get(self, request):
+        # Django's AuthenticationMiddleware replaces the user JWTAuthMiddleware sets
+        try:
+            user = await sync_to_async(bearer_user)(request)
+        except AuthenticationFailed as exc:
+            return JsonResponse({'message': exc.detail}, status=status.HTTP_401_UNAUTHORIZED)
+        
+        if not user:
+            return JsonResponse({'message': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
+        
+        return JsonResponse({
             'id': user.id,
             'username': user.username,
             'email': user.email,
@@ -149,7 +257,8 @@ class CategoryView(generics.ListAPIView):
     serializer_class = CategorySerializer
 
 class RecipeIngredientsView(generics.ListAPIView):
-    queryset = RecipeIngredients.objects.all()
+    # The serializer shows the ingredient, quantity and unit of every row
+    queryset = RecipeIngredients.objects.select_related('ingredient', 'quantity', 'unit')
     serializer_class = RecipeIngredientsSerializer
 
 class IngredientView(generics.ListAPIView):
@@ -168,25 +277,65 @@ class NutritionView(generics.ListAPIView):
     queryset = Nutrition.objects.all()
     serializer_class = NutritionSerializer
 
+#--------------ASYNC READ VIEWS---------------#
+# The hot read endpoints are async Django views on the async ORM, so under
+# asgi.py a request waiting on the database holds no worker thread of its own.
+# They answer the way the DRF views they replaced did.
+def json_response(data, status=status.HTTP_200_OK):
+    with span('json', 'render'):
+        return JsonResponse(data, status=status, safe=False)
+
+def api_errors(view):
+    """Turn Http404 and DRF exceptions raised by an async view into DRF-style JSON errors"""
+    @wraps(view)
+    async def wrapper(self, request, *args, **kwargs):
+        try:
+            return await view(self, request, *args, **kwargs)
+        except Http404 as exc:
+            return json_response({'detail': NotFound(*exc.args).detail}, status=status.HTTP_404_NOT_FOUND)
+        except APIException as exc:
+            return json_response({'detail': exc.detail}, status=exc.status_code)
+    return wrapper
+
+def split_methods(read_view, write_view):
+    """
+    Serve one URL with an async view for GET and HEAD and a sync view for the
+    rest, since a Django view class cannot mix sync and async handlers.
+    """
+    view_classes = (read_view.view_class, write_view.view_class)
+    write_view = sync_to_async(write_view)
+
+    @csrf_exempt
+    async def view(request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            return await read_view(request, *args, **kwargs)
+        return await write_view(request, *args, **kwargs)
+    # Like the view_class as_view() sets, for finding out which methods a URL answers
+    view.view_classes = view_classes
+    return view
+
 #--------------RECIPE VIEWS---------------#
-class RecipeListView(APIView):
-    def get(self, request):
+class RecipeListView(View):
+    @conditional(lambda request, **kwargs: [CATALOG])
+    @api_errors
+    async def get(self, request):
         """
-        List all recipes with filtering and sorting
+        List all recipes with filtering and sorting.
+        Pass `cursor` or `page_size` to page through the results by keyset.
         """
         # Get query parameters
-        sort = request.query_params.get('sort', 'newest')
-        limit = request.query_params.get('limit', None)
-        search = request.query_params.get('search', None)
-        cat = request.query_params.get('cat_name', None)
-        difficulty = request.query_params.get('difficulty', None)
+        sort = request.GET.get('sort', 'newest')
+        limit = request.GET.get('limit', None)
+        search = request.GET.get('search', None)
+        cat = request.GET.get('cat_name', None)
+        difficulty = request.GET.get('difficulty', None)
         
         # Start with all recipes
         recipes = Recipe.objects.all()
         
-        # Apply search filter
+        # Apply search filter, matching against the search index
         if search:
-            recipes = recipes.filter(recipe_name__icontains=search) | recipes.filter(recipe_description__icontains=search)
+            recipes = recipes.filter(recipe_id__in=await sync_to_async(search_recipe_ids)(search))
         
         # Apply category filters
         if cat:
@@ -198,44 +347,37 @@ class RecipeListView(APIView):
         
         # Apply sorting
         if sort == 'newest':
-            recipes = recipes.order_by('-date_added')
+            recipes = recipes.order_by('-date_added', '-recipe_id')
         elif sort == 'oldest':
-            recipes = recipes.order_by('date_added')
-        
-        # Apply limit 
-        if limit:
-            recipes = recipes[:int(limit)]
+            recipes = recipes.order_by('date_added', 'recipe_id')
         
+        # Cursor pagination when the client asks for it, otherwise apply limit 
+        paginator = KeysetPagination()
+        page = await paginator.apaginate_queryset(recipes, request, view=self)
+        if page is not None:
+            recipes = page
+        else:
+            if limit:
+                recipes = recipes[:int(limit)]
+            # Evaluate the rows once so the loaders below reuse them
+            recipes = [recipe async for recipe in recipes]
         serializer = RecipeListSerializer(recipes, many=True)
         
-        # Add category and user data to each recipe
-        for i, recipe in enumerate(serializer.data):
-            recipe_obj = recipes[i]
-            recipe['cat'] = [
-                { 'categoryId' : c.category_id, 'catname': c.cat_name }
-                for c in recipe_obj.category.all()
-            ]
-            
-            # Add user info (creator)
-            try:
-                creator = recipe_obj.user  
-                recipe['user'] = {
-                    'userId': creator.id,
-                    'username': creator.username,
-                    'firstName': creator.f_name,
-                    'lastName': creator.l_name
-                }
-            except AttributeError:
-                recipe['user'] = {
-                    'userId': None,
-                    'username': 'Unknown',
-                    'firstName': '',
-                    'lastName': ''
-                }
+        # Add category and user data to each recipe, batched for the whole page
+        categories = await aload_recipe_categories(recipes)
+        creators = await aload_recipe_creators(recipes)
+        for recipe_obj, recipe in zip(recipes, serializer.data):
+            recipe['cat'] = categories[recipe_obj.recipe_id]
+            recipe['user'] = creators[recipe_obj.recipe_id]
         
-        return Response(serializer.data)
+        if page is not None:
+            return json_response(paginator.get_paginated_data(serializer.data))
+        return json_response(serializer.data)
 
 class CreateRecipeView(APIView):
+    # A concurrent create can take the same new lookup row or quantity id; retry the whole write
+    max_attempts = 3
+
     def post(self, request):
         try:
             # Extract data from request
@@ -254,80 +396,45 @@ class CreateRecipeView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Create recipe
-            recipe = Recipe(
-                recipe_name=recipe_name,
-                recipe_description=recipe_description,
-                recipe_difficulty=recipe_difficulty,
-                # date_added is auto set with CURRENT_TIMESTAMP
-            )
-            recipe.save()
-            
-            # Get or create category
-            category, created = Category.objects.get_or_create(
-                r_type=category_type,
-                r_region=category_region
-            )
-            
-            # Create identified_by relationship
-            identified_by = IdentifiedBy(
-                ib_r_id=recipe,
-                ib_c_id=category
-            )
-            identified_by.save()
-            
-            # Process ingredients
+            # Validate ingredients before writing anything
+            ingredient_rows = []
             for ing_data in ingredients:
-                # Get or create ingredient
-                ingredient_name = ing_data.get('name')
-                if not ingredient_name:
+                if not ing_data.get('name'):
                     continue
-                    
-                ingredient, created = Ingredient.objects.get_or_create(
-                    ingredient_name=ingredient_name
-                )
-                
-                # Get or create quantity
-                amount = ing_data.get('amount', 0)
-                quantity, created = Quantity.objects.get_or_create(
-                    quantity_amount=float(amount)
-                )
-                
-                # Get or create unit
-                unit_name = ing_data.get('unit')
-                unit = None
-                if unit_name:
-                    unit, created = Unit.objects.get_or_create(
-                        unit_name=unit_name
-                    )
-                
-                # Create recipe_ingredients entry
-                recipe_ingredient = RecipeIngredients(
-                    recipe=recipe,
-                    ingredient=ingredient,
-                    quantity=quantity,
-                    unit=unit
-                )
-                recipe_ingredient.save()
-                
-                # Create nutrition info if provided
-                calories = ing_data.get('calories')
-                protein = ing_data.get('protein')
-                if calories or protein:
-                    nutrition = Nutrition(
-                        ingredient=ingredient,
-                        calorie_count=calories if calories else 0,
-                        protein_count=protein if protein else 0,
-                        unit=unit if unit else None,
-                        serving_size=amount
-                    )
-                    nutrition.save()
+                try:
+                    amount = float(ing_data.get('amount', 0))
+                except (TypeError, ValueError):
+                    return Response({'message': 'Ingredient amounts must be numbers'}, status=status.HTTP_400_BAD_REQUEST)
+                if (ing_data.get('calories') or ing_data.get('protein')) and not ing_data.get('unit'):
+                    return Response({'message': 'Nutrition info needs a unit'}, status=status.HTTP_400_BAD_REQUEST)
+                ingredient_rows.append(dict(ing_data, amount=amount))
+            
+            for attempt in range(self.max_attempts):
+                try:
+                    with transaction.atomic():
+                        recipe = self.create_recipe(
+                            recipe_name,
+                            recipe_description,
+                            recipe_difficulty,
+                            [category_type, category_region],
+                            ingredient_rows
+                        )
+                    break
+                except LookupConflict:
+                    if attempt == self.max_attempts - 1:
+                        raise
             
             return Response(
                 {'message': 'Recipe created successfully', 'recipeId': recipe.recipe_id},
                 status=status.HTTP_201_CREATED
             )
             
+        except IntegrityError:
+            # A missing or out of range value the checks above let through
+            return Response(
+                {'message': 'Invalid recipe data'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         except Exception as e:
             # Log the error
             print(f"Error creating recipe: {str(e)}")
@@ -335,13 +442,73 @@ class CreateRecipeView(APIView):
                 {'message': 'An error occurred while creating the recipe'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-
-class RecipeDetailView(APIView):
-    def get(self, request, recipe_id):
-        try:
-            recipe = Recipe.objects.get(recipe_id=recipe_id)
-        except Recipe.DoesNotExist:
-            return Response({'message': 'Recipe not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    def create_recipe(self, name, description, difficulty, category_names, ingredient_rows):
+        """
+        Write a recipe with its categories, ingredients and nutrition.
+        Lookup rows are resolved a column at a time and the join rows are bulk
+        inserted, so the query count does not grow with the ingredient count.
+        """
+        recipe = Recipe(
+            recipe_name=name,
+            recipe_description=description,
+            recipe_difficulty=difficulty,
+            date_added=timezone.localdate()
+        )
+        recipe.save()
+        
+        # Get or create categories, then link them
+        categories = resolve_lookup(Category, 'cat_name', category_names)
+        IdentifiedBy.objects.bulk_create([
+            IdentifiedBy(recipe=recipe, category=category)
+            for category in {c.category_id: c for c in categories.values()}.values()
+        ])
+        
+        # Get or create ingredients, quantities and units
+        ingredients = resolve_lookup(Ingredient, 'ingredient_name', [row['name'] for row in ingredient_rows])
+        units = resolve_lookup(Unit, 'unit_name', [row.get('unit') for row in ingredient_rows])
+        quantities = resolve_quantities([round(row['amount']) for row in ingredient_rows])
+        
+        # Create recipe_ingredients entries
+        bulk_create_recipe_ingredients([
+            RecipeIngredients(
+                recipe=recipe,
+                ingredient=ingredients[row['name']],
+                quantity=quantities[round(row['amount'])],
+                unit=units.get(row.get('unit'))
+            )
+            for row in ingredient_rows
+        ])
+        
+        # Create nutrition info where provided
+        bulk_create_nutrition([
+            Nutrition(
+                ingredient=ingredients[row['name']],
+                calorie_count=row.get('calories') or 0,
+                protein_count=row.get('protein') or 0,
+                unit=units[row['unit']],
+                serving_size=row['amount']
+            )
+            for row in ingredient_rows
+            if row.get('calories') or row.get('protein')
+        ])
+        after_bulk_write(ingredients=ingredients.values())
+        return recipe
+
+class RecipeDetailView(View):
+    @conditional(lambda request, recipe_id: [recipe_scope(recipe_id)])
+    @api_errors
+    async def get(self, request, recipe_id):
+        # Serve the rendered payload from the cache when we have it
+        data = await sync_to_async(get_recipe_detail)(recipe_id)
+        if data is not None:
+            return json_response(data)
+        
+        # The payload outlives any replica lag, so build it from the primary
+        read_from_primary()
+        recipe = await Recipe.objects.filter(recipe_id=recipe_id).afirst()
+        if recipe is None:
+            return json_response({'message': 'Recipe not found'}, status=status.HTTP_404_NOT_FOUND)
         
         serializer = RecipeDetailSerializer(recipe)
         data = serializer.data
@@ -349,46 +516,37 @@ class RecipeDetailView(APIView):
         # Add category info
         data['cat'] = [
             { 'categoryId': c.category_id, 'catname': c.cat_name}
-            for c in recipe.category.all()
+            async for c in recipe.category.all()
         ]
         
         # Add user info (creator)
-        try:
-            creator = recipe.user  
-            data['user'] = {
-                'userId': creator.id,
-                'username': creator.username,
-                'firstName': creator.f_name,
-                'lastName': creator.l_name
-            }
-        except AttributeError:
-            data['user'] = {
-                'userId': None,
-                'username': 'Unknown',
-                'firstName': '',
-                'lastName': ''
-            }
+        data['user'] = (await aload_recipe_creators([recipe]))[recipe.recipe_id]
+        
+        # Add the materialized nutrition summary
+        summary = await aget_recipe_nutrition(recipe.recipe_id)
+        data['nutrition'] = summary_payload(summary)
+        nutrition_by_ingredient = {
+            item['ingredientId']: item for item in summary.breakdown if item['nutritionId'] is not None
+        }
         
         # Add ingredients
-        recipe_ingredients = RecipeIngredients.objects.filter(recipe_id=recipe_id)
+        recipe_ingredients = RecipeIngredients.objects.filter(recipe_id=recipe_id).select_related('ingredient', 'quantity', 'unit')
         data['recipeIngredients'] = []
         
-        for recipe_ingredient in recipe_ingredients:
+        async for recipe_ingredient in recipe_ingredients:
             ingredient = recipe_ingredient.ingredient
             quantity = recipe_ingredient.quantity
             unit = recipe_ingredient.unit
             
             # Get nutrition info if available
             nutrition = None
-            try:
-                nutrition_obj = Nutrition.objects.get(ingredient=ingredient)
+            item = nutrition_by_ingredient.get(ingredient.ingredient_id)
+            if item:
                 nutrition = {
-                    'nutritionId': nutrition_obj.nutrition_id,
-                    'calorieCount': float(nutrition_obj.calorie_count) if nutrition_obj.calorie_count else 0,
-                    'proteinCount': float(nutrition_obj.protein_count) if nutrition_obj.protein_count else 0
+                    'nutritionId': item['nutritionId'],
+                    'calorieCount': item['calorieCount'],
+                    'proteinCount': item['proteinCount']
                 }
-            except Nutrition.DoesNotExist:
-                pass
             
             ingredient_data = {
                 'ingredient': {
@@ -410,11 +568,11 @@ class RecipeDetailView(APIView):
                 
             data['recipeIngredients'].append(ingredient_data)
         
-        # Add reviews
-        reviews = Review.objects.filter(recipe_id=recipe_id)
+        # Add reviews, with their authors in the same query
+        reviews = Review.objects.filter(recipe_id=recipe_id).select_related('user')
         data['reviews'] = []
         
-        for review in reviews:
+        async for review in reviews:
             reviewer = review.user
             review_data = {
                 'reviewId': review.review_id,
@@ -430,8 +588,11 @@ class RecipeDetailView(APIView):
             }
             data['reviews'].append(review_data)
         
-        return Response(data)
-    
+        await sync_to_async(set_recipe_detail)(recipe_id, data)
+        return json_response(data)
+
+
+class RecipeUpdateView(APIView):
     def put(self, request, recipe_id):
         try:
             recipe = Recipe.objects.get(recipe_id=recipe_id)
@@ -461,18 +622,25 @@ class RecipeDetailView(APIView):
         recipe.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+recipe_detail = split_methods(RecipeDetailView.as_view(), RecipeUpdateView.as_view())
+
 # ---------------COOKBOOK VIEWS---------------#
 class CookbookListView(generics.ListAPIView):
-    queryset = Cookbook.objects.all()
+    # CookbookSerializer nests the creator and every subscriber
+    queryset = Cookbook.objects.select_related('creator').prefetch_related('subscribers')
     serializer_class = CookbookSerializer
     permission_classes = [permissions.IsAuthenticated]
 
 class CookbookDetailView(generics.RetrieveUpdateAPIView):
-    queryset = Cookbook.objects.all()
+    queryset = Cookbook.objects.select_related('creator').prefetch_related('subscribers')
     serializer_class = CookbookSerializer
     lookup_field = 'cb_id'
     permission_classes = [permissions.IsAuthenticated]
 
+    @conditional(lambda request, cb_id: [cookbook_scope(cb_id)])
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
     def update(self, request, *args, **kwargs):
         cookbook = self.get_object()
         if cookbook.creator != request.user:
@@ -524,41 +692,118 @@ class ReviewView(generics.ListCreateAPIView):
 
 
 #--------------CATEGORY VIEWS---------------#
-class CategoryDetailView(APIView):
-    def get(self, request, category_id):
-        # try:
-        #     category = Category.objects.get(category_id=category_id)
-        # except Category.DoesNotExist:
-        #     return Response({'message': 'Category not found'}, status=status.HTTP_404_NOT_FOUND)
-        
-        # serializer = CategorySerializer(category)
-        # data = serializer.data
-        
-        # # Get recipes in this category
-        # recipes = category.recipes.all()
-        
-        # recipe_serializer = RecipeListSerializer(recipes, many=True)
-        # data['recipes'] = recipe_serializer.data
-        cat = get_object_or_404(Category, category_id=category_id)
+class CategoryDetailView(View):
+    # The category's recipes change with the catalog
+    @conditional(lambda request, category_id: [category_scope(category_id), CATALOG])
+    @api_errors
+    async def get(self, request, category_id):
+        cat = await aget_object_or_404(Category, category_id=category_id)
 
         base = CategorySerializer(cat).data
 
-        queryset = cat.recipes.all()
+        queryset = [recipe async for recipe in cat.recipes.all()]
         recipes = RecipeListSerializer(queryset, many=True).data
 
         base['recipes'] = recipes
-        return Response(base)
+        return json_response(base)
+
+#--------------CACHE STATS---------------#
+class RecipeDetailCacheStatsView(APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsPlatformAdmin]
+
+    def get(self, request):
+        return Response(detail_cache_stats())
+
+class DatabasePoolStatsView(APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsPlatformAdmin]
+
+    def get(self, request):
+        # Pools are per process, like the caches above
+        return Response(pool_stats())
+
+class AuthCacheStatsView(APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsPlatformAdmin]
 
-#--------------SEARCH ENDPOINT---------------#
-class SearchRecipesView(APIView):
     def get(self, request):
-        search = request.query_params.get('q', '')
+        return Response({
+            'tokens': token_memo_stats(),
+            'users': get_local_cache().stats(),
+            'denyList': get_deny_list().stats()
+        })
+
+#--------------INGREDIENT MATCH ENDPOINT---------------#
+class RecipesByIngredientsView(APIView):
+    max_ingredients = 30
+
+    def get(self, request):
+        """
+        "Cook with what I have": recipes ranked by how many of the given
+        ingredients they use. `ingredients` takes names or ids, comma separated
+        or repeated; `min_match` drops recipes using fewer of them.
+        Pass `cursor` or `page_size` to page through the results.
+        """
+        terms = [
+            term.strip()
+            for value in request.query_params.getlist('ingredients')
+            for term in value.split(',')
+            if term.strip()
+        ]
+        if not terms:
+            return Response({'message': 'Please provide at least one ingredient'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(terms) > self.max_ingredients:
+            return Response({'message': f'Please provide at most {self.max_ingredients} ingredients'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            min_match = int(request.query_params.get('min_match', 1))
+        except ValueError:
+            return Response({'message': 'min_match must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        ranked = match_recipes(terms, min_match=min_match)
+        
+        paginator = RankedPagination()
+        page = paginator.paginate_queryset(ranked, request, view=self)
+        rows = page if page is not None else ranked
+        
+        # Load the matching rows and put them back in rank order
+        recipes = Recipe.objects.in_bulk([recipe_id for recipe_id, matched in rows])
+        matches = [(recipes[recipe_id], matched) for recipe_id, matched in rows if recipe_id in recipes]
+        
+        data = RecipeListSerializer([recipe for recipe, matched in matches], many=True).data
+        for recipe, (recipe_obj, matched) in zip(data, matches):
+            recipe['matchedCount'] = matched
+            recipe['missingCount'] = len(terms) - matched
+        
+        if page is not None:
+            return paginator.get_paginated_response(data)
+        return Response(data)
+
+#--------------SEARCH ENDPOINT---------------#
+class SearchRecipesView(View):
+    @api_errors
+    async def get(self, request):
+        """
+        Search recipe names and descriptions, best match first.
+        Pass `cursor` or `page_size` to page through the results.
+        """
+        search = request.GET.get('q', '')
         
         if not search:
-            return Response([])
+            return json_response([])
+        
+        ranked_ids = await sync_to_async(search_recipe_ids)(search)
+        
+        paginator = RankedPagination()
+        page = paginator.paginate_queryset(ranked_ids, request, view=self)
+        page_ids = page if page is not None else ranked_ids
         
-        # Search in recipe names and descriptions
-        recipes = Recipe.objects.filter(recipe_name__icontains=search) | Recipe.objects.filter(recipe_description__icontains=search)
+        # Load the matching rows and put them back in rank order
+        recipes = await Recipe.objects.ain_bulk(page_ids)
+        recipes = [recipes[recipe_id] for recipe_id in page_ids if recipe_id in recipes]
         
         serializer = RecipeListSerializer(recipes, many=True)
-        return Response(serializer.data)
+        if page is not None:
+            return json_response(paginator.get_paginated_data(serializer.data))
+        return json_response(serializer.data)
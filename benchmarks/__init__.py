@@ -0,0 +1,56 @@
+"""
+Benchmarks for the ezChef API.
+
+Each benchmark module runs against a throwaway SQLite database built from the
+models, the same way the test suite does, and prints a small report:
+
+    python -m benchmarks.create_recipe
+"""
+import os
+import statistics
+import time
+from contextlib import contextmanager
+
+
+@contextmanager
+def benchmark_database():
+    """Set up Django and a throwaway database for the duration of a benchmark"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ezchef_cooking_platform.test_settings')
+    import django
+    django.setup()
+
+    from api.test_runner import UnmanagedModelTestRunner
+    runner = UnmanagedModelTestRunner(verbosity=0, interactive=False)
+    runner.setup_test_environment()
+    old_config = runner.setup_databases()
+    try:
+        yield
+    finally:
+        runner.teardown_databases(old_config)
+        runner.teardown_test_environment()
+
+
+def timed(fn, repeat):
+    """Run fn repeat times, returning each run's duration in milliseconds"""
+    durations = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+
+def summarize(durations):
+    ordered = sorted(durations)
+    return {
+        'p50': statistics.median(ordered),
+        'p99': ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+        'mean': statistics.fmean(ordered),
+    }
+
+
+def print_table(headers, rows):
+    widths = [max(len(str(h)), *(len(str(row[i])) for row in rows)) for i, h in enumerate(headers)]
+    print('  '.join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print('  '.join(str(v).ljust(w) for v, w in zip(row, widths)))
@@ -0,0 +1,185 @@
+"""
+Load test of the read endpoints through Django's WSGI handler, served by a
+fixed pool of worker threads like a threaded WSGI server, and through its ASGI
+handler with every request in flight at once on one event loop.
+
+    python -m benchmarks.async_reads [--requests N] [--concurrency N] [--threads N] [--latency MS]
+
+Every query sleeps --latency milliseconds to stand in for the round trip to
+MySQL, which the local SQLite database does not have. The WSGI side can only
+wait on --threads queries at a time; the ASGI side waits on as many as there
+are requests in flight.
+
+Django's async ORM still runs each query on a thread through sync_to_async,
+and so does every stock middleware, so each ASGI request costs a few thread
+hops. Those hops outweigh the extra waiting it can overlap: on one CPU with
+SQLite and 5 ms per query, 8 requests in flight gave WSGI 228 req/s (p99
+97 ms) and ASGI 124 req/s (p99 132 ms). Measure on the deployment hardware
+before choosing the ASGI server for throughput.
+"""
+import argparse
+import asyncio
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.util import setup_testing_defaults
+
+from . import benchmark_database, print_table, summarize
+
+
+def wsgi_get(app, path, headers):
+    target, _, query = path.partition('?')
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': target, 'QUERY_STRING': query, 'HTTP_HOST': 'testserver', 'wsgi.input': io.BytesIO()}
+    environ.update({f"HTTP_{name.upper().replace('-', '_')}": value for name, value in headers.items()})
+    setup_testing_defaults(environ)
+    status = []
+    body = b''.join(app(environ, lambda code, response_headers, exc_info=None: status.append(code)))
+    return int(status[0].split()[0]), body
+
+
+async def asgi_get(app, path, headers):
+    target, _, query = path.partition('?')
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': target,
+        'raw_path': target.encode(),
+        'query_string': query.encode(),
+        'root_path': '',
+        'headers': [(b'host', b'testserver')] + [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+        'client': ('127.0.0.1', 50000),
+        'server': ('testserver', 80),
+    }
+    sent_body = False
+    done = asyncio.Event()
+    response = {'body': b''}
+
+    async def receive():
+        nonlocal sent_body
+        if not sent_body:
+            sent_body = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # The client stays connected until the response is complete
+        await done.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+        elif message['type'] == 'http.response.body':
+            response['body'] += message.get('body', b'')
+            if not message.get('more_body'):
+                done.set()
+
+    await app(scope, receive, send)
+    return response['status'], response['body']
+
+
+def run_wsgi(app, paths, headers, threads):
+    durations = []
+
+    def request(path):
+        start = time.perf_counter()
+        status, body = wsgi_get(app, path, headers)
+        assert status == 200, (path, status, body[:200])
+        durations.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(request, paths))
+    return durations, time.perf_counter() - start
+
+
+def run_asgi(app, paths, headers, concurrency):
+    durations = []
+
+    async def main():
+        slots = asyncio.Semaphore(concurrency)
+
+        async def request(path):
+            async with slots:
+                start = time.perf_counter()
+                status, body = await asgi_get(app, path, headers)
+                assert status == 200, (path, status, body[:200])
+                durations.append((time.perf_counter() - start) * 1000)
+
+        await asyncio.gather(*(request(path) for path in paths))
+
+    start = time.perf_counter()
+    asyncio.run(main())
+    return durations, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=600)
+    parser.add_argument('--concurrency', type=int, default=200, help='Requests in flight on the ASGI side')
+    parser.add_argument('--threads', type=int, default=8, help='Worker threads on the WSGI side')
+    parser.add_argument('--latency', type=float, default=5.0, help='Simulated milliseconds per query')
+    parser.add_argument('--recipes', type=int, default=200)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        import datetime
+
+        from django.core.asgi import get_asgi_application
+        from django.core.cache import cache
+        from django.core.wsgi import get_wsgi_application
+        from django.db import connection
+        from django.db.backends.signals import connection_created
+
+        from api.jwt_utils import generate_tokens_for_user
+        from api.models import Category, IdentifiedBy, Recipe, User
+
+        user = User.objects.create(username='bench', password='x', f_name='A', l_name='B', email='bench@example.com')
+        category = Category.objects.create(cat_name='Dinner')
+        recipes = Recipe.objects.bulk_create([
+            Recipe(recipe_name=f'Recipe {i}', recipe_description=f'Benchmark dish number {i}', date_added=datetime.date(2025, 1, 1), recipe_difficulty=i % 5 + 1)
+            for i in range(args.recipes)
+        ])
+        recipes = list(Recipe.objects.all())
+        IdentifiedBy.objects.bulk_create([IdentifiedBy(recipe=recipe, category=category) for recipe in recipes])
+        headers = {'Authorization': f"Bearer {generate_tokens_for_user(user)['access']}"}
+
+        endpoints = [
+            '/api/recipes/?page_size=20',
+            '/api/recipes/search/?q=dish',
+            f'/api/categories/{category.category_id}/',
+            '/api/user/profile/',
+        ] + [f'/api/recipes/{recipe.recipe_id}/' for recipe in recipes[:10]]
+        paths = [endpoints[i % len(endpoints)] for i in range(args.requests)]
+
+        wsgi, asgi = get_wsgi_application(), get_asgi_application()
+        # Warm the search index, nutrition summaries and token memo
+        for path in endpoints:
+            wsgi_get(wsgi, path, headers)
+
+        def slow_query(execute, sql, params, many, context):
+            time.sleep(args.latency / 1000)
+            return execute(sql, params, many, context)
+
+        def add_latency(connection, **kwargs):
+            connection.execute_wrappers.append(slow_query)
+
+        connection.execute_wrappers.append(slow_query)
+        connection_created.connect(add_latency)
+
+        rows = []
+        for label, run in (
+            (f'wsgi, {args.threads} threads', lambda: run_wsgi(wsgi, paths, headers, args.threads)),
+            (f'asgi, {args.concurrency} in flight', lambda: run_asgi(asgi, paths, headers, args.concurrency)),
+        ):
+            # Recipe details would otherwise all come from the cache
+            cache.clear()
+            durations, elapsed = run()
+            stats = summarize(durations)
+            rows.append((label, f'{len(durations) / elapsed:.0f}', f"{stats['p50']:.1f}", f"{stats['p99']:.1f}"))
+
+        print_table(('handler', 'requests/s', 'p50 ms', 'p99 ms'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Cost of JWTAuthMiddleware on an authenticated request, with the user cache
+cold (every request misses) and warm (every request hits).
+
+    python -m benchmarks.auth_middleware [--repeat N]
+
+A warm cache should run no queries per request.
+"""
+import argparse
+
+from . import benchmark_database, print_table, summarize, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=500)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        from django.db import connection
+        from django.test import Client
+        from django.test.utils import CaptureQueriesContext
+
+        from api.jwt_utils import generate_tokens_for_user
+        from api.models import User
+        from api.user_cache import get_local_cache
+
+        user = User.objects.create(username='bench', password='x', f_name='A', l_name='B', email='bench@example.com')
+        token = generate_tokens_for_user(user)['access']
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {token}')
+        cache = get_local_cache()
+
+        rows = []
+        for label, cold in (('cold', True), ('warm', False)):
+            queries = []
+            cache.clear()
+
+            def request(run):
+                if cold:
+                    cache.clear()
+                with CaptureQueriesContext(connection) as captured:
+                    response = client.get('/api/user/profile/')
+                assert response.status_code == 200, response.content
+                queries.append(len(captured))
+
+            stats = summarize(timed(request, args.repeat))
+            # The first warm request fills the cache
+            counted = queries if cold else queries[1:]
+            per_request = sum(counted) / max(len(counted), 1)
+            rows.append((label, f"{stats['p50']:.3f}", f"{stats['p99']:.3f}", f'{per_request:.2f}'))
+
+        print_table(('user cache', 'p50 ms', 'p99 ms', 'queries/request'), rows)
+
+
+if __name__ == '__main__':
+    main()
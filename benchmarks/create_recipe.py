@@ -0,0 +1,65 @@
+"""
+Write latency of recipes/create/ as the ingredient count grows.
+
+    python -m benchmarks.create_recipe [--repeat N]
+
+Latency and query count should stay roughly flat from 1 to 50 ingredients.
+"""
+import argparse
+
+from . import benchmark_database, print_table, summarize, timed
+
+INGREDIENT_COUNTS = (1, 5, 20, 50)
+
+
+def payload(run, ingredient_count):
+    return {
+        'name': f'Benchmark recipe {run}',
+        'description': 'Benchmark',
+        'difficulty': 3,
+        'categoryType': 'Dinner',
+        'categoryRegion': 'Italian',
+        'instructions': 'Cook',
+        'ingredients': [
+            # Half the ingredients are shared between runs, half are new
+            {
+                'name': f'Ingredient {i}' if i % 2 else f'Ingredient {run}-{i}',
+                'amount': i + 1,
+                'unit': 'g',
+                'calories': 10,
+                'protein': 1,
+            }
+            for i in range(ingredient_count)
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        from django.db import connection
+        from django.test import Client
+        from django.test.utils import CaptureQueriesContext
+
+        client = Client()
+        rows = []
+        for count in INGREDIENT_COUNTS:
+            queries = []
+
+            def create(run):
+                with CaptureQueriesContext(connection) as captured:
+                    response = client.post('/api/recipes/create/', payload(f'{count}-{run}', count), content_type='application/json')
+                assert response.status_code == 201, response.content
+                queries.append(len(captured))
+
+            stats = summarize(timed(create, args.repeat))
+            rows.append((count, f"{stats['p50']:.2f}", f"{stats['p99']:.2f}", max(queries)))
+
+        print_table(('ingredients', 'p50 ms', 'p99 ms', 'queries'), rows)
+
+
+if __name__ == '__main__':
+    main()
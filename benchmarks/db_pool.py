@@ -0,0 +1,96 @@
+"""
+Connection overhead per request with the connection pool off (connect and
+disconnect every request, CONN_MAX_AGE = 0) and on (api.db_pool).
+
+    python -m benchmarks.db_pool [--requests N] [--threads N] [--pool-size N] [--settings MODULE]
+
+Each simulated request opens the connection, runs one query and closes it,
+which is what Django does per request. By default this runs against a
+throwaway SQLite file, where connecting is cheap; pass
+--settings ezchef_cooking_platform.settings to measure the MySQL server
+those settings point at, where the difference is a TCP and auth handshake.
+With more threads than pooled connections, requests queue for a free one.
+"""
+import argparse
+import os
+import tempfile
+import threading
+
+from . import print_table, summarize, timed
+
+POOLED_ENGINES = {
+    'django.db.backends.mysql': 'api.backends.mysql',
+    'django.db.backends.sqlite3': 'api.backends.sqlite3',
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per thread')
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--pool-size', type=int, default=4)
+    parser.add_argument('--settings', default='ezchef_cooking_platform.test_settings')
+    args = parser.parse_args()
+
+    os.environ['DJANGO_SETTINGS_MODULE'] = args.settings
+    import django
+    django.setup()
+
+    from django.db import connections
+    from django.db.utils import load_backend
+
+    from api.db_pool import get_pool
+
+    settings_dict = dict(connections['default'].settings_dict)
+    pooled = {engine: base for base, engine in POOLED_ENGINES.items()}
+    base_engine = pooled.get(settings_dict['ENGINE'], settings_dict['ENGINE'])
+    scratch = None
+    if base_engine == 'django.db.backends.sqlite3':
+        scratch = tempfile.TemporaryDirectory()
+        settings_dict['NAME'] = os.path.join(scratch.name, 'bench.sqlite3')
+
+    rows = []
+    for label, engine in (('off', base_engine), ('on', POOLED_ENGINES[base_engine])):
+        options = {**settings_dict, 'ENGINE': engine, 'POOL': {**settings_dict.get('POOL', {}), 'MAX_SIZE': args.pool_size}}
+        backend = load_backend(engine)
+        durations = []
+        lock = threading.Lock()
+
+        def worker():
+            # Django keeps one wrapper per thread
+            wrapper = backend.DatabaseWrapper(options, alias=f'bench-{label}')
+
+            def request(i):
+                wrapper.ensure_connection()
+                with wrapper.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                wrapper.close()
+
+            result = timed(request, args.requests)
+            with lock:
+                durations.extend(result)
+
+        threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = summarize(durations)
+        row = [label, f"{stats['p50']:.3f}", f"{stats['p99']:.3f}"]
+        if engine in pooled:
+            pool = get_pool(backend.DatabaseWrapper(options, alias=f'bench-{label}'))
+            pool_stats = pool.stats()
+            row += [pool_stats['created'], pool_stats['waits'], f"{pool_stats['avgWaitMs']:.3f}"]
+            pool.close_idle()
+        else:
+            row += [len(durations), '-', '-']
+        rows.append(row)
+
+    print_table(('pool', 'p50 ms', 'p99 ms', 'connections opened', 'waits', 'avg wait ms'), rows)
+    if scratch is not None:
+        scratch.cleanup()
+
+
+if __name__ == '__main__':
+    main()
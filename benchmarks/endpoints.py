@@ -0,0 +1,229 @@
+"""
+Every route in api/urls.py, driven through the full middleware stack against
+a synthetic dataset (api.dataset), reporting throughput, p50/p99 latency and
+SQL queries per request.
+
+    python -m benchmarks.endpoints [--scale 10k|100k|1m | --recipes N] [--requests N] [--save PATH] [--compare PATH]
+
+--save writes the results as a baseline; --compare reads one and exits with
+status 1 when an endpoint answers with another status, runs more queries
+than it did, or its p50 grew by more than --tolerance. Query counts do not depend on the machine, latencies
+do, so compare against a baseline recorded on the same kind of machine:
+
+    python -m benchmarks.endpoints --compare benchmarks/baselines/endpoints-10k.json
+
+Generating the dataset dominates the run time at 100k and 1m on SQLite; set
+DJANGO_SETTINGS_MODULE to settings that point at MySQL to benchmark there.
+List routes are asked for one page of 20, as a client would page through
+them; without page_size they return the whole table. Routes that cannot run
+as they stand are listed in SKIPPED with the reason, and left out.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import time
+
+from . import benchmark_database, print_table, summarize
+
+PASSWORD = 'password'
+
+# Cases that answer with a server error as the views stand; their timings would mean nothing
+SKIPPED = {
+    'PUT recipes/<int:recipe_id>/': 'RecipeUpdateView looks for an owner the Recipe table does not have',
+    'DELETE recipes/<int:recipe_id>/': 'RecipeUpdateView looks for an owner the Recipe table does not have',
+    'GET categories/<int:category_id>/recipes/': 'RecipeListView.get takes no category_id',
+}
+
+
+def build_cases(total):
+    """(key, method, request(i) -> (path, body)) for every api route, each good for total calls"""
+    from django.db.models import Count
+
+    from api.dataset import FOODS
+    from api.jwt_utils import generate_tokens_for_user
+    from api.models import Admin, Category, Recipe, RecipeIngredients, User
+
+    user = User.objects.order_by('id').first()
+    Admin.objects.create(admin=user)
+    recipes = list(Recipe.objects.order_by('recipe_id').values_list('recipe_id', flat=True)[:50])
+    # Deleted one per request, so they come from the far end
+    doomed = list(Recipe.objects.order_by('-recipe_id').values_list('recipe_id', flat=True)[:total])
+    categories = list(Category.objects.annotate(n=Count('identifiedby')).order_by('-n').values_list('category_id', flat=True)[:10])
+    ingredients = list(RecipeIngredients.objects.values_list('ingredient__ingredient_name', flat=True).distinct()[:20])
+    refresh = [generate_tokens_for_user(user)['refresh'] for _ in range(2 * total)]
+
+    def cycle(values, i):
+        return values[i % len(values)]
+
+    return [
+        ('POST auth/register/', 'post', lambda i: ('/api/auth/register/', {'username': f'bench{i}', 'email': f'bench{i}@example.com', 'password': PASSWORD})),
+        ('POST auth/login/', 'post', lambda i: ('/api/auth/login/', {'username': user.username, 'password': PASSWORD})),
+        ('POST auth/refresh/', 'post', lambda i: ('/api/auth/refresh/', {'refresh': refresh[i]})),
+        ('POST auth/logout/', 'post', lambda i: ('/api/auth/logout/', {'refresh': refresh[total + i]})),
+        ('POST users/bulk/', 'post', lambda i: ('/api/users/bulk/', {'users': [
+            {'username': f'bulk{i}x{j}', 'email': f'bulk{i}x{j}@example.com', 'password': PASSWORD} for j in range(10)
+        ]})),
+        ('GET auth/cache-stats/', 'get', lambda i: ('/api/auth/cache-stats/', None)),
+        ('GET db/pool-stats/', 'get', lambda i: ('/api/db/pool-stats/', None)),
+        ('GET user/profile/', 'get', lambda i: ('/api/user/profile/', None)),
+        ('GET recipes/', 'get', lambda i: ('/api/recipes/?page_size=20', None)),
+        ('GET recipes/<int:recipe_id>/', 'get', lambda i: (f'/api/recipes/{cycle(recipes, i)}/', None)),
+        ('PUT recipes/<int:recipe_id>/', 'put', lambda i: (f'/api/recipes/{cycle(recipes, i)}/', {'recipe_difficulty': 3})),
+        ('DELETE recipes/<int:recipe_id>/', 'delete', lambda i: (f'/api/recipes/{doomed[i]}/', None)),
+        ('GET recipes/search/', 'get', lambda i: (f'/api/recipes/search/?q={cycle(FOODS, i)}&page_size=20', None)),
+        ('GET recipes/by-ingredients/', 'get', lambda i: (f"/api/recipes/by-ingredients/?ingredients={','.join(ingredients[i % 10:i % 10 + 3])}&page_size=20", None)),
+        ('POST recipes/create/', 'post', lambda i: ('/api/recipes/create/', {
+            'name': f'Bench recipe {i}', 'description': 'Benchmark', 'difficulty': 2, 'categoryType': 'Dinner', 'categoryRegion': 'Italian',
+            'instructions': 'Cook it', 'ingredients': [{'name': name, 'amount': 100, 'unit': 'gram', 'calories': 50} for name in ingredients[:8]],
+        })),
+        ('GET recipes/cache-stats/', 'get', lambda i: ('/api/recipes/cache-stats/', None)),
+        ('GET categories/', 'get', lambda i: ('/api/categories/?page_size=20', None)),
+        ('GET categories/<int:category_id>/', 'get', lambda i: (f'/api/categories/{cycle(categories, i)}/', None)),
+        ('GET categories/<int:category_id>/recipes/', 'get', lambda i: (f'/api/categories/{cycle(categories, i)}/recipes/?page_size=20', None)),
+        ('GET users/', 'get', lambda i: ('/api/users/?page_size=20', None)),
+        ('GET ingredients/', 'get', lambda i: ('/api/ingredients/?page_size=20', None)),
+        ('GET units/', 'get', lambda i: ('/api/units/?page_size=20', None)),
+        ('GET quantities/', 'get', lambda i: ('/api/quantities/?page_size=20', None)),
+        ('GET nutritions/', 'get', lambda i: ('/api/nutritions/?page_size=20', None)),
+        ('GET recipe-ingredients/', 'get', lambda i: ('/api/recipe-ingredients/?page_size=20', None)),
+    ], generate_tokens_for_user(user)['access']
+
+
+def check_coverage(cases):
+    """Fail when a route in api/urls.py has no case, so new endpoints get benchmarked"""
+    from api.urls import urlpatterns
+
+    covered = {key.split(' ', 1)[1] for key, method, request in cases}
+    missing = [str(pattern.pattern) for pattern in urlpatterns if str(pattern.pattern) not in covered]
+    if missing:
+        raise SystemExit(f"No benchmark case for: {', '.join(missing)}")
+
+
+def run_case(client, method, request, headers, warmup, requests):
+    from django.db import connection
+
+    executed = 0
+
+    def count(execute, sql, params, many, context):
+        nonlocal executed
+        executed += 1
+        return execute(sql, params, many, context)
+
+    durations, queries, statuses = [], [], set()
+    for i in range(warmup + requests):
+        path, body = request(i)
+        kwargs = {'data': json.dumps(body), 'content_type': 'application/json'} if body is not None else {}
+        executed = 0
+        with connection.execute_wrapper(count):
+            start = time.perf_counter()
+            response = getattr(client, method)(path, **kwargs, **headers)
+            elapsed = (time.perf_counter() - start) * 1000
+        if i >= warmup:
+            durations.append(elapsed)
+            queries.append(executed)
+            statuses.add(response.status_code)
+    stats = summarize(durations)
+    return {
+        'rps': round(len(durations) / (sum(durations) / 1000), 1),
+        'p50': round(stats['p50'], 3),
+        'p99': round(stats['p99'], 3),
+        'queries': int(statistics.median(queries)),
+        'status': sorted(statuses),
+    }
+
+
+def compare(results, baseline, tolerance):
+    failures = []
+    for key, old in baseline['results'].items():
+        new = results.get(key)
+        if new is None:
+            continue
+        if new['status'] != old['status']:
+            failures.append(f"{key}: status {','.join(map(str, new['status']))}, baseline {','.join(map(str, old['status']))}")
+        if new['queries'] > old['queries']:
+            failures.append(f"{key}: {new['queries']} queries, baseline {old['queries']}")
+        if new['p50'] > old['p50'] * (1 + tolerance):
+            failures.append(f"{key}: p50 {new['p50']:.2f} ms, baseline {old['p50']:.2f} ms")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=('10k', '100k', '1m'), default='10k')
+    parser.add_argument('--recipes', type=int, help='Number of recipes, instead of --scale')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--requests', type=int, default=50, help='Timed requests per route')
+    parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per route first')
+    parser.add_argument('--save', help='Write the results to this baseline file')
+    parser.add_argument('--compare', help='Baseline file to check the results against')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='Allowed p50 growth over the baseline, 0.5 = 50%%')
+    args = parser.parse_args()
+
+    recipes = args.recipes or {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}[args.scale]
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as source:
+            baseline = json.load(source)
+        if (baseline['recipes'], baseline['seed']) != (recipes, args.seed):
+            raise SystemExit(f"{args.compare} was recorded at --recipes {baseline['recipes']} --seed {baseline['seed']}")
+
+    with benchmark_database():
+        from django.core.cache import cache
+        from django.test import Client
+
+        from api.dataset import generate_dataset
+
+        start = time.perf_counter()
+        counts = generate_dataset(recipes, seed=args.seed)
+        print(f"Generated {counts['recipes']} recipes in {time.perf_counter() - start:.0f}s: {json.dumps(counts)}")
+
+        total = args.warmup + args.requests
+        cases, access = build_cases(total)
+        check_coverage(cases)
+        cache.clear()
+        client = Client(raise_request_exception=False)
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {access}'}
+        results = {}
+        for key, method, request in cases:
+            if key in SKIPPED:
+                print(f'{key}: skipped, {SKIPPED[key]}', flush=True)
+                continue
+            results[key] = run_case(client, method, request, headers, args.warmup, args.requests)
+            print(f"{key}: {results[key]['p50']:.2f} ms", flush=True)
+
+    print_table(
+        ('route', 'req/s', 'p50 ms', 'p99 ms', 'queries', 'status'),
+        [(key, r['rps'], r['p50'], r['p99'], r['queries'], ','.join(map(str, r['status']))) for key, r in results.items()],
+    )
+
+    broken = [key for key, r in results.items() if max(r['status']) >= 500]
+    if args.save and broken:
+        raise SystemExit(f"Not saving a baseline with server errors from: {', '.join(broken)}; fix them or add them to SKIPPED")
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or '.', exist_ok=True)
+        with open(args.save, 'w') as target:
+            json.dump({
+                'recipes': recipes,
+                'seed': args.seed,
+                'requests': args.requests,
+                'machine': f'{platform.machine()}, {os.cpu_count()} CPU, Python {platform.python_version()}',
+                'results': results,
+            }, target, indent=2)
+            target.write('\n')
+        print(f'Saved baseline to {args.save}')
+
+    if baseline is not None:
+        failures = compare(results, baseline, args.tolerance)
+        for failure in failures:
+            print(f'REGRESSION {failure}')
+        if failures:
+            raise SystemExit(1)
+        print(f'No regressions against {args.compare}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Password hashing cost at several PBKDF2 iteration counts, and login-style
+throughput of the hashing pool as it gains workers.
+
+    python -m benchmarks.password_hashing [--repeat N] [--jobs N]
+
+Pick PASSWORD_HASH_ITERATIONS from the first table, and PASSWORD_HASHING_WORKERS
+from the second (throughput stops growing past the number of free cores).
+"""
+import argparse
+import time
+
+from . import benchmark_database, print_table, summarize, timed
+
+ITERATIONS = (100000, 300000, 600000, 1000000)
+WORKERS = (1, 2, 4, 8)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--jobs', type=int, default=32, help='Concurrent verifications per pool size')
+    args = parser.parse_args()
+
+    with benchmark_database():
+        from django.contrib.auth.hashers import make_password
+        from django.test.utils import override_settings
+
+        from api.passwords import HashingPool, verify_password
+
+        hashers = ['api.passwords.ConfigurablePBKDF2PasswordHasher']
+        rows = []
+        for iterations in ITERATIONS:
+            with override_settings(PASSWORD_HASHERS=hashers, PASSWORD_HASH_ITERATIONS=iterations):
+                stats = summarize(timed(lambda run: make_password('benchmark'), args.repeat))
+            rows.append((f'{iterations:,}', f"{stats['p50']:.1f}", f"{stats['p99']:.1f}"))
+        print_table(('iterations', 'p50 ms', 'p99 ms'), rows)
+        print()
+
+        with override_settings(PASSWORD_HASHERS=hashers, PASSWORD_HASH_ITERATIONS=ITERATIONS[1]):
+            encoded = make_password('benchmark')
+            rows = []
+            for workers in WORKERS:
+                pool = HashingPool(workers, queue_limit=args.jobs)
+                start = time.perf_counter()
+                futures = [pool.submit(verify_password, 'benchmark', encoded) for _ in range(args.jobs)]
+                assert all(future.result()[0] for future in futures)
+                elapsed = time.perf_counter() - start
+                pool.executor.shutdown()
+                rows.append((workers, f'{args.jobs / elapsed:.1f}', f'{elapsed * 1000 / args.jobs:.1f}'))
+        print_table((f'workers ({ITERATIONS[1]:,} it.)', 'logins/s', 'ms per login'), rows)
+
+
+if __name__ == '__main__':
+    main()
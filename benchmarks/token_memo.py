@@ -0,0 +1,59 @@
+"""
+validate_token throughput with and without the verified-token memo, from a
+pool of threads replaying a fixed set of access tokens.
+
+    python -m benchmarks.token_memo [--threads N] [--tokens N] [--calls N]
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import benchmark_database, print_table, summarize
+
+
+def run(validate, tokens, threads, calls):
+    """Per-call latencies in microseconds and overall calls per second"""
+    def worker(offset):
+        latencies = []
+        for i in range(calls):
+            token = tokens[(offset + i) % len(tokens)]
+            start = time.perf_counter()
+            assert validate(token) is not None
+            latencies.append((time.perf_counter() - start) * 1_000_000)
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = [latency for result in pool.map(worker, range(threads)) for latency in result]
+    return latencies, len(latencies) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--tokens', type=int, default=100, help='Distinct clients')
+    parser.add_argument('--calls', type=int, default=5000, help='Calls per thread')
+    args = parser.parse_args()
+
+    with benchmark_database():
+        from api.jwt_utils import decode_token, generate_tokens_for_user, get_token_memo, validate_token
+        from api.models import User
+
+        tokens = []
+        for i in range(args.tokens):
+            user = User(id=i + 1, username=f'user{i}')
+            tokens.append(generate_tokens_for_user(user)['access'])
+
+        rows = []
+        for label, validate in (('jwt.decode', decode_token), ('memo', validate_token)):
+            get_token_memo().clear()
+            latencies, throughput = run(validate, tokens, args.threads, args.calls)
+            stats = summarize(latencies)
+            rows.append((label, f"{stats['p50']:.1f}", f"{stats['p99']:.1f}", f'{throughput:,.0f}'))
+
+        print_table(('path', 'p50 us', 'p99 us', 'calls/s'), rows)
+        print(f"memo hit rate: {get_token_memo().stats()['hitRate']:.3f}")
+
+
+if __name__ == '__main__':
+    main()
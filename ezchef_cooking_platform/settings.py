@@ -49,6 +49,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
+    'api.profiling.ProfilingMiddleware',
+    'api.slow_queries.SlowQueryMiddleware',
+    'api.tracing.TracingMiddleware',
+    'api.ratelimit.RateLimitMiddleware',
+    'api.db_router.ReplicaPinMiddleware',
     'api.middleware.JWTAuthMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -64,6 +70,14 @@ REST_FRAMEWORK = {
         'django_filters.rest_framework.DjangoFilterBackend',
         'rest_framework.filters.SearchFilter',
     ],
+    # Opt-in keyset pagination, see api.pagination.KeysetPagination
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.KeysetPagination',
+    'PAGE_SIZE': 20,
+    # JSON rendering shows up as its own phase in request traces
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.tracing.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 AUTHENTICATION_BACKENDS = [
@@ -94,17 +108,125 @@ WSGI_APPLICATION = 'ezchef_cooking_platform.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Connections come from a per-process pool (api.db_pool): a request borrows one
+# and gives it back when Django closes it, so CONN_MAX_AGE stays 0. POOL sets
+# the pool size, how long a request waits for a free connection, how long a
+# connection may sit idle before it is pinged or closed, and its max lifetime
+# (keep MAX_IDLE below MySQL's wait_timeout). Pool stats: /api/db/pool-stats/
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        'ENGINE': 'api.backends.mysql',
         'NAME': 'ezchefdb',
         'USER': 'root',
         'PASSWORD': os.environ.get('DB_PASSWORD'),
         'HOST': 'localhost',
-        'PORT': 3306
+        'PORT': 3306,
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'MAX_SIZE': int(os.environ.get('DB_POOL_SIZE', 10)),
+            'TIMEOUT': 5,
+            'PING_AFTER': 1,
+            'MAX_IDLE': 300,
+            'MAX_LIFETIME': 3600,
+        },
     }
 }
 
+# Read replicas, as comma separated hosts in DB_REPLICA_HOSTS. Reads made while
+# serving a request go to a healthy replica (api.db_router); writes, reads in a
+# transaction and clients that wrote in the last REPLICA_PIN_SECONDS use the
+# primary. A replica that fails its health check, run every
+# REPLICA_HEALTH_CHECK_INTERVAL seconds, or lags more than REPLICA_MAX_LAG
+# seconds is skipped. REPLICA_PIN_CACHE must name a cache shared by every worker
+# (Redis, Memcached); with a per-process one the replicas stay unused.
+
+DATABASE_REPLICAS = []
+
+for index, host in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    DATABASES[f'replica{index}'] = {**DATABASES['default'], 'HOST': host.strip()}
+    DATABASE_REPLICAS.append(f'replica{index}')
+
+DATABASE_ROUTERS = ['api.db_router.PrimaryReplicaRouter']
+
+REPLICA_PIN_SECONDS = 5
+
+REPLICA_PIN_CACHE = 'default'
+
+REPLICA_HEALTH_CHECK_INTERVAL = 5
+
+REPLICA_MAX_LAG = REPLICA_PIN_SECONDS
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# The local-memory cache is per process; point this at a shared backend
+# (memcached, redis) so recipe detail invalidation reaches every worker.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ezchef',
+    }
+}
+
+RECIPE_DETAIL_CACHE = 'default'
+
+RECIPE_DETAIL_CACHE_TIMEOUT = 300
+
+# Users looked up by JWTAuthMiddleware are kept per process for USER_CACHE_TTL
+# seconds. Set USER_CACHE_SHARED to a cache alias to add a shared tier.
+USER_CACHE_TTL = 60
+
+USER_CACHE_MAX_SIZE = 10000
+
+USER_CACHE_SHARED = None
+
+# Verified JWT payloads kept per process until their exp claim
+JWT_MEMO_MAX_SIZE = 10000
+
+# Revoked refresh tokens: each process checks an in-memory Bloom filter of the
+# revoked_token table, picks up other processes' revocations every
+# TOKEN_DENY_LIST_SYNC_INTERVAL seconds and compacts and rebuilds it every
+# TOKEN_DENY_LIST_REBUILD_INTERVAL seconds.
+TOKEN_DENY_LIST_CAPACITY = 1000000
+
+TOKEN_DENY_LIST_ERROR_RATE = 0.001
+
+TOKEN_DENY_LIST_SYNC_INTERVAL = 5
+
+TOKEN_DENY_LIST_REBUILD_INTERVAL = 3600
+
+# Rate limits per URL name in api/urls.py, checked by api.ratelimit before any
+# other middleware. A rule is a token bucket ('rate' and 'burst') or a sliding
+# window ('limit' requests per 'window' seconds), keyed by client 'ip' or
+# 'user'. Set RATE_LIMIT_CACHE to a shared cache alias to count across processes.
+RATE_LIMIT_ENABLED = True
+
+RATE_LIMIT_CACHE = None
+
+RATE_LIMIT_IP_HEADER = 'REMOTE_ADDR'
+
+RATE_LIMIT_MAX_KEYS = 100000
+
+RATE_LIMITS = {
+    'login': [
+        {'key': 'ip', 'rate': '10/min', 'burst': 10},
+        {'key': 'ip', 'limit': 100, 'window': 3600},
+    ],
+    'register': [
+        {'key': 'ip', 'rate': '5/min', 'burst': 5},
+        {'key': 'ip', 'limit': 30, 'window': 3600},
+    ],
+    'token_refresh': [
+        {'key': 'ip', 'rate': '30/min', 'burst': 30},
+    ],
+    'create_recipe': [
+        {'key': 'user', 'rate': '10/min', 'burst': 5, 'methods': ['POST']},
+        {'key': 'ip', 'limit': 300, 'window': 3600, 'methods': ['POST']},
+    ],
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -124,6 +246,35 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing
+# PBKDF2 cost is set by PASSWORD_HASH_ITERATIONS; hashes made at another cost
+# are upgraded on the next successful login. The async auth views hash in a
+# pool of PASSWORD_HASHING_WORKERS ('thread' or 'process' executor) and answer
+# 503 once PASSWORD_HASHING_QUEUE_LIMIT more jobs are waiting.
+
+PASSWORD_HASHERS = [
+    'api.passwords.ConfigurablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', 1000000))
+
+PASSWORD_HASHING_WORKERS = 4
+
+PASSWORD_HASHING_QUEUE_LIMIT = 64
+
+PASSWORD_HASHING_EXECUTOR = 'thread'
+
+# Bulk registration (users/bulk/ and manage.py bulk_create_users) hashes a
+# batch over BULK_HASHING_WORKERS spawned processes; 1 hashes inline.
+
+BULK_HASHING_WORKERS = 2
+
+BULK_REGISTER_MAX_USERS = 200
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -146,3 +297,100 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Recipe search and ingredient matching
+# api.search.InMemorySearchBackend or api.search.MySQLFullTextSearchBackend
+
+RECIPE_SEARCH_BACKEND = 'api.search.InMemorySearchBackend'
+
+RECIPE_SEARCH_MAX_RESULTS = 1000
+
+# The in-memory indexes are per process. Every committed change moves a counter
+# in INDEX_GENERATION_CACHE, and a worker that sees it move rebuilds its copy, so
+# this must name a cache shared by every worker (Redis, Memcached).
+
+INDEX_GENERATION_CACHE = 'default'
+
+INGREDIENT_MATCH_MAX_RESULTS = 1000
+
+
+# Request metrics, served in Prometheus text format at /metrics
+# Each worker process writes its totals to its own file in METRICS_DIR at most
+# every METRICS_FLUSH_INTERVAL seconds, and /metrics adds up every file there.
+# Without METRICS_DIR, /metrics only shows the process that answers it. Empty
+# the directory when deploying so old workers' totals are not carried over.
+
+METRICS_ENABLED = True
+
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+
+METRICS_FLUSH_INTERVAL = 1.0
+
+# Only scrapers connecting from these addresses or networks, or sending
+# "Authorization: Bearer <METRICS_TOKEN>", may read /metrics. Behind a proxy the
+# peer is the proxy, so scrape the workers directly or use the token. Nothing is
+# allowed by default, loopback included, since a proxy on the same host
+# connects from there.
+
+METRICS_ALLOWED_IPS = list(filter(None, os.environ.get('METRICS_ALLOWED_IPS', '').split(',')))
+
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+
+
+# Slow query log: statements over SLOW_QUERY_THRESHOLD_MS are written, with
+# the view and code line that ran them, as JSON lines to SLOW_QUERY_LOG,
+# rotated at SLOW_QUERY_LOG_MAX_BYTES. EXPLAIN runs in the background for a
+# SLOW_QUERY_EXPLAIN_SAMPLE_RATE share of slow SELECTs.
+# Summarize with: python manage.py slow_query_report
+
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 200))
+
+SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG') or BASE_DIR / 'logs' / 'slow_queries.log'
+
+SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+
+SLOW_QUERY_LOG_BACKUPS = 5
+
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = 0.1
+
+
+# Request tracing: with TRACE_SERVER_TIMING, a Server-Timing header splits each
+# response's time into SQL (db), serializers (serialize) and JSON rendering
+# (render). It tells every client how the server spends its time, so only turn
+# it on where the clients are trusted, e.g. in development. A
+# TRACE_SAMPLE_RATE share of requests is also written to TRACE_DIR in Chrome
+# trace event format, for chrome://tracing or https://ui.perfetto.dev, keeping
+# the newest TRACE_MAX_FILES. With both off, requests are not traced.
+
+TRACE_SERVER_TIMING = os.environ.get('TRACE_SERVER_TIMING') == '1'
+
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 0))
+
+TRACE_DIR = os.environ.get('TRACE_DIR') or BASE_DIR / 'logs' / 'traces'
+
+TRACE_MAX_FILES = 1000
+
+
+# On-demand profiling: a request to an api/ route with a signed X-Profile
+# header (manage.py profile_token) or, from a platform admin, ?profile=1 runs
+# under cProfile and a stack sampler. Its .prof (pstats) and .folded (flame
+# graph) files go to PROFILE_DIR, which keeps the newest PROFILE_MAX_COUNT
+# profiles within PROFILE_MAX_BYTES, and are listed in the admin. A token is
+# good for one request within PROFILE_TOKEN_MAX_AGE seconds; with several
+# workers, point PROFILE_TOKEN_CACHE at a shared cache so none of them takes
+# it twice.
+
+PROFILING_ENABLED = True
+
+PROFILE_DIR = os.environ.get('PROFILE_DIR') or BASE_DIR / 'logs' / 'profiles'
+
+PROFILE_MAX_COUNT = 50
+
+PROFILE_MAX_BYTES = 200 * 1024 * 1024
+
+PROFILE_TOKEN_MAX_AGE = 600
+
+PROFILE_TOKEN_CACHE = 'default'
+
+PROFILE_SAMPLE_INTERVAL = 0.001
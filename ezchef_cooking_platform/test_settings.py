@@ -0,0 +1,62 @@
+"""
+Test settings for ezchef_cooking_platform project.
+
+Runs the test suite against a local SQLite database so no MySQL server is
+needed. The api models are unmanaged, so the custom test runner creates their
+tables from the model definitions instead of the migrations.
+
+    python manage.py test --settings=ezchef_cooking_platform.test_settings
+"""
+
+import os
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+
+SECRET_KEY = SECRET_KEY or 'ezchef-test-secret-key'
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'test_db.sqlite3',
+    },
+    # Stand-in replica: a separate, empty database, i.e. one that never catches
+    # up. Routing tests turn it on with override_settings(DATABASE_REPLICAS=...)
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'test_replica.sqlite3',
+    },
+}
+
+DATABASE_REPLICAS = []
+
+# Replica pins need a cache the workers share; a file cache stands in for Redis
+CACHES = {
+    **CACHES,
+    'replica-pins': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'ezchef-test-replica-pins'),
+    },
+}
+
+REPLICA_PIN_CACHE = 'replica-pins'
+
+# Build the api tables straight from the models
+MIGRATION_MODULES = {
+    'api': None,
+}
+
+TEST_RUNNER = 'api.test_runner.UnmanagedModelTestRunner'
+
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.MD5PasswordHasher',
+]
+
+# Tests that exercise the limits turn them on with override_settings
+RATE_LIMIT_ENABLED = False
+
+# Hash bulk registrations inline rather than spawning a pool per test run
+BULK_HASHING_WORKERS = 1
+
+# Tests that exercise the slow query log turn it on with override_settings
+SLOW_QUERY_THRESHOLD_MS = None